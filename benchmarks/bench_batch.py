@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Batch API mode end-to-end against the mock Files/Batch API.
+
+Low-importance emails are queued by the batch pipeline, submitted as JSONL
+batches, and every `--tool-rounds` function call goes back as another batch
+round before the final answer is stored. Reports rounds, turnaround and the
+cost of the same tokens at batch (50%) vs. real-time pricing.
+
+Usage:
+    python benchmarks/bench_batch.py --emails 50 --tool-rounds 2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from mock_openai import MockOpenAIServer
+
+# USD per 1M tokens (gpt-4o-mini list price); batch is billed at half
+INPUT_PRICE = 0.15
+OUTPUT_PRICE = 0.60
+BATCH_DISCOUNT = 0.5
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=50)
+    parser.add_argument("--tool-rounds", type=int, default=2)
+    parser.add_argument("--batch-latency", type=float, default=0.5, help="mock batch processing time (s)")
+    parser.add_argument("--max-wait", type=float, default=0.5, help="BATCH_MAX_WAIT_SECONDS")
+    parser.add_argument("--poll-interval", type=float, default=0.25, help="BATCH_POLL_INTERVAL")
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(
+        latency=0.0,
+        tool_rounds=args.tool_rounds,
+        batch_latency=args.batch_latency
+    ).start_in_thread()
+    try:
+        os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+        os.environ["OPENAI_BASE_URL"] = server.url
+
+        from src.api.email_ai_endpoint import EmailAIProcessor
+        from src.models.request_models import EmailRequest
+        from src.services.batch_service import BatchPipeline
+        from src.services.job_store import job_store
+        from src.services.openai_service import close_openai_client
+
+        pipeline = BatchPipeline(
+            EmailAIProcessor(),
+            max_wait_seconds=args.max_wait,
+            poll_interval=args.poll_interval
+        )
+        jobs = []
+        start = time.perf_counter()
+        for index in range(args.emails):
+            request = EmailRequest(
+                domain="goldenergy.pt",
+                to=["apoio@goldenergy.pt"],
+                subject=f"Pedido de segunda via {index}",
+                body=f"Bom dia, podem enviar-me a segunda via da fatura de março? Cliente {index}.",
+                emailId=f"batch-{index}",
+                importance="low",
+                **{"from": f"cliente{index}@example.com"}
+            )
+            job = job_store.create("batch", emailId=request.emailId, domain=request.domain)
+            await pipeline.submit(request, job.id)
+            jobs.append(job)
+
+        runner = asyncio.create_task(pipeline.run(tick=0.05))
+        await asyncio.gather(*(job.done.wait() for job in jobs))
+        elapsed = time.perf_counter() - start
+        runner.cancel()
+
+        input_tokens = output_tokens = 0
+        for file_purpose, content in server.files.values():
+            if file_purpose != "batch_output":
+                continue
+            for line in content.decode("utf-8").splitlines():
+                usage = json.loads(line)["response"]["body"].get("usage", {})
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+        realtime_cost = (input_tokens * INPUT_PRICE + output_tokens * OUTPUT_PRICE) / 1_000_000
+        batch_cost = realtime_cost * BATCH_DISCOUNT
+        stats = pipeline.stats()
+        rounds = [job.metadata.get("batchRounds", 0) for job in jobs]
+
+        print("📦 Batch API benchmark")
+        print(f"   Emails: {args.emails}, tool rounds: {args.tool_rounds}")
+        print("=" * 50)
+        print(f"   Completed:           {stats['jobs_completed']}/{args.emails} ({stats['jobs_failed']} failed)")
+        print(f"   Batches submitted:   {stats['batches_submitted']} ({stats['requests_submitted']} requests)")
+        print(f"   Rounds per email:    {min(rounds)}-{max(rounds)}")
+        print(f"   Turnaround:          {elapsed:.2f}s total, {stats['avg_turnaround_seconds']}s avg per email")
+        print(f"   Tokens:              {input_tokens} input, {output_tokens} output")
+        print(f"   Cost (real-time):    ${realtime_cost:.4f}")
+        print(f"   Cost (batch):        ${batch_cost:.4f} ({1 - BATCH_DISCOUNT:.0%} saved)")
+        print("=" * 50)
+
+        await close_openai_client()
+    finally:
+        server.stop_thread()
+
+if __name__ == "__main__":
+    asyncio.run(main())
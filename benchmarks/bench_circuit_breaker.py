@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Upstream outages with and without circuit breakers.
+
+Emails are sent every `--gap` seconds against the mock OpenAI API (which
+also stands in for the attachment API) through three phases: healthy,
+outage and recovered. Two outages are injected:
+
+  - OpenAI: every /v1/responses call fails with a 503 after `--fail-latency`
+    seconds. Without breakers each email retries into the failing API
+    until its attempts run out; with them the model's circuit opens and
+    emails are rejected at once with a 503 until trial calls succeed.
+  - Attachment API: every email asks for an attachment, and the API answers
+    503 after `--fail-latency` seconds. With the breaker open the tool
+    fails fast and the email is answered without the attachment.
+
+Breaker thresholds are scaled down to seconds for the benchmark.
+
+Usage:
+    python benchmarks/bench_circuit_breaker.py --gap 0.1 --outage 10
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from mock_openai import MockOpenAIServer
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def run_phases(args, processor, email_request_cls, tag: str, phases: list) -> dict:
+    """Send an email every `gap` seconds through [(phase, seconds, apply)]; outcomes per phase"""
+    outcomes = {phase: [] for phase, _, _ in phases}
+
+    async def one(index: int, phase: str) -> None:
+        request = email_request_cls(
+            domain="goldenergy.pt",
+            to=["apoio@goldenergy.pt"],
+            subject=f"Pedido {index}",
+            body=f"Bom dia, pedido número {index} sobre a fatura em anexo.",
+            emailId=f"{tag}-{index}",
+            **{"from": f"cliente{index}@example.com"}
+        )
+        start = time.perf_counter()
+        try:
+            await processor.process_email(request, use_cache=False)
+            ok = True
+        except Exception:
+            ok = False
+        outcomes[phase].append((ok, time.perf_counter() - start))
+
+    tasks, index = [], 0
+    for phase, seconds, apply in phases:
+        apply()
+        phase_end = time.perf_counter() + seconds
+        while time.perf_counter() < phase_end:
+            tasks.append(asyncio.ensure_future(one(index, phase)))
+            index += 1
+            await asyncio.sleep(args.gap)
+    await asyncio.gather(*tasks)
+    return outcomes
+
+def summary(results: list) -> str:
+    answered = [latency for ok, latency in results if ok]
+    failed = [latency for ok, latency in results if not ok]
+    line = f"{len(answered)}/{len(results)} answered (p50 {percentile(answered, 0.5):4.2f}s)"
+    if failed:
+        line += f", {len(failed)} failed after p50 {percentile(failed, 0.5):4.2f}s"
+    return line
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gap", type=float, default=0.1, help="seconds between emails")
+    parser.add_argument("--phase", type=float, default=3.0, help="seconds of the healthy and recovered phases")
+    parser.add_argument("--outage", type=float, default=10.0, help="seconds of the outage")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--fail-latency", type=float, default=1.0, help="seconds a failing call takes to fail")
+    parser.add_argument("--open-seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(latency=args.latency, fail_latency=args.fail_latency).start_in_thread()
+    try:
+        os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+        os.environ["OPENAI_BASE_URL"] = server.url
+        os.environ["GET_ATTACHMENT_API_URL"] = server.attachment_url
+        os.environ["RATE_GOVERNOR_ENABLED"] = "false"
+
+        from src.api import email_ai_endpoint
+        from src.api.email_ai_endpoint import EmailAIProcessor
+        from src.models.request_models import EmailRequest
+        from src.services import attachment_service, openai_service, teams_service
+        from src.services.circuit_breaker import CircuitBreakers
+        from src.services.near_duplicate import near_duplicate_index
+        from src.services.openai_service import close_openai_client
+
+        near_duplicate_index.enabled = False
+        processor = EmailAIProcessor()
+
+        def openai_outage(failing: bool):
+            return lambda: setattr(server, "fail_rate", 1.0 if failing else 0.0)
+
+        def attachment_outage(failing: bool):
+            return lambda: setattr(server, "attachment_fail_rate", 1.0 if failing else 0.0)
+
+        scenarios = [
+            ("OpenAI outage", 0, "content_not_available", openai_outage, lambda: server.failures_injected),
+            ("attachment API outage", 1, "analyze_email_attachment", attachment_outage, lambda: server.attachment_calls)
+        ]
+
+        print("🔌 Circuit breaker benchmark")
+        print(f"   an email every {args.gap}s; {args.phase}s healthy, {args.outage}s outage "
+              f"(calls fail after {args.fail_latency}s), {args.phase}s recovered")
+        print("=" * 50)
+        for name, tool_rounds, tool_name, outage, upstream_calls in scenarios:
+            server.tool_rounds, server.tool_name = tool_rounds, tool_name
+            print(f"   {name}:")
+            for enabled in (False, True):
+                breakers = CircuitBreakers(enabled=enabled, settings={
+                    "*": {"min_calls": 5, "window_seconds": 5.0, "open_seconds": args.open_seconds}
+                })
+                for module in (email_ai_endpoint, openai_service, attachment_service, teams_service):
+                    module.circuit_breakers = breakers
+                calls = {}
+                phases = [
+                    ("healthy", args.phase, outage(False)),
+                    ("outage", args.outage, lambda: (outage(True)(), calls.setdefault("start", upstream_calls()))),
+                    ("recovered", args.phase, lambda: (outage(False)(), calls.setdefault("end", upstream_calls())))
+                ]
+                outcomes = await run_phases(args, processor, EmailRequest, f"{name}-{enabled}", phases)
+                print(f"      breakers {'on ' if enabled else 'off'}: {calls['end'] - calls['start']} calls "
+                      f"to the failing API during the outage")
+                for phase, results in outcomes.items():
+                    print(f"         {phase:>9}: {summary(results)}")
+                if enabled:
+                    for circuit, stats in breakers.stats()["circuits"].items():
+                        print(f"         circuit {circuit}: opened {stats['opened']}x, "
+                              f"{stats['rejected']} calls rejected, now {stats['state']}")
+        print("=" * 50)
+
+        await close_openai_client()
+    finally:
+        server.stop_thread()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark for the compose path against a local mock Responses API.
+
+Fires N concurrent EmailAIProcessor.process_email calls on a single event loop
+and compares the wall time with the old behaviour (a synchronous OpenAI client
+called from inside the coroutines), which serializes every round trip.
+
+Usage:
+    python benchmarks/bench_concurrency.py --requests 50 --latency 0.5
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from mock_openai import MockOpenAIServer
+
+SAMPLE_EMAIL = {
+    "domain": "goldenergy.pt",
+    "from": "joao.silva@example.com",
+    "to": ["apoio@goldenergy.pt"],
+    "subject": "Informações sobre tarifas de energia",
+    "body": "Bom dia,\n\nGostaria de receber informações sobre as vossas tarifas.\n\nObrigado,\nJoão Silva",
+    "bodyFormat": "text",
+    "originalMailbox": "apoio@goldenergy.pt"
+}
+
+async def run_async(processor, email_request_cls, count: int) -> float:
+    """Run `count` distinct compose requests concurrently through the async service"""
+    # A different body per request and no response cache, so that neither the
+    # cache nor single-flight coalescing collapses them into one upstream call
+    requests = [
+        email_request_cls(**{
+            **SAMPLE_EMAIL,
+            "emailId": f"bench-{i}",
+            "body": SAMPLE_EMAIL["body"].replace("tarifas.", f"tarifas para o contrato {1000 + i}.")
+        })
+        for i in range(count)
+    ]
+    start = time.perf_counter()
+    await asyncio.gather(*(processor.process_email(request, use_cache=False) for request in requests))
+    return time.perf_counter() - start
+
+async def run_blocking(base_url: str, count: int) -> float:
+    """Previous behaviour: a sync client called from coroutines blocks the loop"""
+    from openai import OpenAI
+
+    client = OpenAI(api_key="sk-mock", base_url=base_url)
+
+    async def one_call():
+        client.responses.create(model="mock-model", input="ping")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_call() for _ in range(count)))
+    elapsed = time.perf_counter() - start
+    client.close()
+    return elapsed
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=30, help="concurrent compose requests")
+    parser.add_argument("--latency", type=float, default=0.5, help="mock Responses API latency (s)")
+    parser.add_argument("--skip-blocking", action="store_true", help="skip the sync-client baseline")
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(latency=args.latency).start_in_thread()
+    try:
+        os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+        os.environ["OPENAI_BASE_URL"] = server.url
+
+        from src.api.email_ai_endpoint import EmailAIProcessor
+        from src.models.request_models import EmailRequest
+        from src.services.openai_service import close_openai_client
+        from src.services.http_clients import http_clients
+        from src.services.near_duplicate import near_duplicate_index
+
+        print("🚀 Compose concurrency benchmark")
+        print(f"   Requests: {args.requests}, mock latency: {args.latency:.2f}s")
+        print("=" * 50)
+
+        if not args.skip_blocking:
+            blocking = await run_blocking(server.url, args.requests)
+            print(f"   Sync client (blocking):  {blocking:7.2f}s  "
+                  f"({args.requests / blocking:6.1f} req/s)")
+
+        near_duplicate_index.enabled = False
+        processor = EmailAIProcessor()
+        served_before = server.requests_served
+        server.max_in_flight = 0
+        elapsed = await run_async(processor, EmailRequest, args.requests)
+        print(f"   Async client (shared):   {elapsed:7.2f}s  "
+              f"({args.requests / elapsed:6.1f} req/s)")
+        print(f"   Upstream calls: {server.requests_served - served_before}, "
+              f"max in flight: {server.max_in_flight}")
+        ideal = args.latency
+        print(f"   Overhead vs. single round trip: {elapsed - ideal:+.2f}s")
+
+        pool = http_clients.stats().get("openai", {})
+        print(f"   Pool: {pool.get('open_connections', 0)} open / {pool.get('idle_connections', 0)} idle "
+              f"connections, {server.connections_opened} TCP connects, {pool.get('pool_waits', 0)} waits")
+
+        await close_openai_client()
+        await http_clients.aclose()
+    finally:
+        server.stop_thread()
+
+if __name__ == "__main__":
+    asyncio.run(main())
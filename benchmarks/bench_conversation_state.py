@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Delta-only vs. full-replay continuation input on a multi-turn tool loop.
+
+The mock Responses API asks for `--tool-rounds` function calls before
+answering and bills chained calls for their stored context, like the real
+API. In replay mode every continuation re-sends the email; in delta mode only
+the new function_call_output items are sent. A final run expires stored
+responses to exercise the full-replay fallback.
+
+Usage:
+    python benchmarks/bench_conversation_state.py --emails 5 --tool-rounds 3
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from mock_openai import MockOpenAIServer
+
+def long_thread(index: int, paragraphs: int) -> str:
+    """A long RE:/FW: style body so re-sending it is visibly expensive"""
+    history = "\n".join(
+        f"De: cliente{index}@example.com\nEnviada: dia {day}\nAssunto: RE: Pedido {index}\n"
+        f"Mensagem anterior número {day} sobre a fatura, com detalhes do contrato e leituras do contador."
+        for day in range(paragraphs)
+    )
+    return f"Bom dia, continuo sem resposta ao pedido {index}.\n\n{history}"
+
+async def run_mode(mode: str, args, processor, email_request_cls, conversation_stats) -> dict:
+    os.environ["CONVERSATION_STATE_MODE"] = mode
+    conversation_stats.modes.clear()
+    start = time.perf_counter()
+    for index in range(args.emails):
+        request = email_request_cls(
+            domain="goldenergy.pt",
+            to=["apoio@goldenergy.pt"],
+            subject=f"RE: Pedido {index}",
+            body=long_thread(index, args.paragraphs),
+            bodyFormat="text",
+            emailId=f"{mode}-{index}",
+            **{"from": f"cliente{index}@example.com"}
+        )
+        await processor.process_email(request, use_cache=False)
+    elapsed = time.perf_counter() - start
+    return {"elapsed": elapsed, **conversation_stats.stats()}
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=5)
+    parser.add_argument("--tool-rounds", type=int, default=3)
+    parser.add_argument("--paragraphs", type=int, default=150, help="quoted messages per email")
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--latency-per-1k", type=float, default=0.02, help="mock latency per 1k input tokens")
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(
+        latency=args.latency,
+        tool_rounds=args.tool_rounds,
+        latency_per_1k_input=args.latency_per_1k
+    ).start_in_thread()
+    try:
+        os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+        os.environ["OPENAI_BASE_URL"] = server.url
+
+        from src.api.email_ai_endpoint import EmailAIProcessor
+        from src.models.request_models import EmailRequest
+        from src.services.conversation_state import conversation_stats
+        from src.services.near_duplicate import near_duplicate_index
+        from src.services.openai_service import close_openai_client
+
+        near_duplicate_index.enabled = False
+        processor = EmailAIProcessor()
+
+        print("🔁 Conversation state benchmark")
+        print(f"   Emails: {args.emails}, tool rounds: {args.tool_rounds}")
+        print("=" * 50)
+        for mode in ("replay", "delta"):
+            result = await run_mode(mode, args, processor, EmailRequest, conversation_stats)
+            continuation = result.get(mode, {})
+            print(f"   {mode:>6}: {result['elapsed']:6.2f}s total, "
+                  f"{continuation.get('avg_input_tokens', 0):>8.0f} avg input tokens / continuation, "
+                  f"{continuation.get('avg_latency', 0):.3f}s avg continuation latency")
+
+        server.expire_responses = True
+        result = await run_mode("delta", args, processor, EmailRequest, conversation_stats)
+        print(f"   expired previous responses: {result['expired_fallbacks']} full-replay fallbacks, "
+              f"all {args.emails} emails answered in {result['elapsed']:.2f}s")
+
+        await close_openai_client()
+    finally:
+        server.stop_thread()
+
+if __name__ == "__main__":
+    asyncio.run(main())
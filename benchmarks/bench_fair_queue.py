@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Noisy-neighbour load test for per-domain fair queuing.
+
+One domain floods the service with a mass mailing (`--noisy` emails at
+once) while two quiet domains keep sending a steady trickle. The run is
+done twice against the mock OpenAI API with `--concurrency` shared call
+slots: first with every email in one shared queue, then with per-domain
+weighted fair queuing and a concurrency and token-rate quota on the noisy
+domain, set at runtime through the scheduler. Per-domain answer latency
+shows whether the quiet domains are isolated from the flood.
+
+Usage:
+    python benchmarks/bench_fair_queue.py --noisy 150 --quiet 10 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from mock_openai import MockOpenAIServer
+
+NOISY_DOMAIN = "promo.example.com"
+QUIET_DOMAINS = ("goldenergy.pt", "outro-projeto.pt")
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def run(args, processor, email_request_cls, isolated: bool) -> dict:
+    latencies = {domain: [] for domain in (NOISY_DOMAIN,) + QUIET_DOMAINS}
+
+    async def one(domain: str, index: int, delay: float) -> None:
+        await asyncio.sleep(delay)
+        request = email_request_cls(
+            # Without isolation every email lands in the same shared queue
+            domain=domain if isolated else "shared",
+            to=[f"apoio@{domain}"],
+            subject=f"Pedido {index}",
+            body=f"Bom dia, pedido número {index} de {domain} sobre a fatura.",
+            emailId=f"{isolated}-{domain}-{index}",
+            **{"from": f"cliente{index}@example.com"}
+        )
+        start = time.perf_counter()
+        await processor.process_email(request, use_cache=False)
+        latencies[domain].append(time.perf_counter() - start)
+
+    tasks = [one(NOISY_DOMAIN, index, 0.0) for index in range(args.noisy)]
+    for domain in QUIET_DOMAINS:
+        tasks += [one(domain, index, 0.05 + index * args.quiet_gap) for index in range(args.quiet)]
+    start = time.perf_counter()
+    await asyncio.gather(*tasks)
+    return {"elapsed": time.perf_counter() - start, "latencies": latencies}
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--noisy", type=int, default=150)
+    parser.add_argument("--quiet", type=int, default=10)
+    parser.add_argument("--quiet-gap", type=float, default=0.2, help="seconds between quiet-domain emails")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--noisy-concurrency", type=int, default=4)
+    parser.add_argument("--noisy-tpm", type=int, default=150000, help="noisy domain tokens per minute")
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(latency=args.latency).start_in_thread()
+    try:
+        os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+        os.environ["OPENAI_BASE_URL"] = server.url
+
+        from src.api import email_ai_endpoint
+        from src.api.email_ai_endpoint import EmailAIProcessor
+        from src.models.request_models import EmailRequest
+        from src.services.priority_scheduler import PriorityScheduler, DomainQuota
+        from src.services.near_duplicate import near_duplicate_index
+        from src.services.openai_service import close_openai_client
+
+        near_duplicate_index.enabled = False
+        processor = EmailAIProcessor()
+
+        print("⚖️  Noisy-neighbour benchmark")
+        print(f"   {NOISY_DOMAIN}: {args.noisy} emails at once; "
+              f"{', '.join(QUIET_DOMAINS)}: {args.quiet} each, one every {args.quiet_gap}s")
+        print(f"   {args.concurrency} shared OpenAI call slots, mock latency {args.latency}s")
+        print("=" * 50)
+        for isolated in (False, True):
+            scheduler = PriorityScheduler(max_concurrency=args.concurrency)
+            email_ai_endpoint.openai_scheduler = scheduler
+            if isolated:
+                scheduler.set_quota(NOISY_DOMAIN, DomainQuota(
+                    max_concurrency=args.noisy_concurrency,
+                    tokens_per_minute=args.noisy_tpm
+                ))
+            result = await run(args, processor, EmailRequest, isolated)
+            print(f"   {'fair queuing + quotas' if isolated else 'shared queue'}: {result['elapsed']:.2f}s total")
+            for domain, values in result["latencies"].items():
+                print(f"      {domain:>20}: p50 {percentile(values, 0.5):5.2f}s, p95 {percentile(values, 0.95):5.2f}s")
+            if isolated:
+                noisy = scheduler.domain_stats()[NOISY_DOMAIN]
+                print(f"      noisy domain throttled by token quota {noisy['throttled']}x, "
+                      f"{noisy['tokens_used']} tokens used")
+        print("=" * 50)
+
+        await close_openai_client()
+    finally:
+        server.stop_thread()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Tail latency with and without hedged OpenAI calls.
+
+The mock OpenAI API answers most calls after `--latency` seconds but a
+`--slow-rate` fraction only after `--slow-latency` seconds. Emails (each
+one a tool call round plus the answer) are sent `--concurrency` at a time,
+once with hedging disabled and once with it enabled: a call still running
+past the observed p95 of its model/effort is duplicated, capped at
+`--budget` of all calls, and the first answer wins.
+
+Usage:
+    python benchmarks/bench_hedging.py --emails 300 --slow-rate 0.05
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from mock_openai import MockOpenAIServer
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def run(args, processor, email_request_cls, tag: str) -> dict:
+    latencies = []
+    queue: asyncio.Queue = asyncio.Queue()
+    for index in range(args.emails):
+        queue.put_nowait(index)
+
+    async def worker() -> None:
+        while not queue.empty():
+            index = queue.get_nowait()
+            request = email_request_cls(
+                domain="goldenergy.pt",
+                to=["apoio@goldenergy.pt"],
+                subject=f"Pedido {index}",
+                body=f"Bom dia, pedido número {index} sobre a minha fatura.",
+                emailId=f"{tag}-{index}",
+                **{"from": f"cliente{index}@example.com"}
+            )
+            start = time.perf_counter()
+            await processor.process_email(request, use_cache=False)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return {"elapsed": time.perf_counter() - start, "latencies": latencies}
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="fraction of calls in the latency tail")
+    parser.add_argument("--slow-latency", type=float, default=5.0)
+    parser.add_argument("--budget", type=float, default=0.1, help="max fraction of calls hedged")
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(
+        latency=args.latency, tool_rounds=1, slow_rate=args.slow_rate, slow_latency=args.slow_latency
+    ).start_in_thread()
+    try:
+        os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+        os.environ["OPENAI_BASE_URL"] = server.url
+
+        from src.api.email_ai_endpoint import EmailAIProcessor
+        from src.models.request_models import EmailRequest
+        from src.services import openai_service
+        from src.services.hedging import RequestHedger
+        from src.services.near_duplicate import near_duplicate_index
+        from src.services.openai_service import close_openai_client
+
+        near_duplicate_index.enabled = False
+        processor = EmailAIProcessor()
+
+        print("🪁 Hedged requests benchmark")
+        print(f"   {args.emails} emails, {args.concurrency} at a time; calls take {args.latency}s, "
+              f"{args.slow_rate:.0%} of them {args.slow_latency}s")
+        print("=" * 50)
+        for enabled in (False, True):
+            hedger = RequestHedger(enabled=enabled, budget=args.budget, min_delay=0.0)
+            openai_service.request_hedger = hedger
+            calls = server.requests_served
+            result = await run(args, processor, EmailRequest, f"hedging-{enabled}")
+            latencies = result["latencies"]
+            print(f"   hedging {'on ' if enabled else 'off'}: {result['elapsed']:6.2f}s total, "
+                  f"p50 {percentile(latencies, 0.5):5.2f}s, p95 {percentile(latencies, 0.95):5.2f}s, "
+                  f"p99 {percentile(latencies, 0.99):5.2f}s, max {max(latencies):5.2f}s")
+            stats = hedger.stats()
+            print(f"      {server.requests_served - calls} OpenAI calls, "
+                  f"{stats['hedges_fired']} hedges fired, {stats['hedges_won']} won, "
+                  f"{stats['over_budget']} over budget")
+        print("=" * 50)
+
+        await close_openai_client()
+    finally:
+        server.stop_thread()
+
+if __name__ == "__main__":
+    asyncio.run(main())
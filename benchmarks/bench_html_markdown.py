@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Throughput and token savings of the HTML to markdown converter on a
+synthetic corpus of Outlook-shaped HTML emails.
+
+Each email carries what Outlook and marketing tools actually send: a
+<head> with MSO styles, conditional comments with VML/Office XML, MsoNormal
+paragraphs wrapped in styled spans, Safe Links redirects, hidden preheaders,
+tracking pixels, nested layout tables and sometimes a list or a data table.
+Throughput is measured both on whole documents and streamed in chunks.
+
+Usage:
+    python benchmarks/bench_html_markdown.py --emails 300 --chunk-size 8192
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from urllib.parse import quote
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.services.html_markdown import convert_stream, html_to_markdown
+
+HEAD = (
+    "<html xmlns:v=\"urn:schemas-microsoft-com:vml\" xmlns:o=\"urn:schemas-microsoft-com:office:office\">"
+    "<head><meta http-equiv=\"Content-Type\" content=\"text/html; charset=utf-8\">"
+    "<meta name=\"Generator\" content=\"Microsoft Word 15 (filtered medium)\">"
+    "<!--[if !mso]><style>v\\:* {behavior:url(#default#VML);} o\\:* {behavior:url(#default#VML);}</style><![endif]-->"
+    "<style><!-- @font-face {font-family:\"Cambria Math\"; panose-1:2 4 5 3 5 4 6 3 2 4;} "
+    "@font-face {font-family:Calibri; panose-1:2 15 5 2 2 2 4 3 2 4;} "
+    "p.MsoNormal, li.MsoNormal, div.MsoNormal {margin:0cm; font-size:11.0pt; font-family:\"Calibri\",sans-serif;} "
+    "a:link, span.MsoHyperlink {mso-style-priority:99; color:#0563C1; text-decoration:underline;} "
+    "span.EstiloDeEmail17 {mso-style-type:personal-compose; font-family:\"Calibri\",sans-serif; color:windowtext;} "
+    ".MsoChpDefault {mso-style-type:export-only; font-family:\"Calibri\",sans-serif;} "
+    "@page WordSection1 {size:612.0pt 792.0pt; margin:70.85pt 3.0cm 70.85pt 3.0cm;} "
+    "div.WordSection1 {page:WordSection1;} --></style>"
+    "<!--[if gte mso 9]><xml><o:shapedefaults v:ext=\"edit\" spidmax=\"1026\" /></xml><![endif]-->"
+    "<!--[if gte mso 9]><xml><o:shapelayout v:ext=\"edit\"><o:idmap v:ext=\"edit\" data=\"1\" /></o:shapelayout></xml><![endif]-->"
+    "</head><body lang=\"PT\" link=\"#0563C1\" vlink=\"#954F72\" style=\"word-wrap:break-word\">"
+)
+
+SENTENCES = [
+    "A minha última fatura veio com um valor muito superior ao habitual.",
+    "Podem verificar se a leitura do contador está correta?",
+    "Envio em anexo a fotografia do contador tirada esta manhã.",
+    "Gostaria também de aderir ao débito direto e à fatura eletrónica.",
+    "Fico a aguardar uma resposta com a maior brevidade possível.",
+    "I would like to terminate the contract for the apartment I moved out of last month.",
+]
+
+def paragraph(text: str) -> str:
+    return (
+        "<p class=\"MsoNormal\"><span style=\"font-size:11.0pt;font-family:&quot;Calibri&quot;,sans-serif;"
+        f"color:#1F497D;mso-fareast-language:EN-US\">{text}<o:p></o:p></span></p>"
+    )
+
+def safelink(url: str) -> str:
+    return (
+        "https://eur02.safelinks.protection.outlook.com/?url=" + quote(url, safe="")
+        + "&amp;data=05%7C01%7Capoio%40goldenergy.pt%7C7d1c2e4b5a6f4e3d8c9b0a1b2c3d4e5f%7C"
+        "0a1b2c3d4e5f6a7b8c9d0e1f2a3b4c5d%7C0%7C0%7C638532%7CUnknown%7CTWFpbGZsb3d8&amp;reserved=0"
+    )
+
+def build_email(rng: random.Random) -> str:
+    parts = [HEAD, "<div style=\"display:none;max-height:0px;overflow:hidden\">Pré-visualização da mensagem</div>"]
+    parts.append("<table width=\"100%\" cellpadding=\"0\" cellspacing=\"0\" border=\"0\"><tr><td align=\"center\">"
+                 "<table width=\"600\" style=\"border-collapse:collapse;mso-table-lspace:0pt\"><tr><td>")
+    parts.append("<div class=\"WordSection1\">")
+    parts.append(paragraph("Bom dia,"))
+    parts.append(paragraph("&nbsp;"))
+    for _ in range(rng.randint(2, 6)):
+        parts.append(paragraph(" ".join(rng.sample(SENTENCES, 2))))
+    if rng.random() < 0.5:
+        parts.append(paragraph(
+            f"Pode consultar a fatura em <a href=\"{safelink('https://goldenergy.pt/area-cliente/faturas')}\">"
+            "<span style=\"color:#0563C1\">área de cliente</span></a>."
+        ))
+    if rng.random() < 0.4:
+        parts.append("<ul style=\"margin-top:0cm\" type=\"disc\">" + "".join(
+            f"<li class=\"MsoListParagraph\" style=\"margin-left:0cm;mso-list:l0 level1 lfo1\">"
+            f"<span style=\"font-size:11.0pt\">{sentence}</span></li>"
+            for sentence in rng.sample(SENTENCES, 3)
+        ) + "</ul>")
+    if rng.random() < 0.4:
+        rows = "".join(
+            f"<tr><td style=\"border:solid windowtext 1.0pt;padding:0cm 5.4pt\"><p class=\"MsoNormal\">{month}</p></td>"
+            f"<td style=\"border:solid windowtext 1.0pt;padding:0cm 5.4pt\"><p class=\"MsoNormal\">{rng.randint(40, 200)},{rng.randint(10, 99)} €</p></td></tr>"
+            for month in ("Janeiro", "Fevereiro", "Março", "Abril")
+        )
+        parts.append("<table class=\"MsoTableGrid\" border=\"1\" cellspacing=\"0\" cellpadding=\"0\" "
+                     "style=\"border-collapse:collapse;border:none\"><tr><td><p class=\"MsoNormal\"><b>Mês</b></p></td>"
+                     f"<td><p class=\"MsoNormal\"><b>Valor</b></p></td></tr>{rows}</table>")
+    parts.append(paragraph("Com os melhores cumprimentos,"))
+    parts.append(paragraph("<b>Maria Silva</b>"))
+    parts.append(
+        "<p class=\"MsoNormal\"><span style=\"mso-no-proof:yes\"><!--[if gte vml 1]><v:shape id=\"Imagem_x0020_1\" "
+        "o:spid=\"_x0000_i1025\" type=\"#_x0000_t75\" style=\"width:120pt;height:40pt\"><v:imagedata "
+        "src=\"cid:image001.png@01DA\" o:title=\"\"/></v:shape><![endif]--><![if !vml]>"
+        "<img width=\"160\" height=\"53\" src=\"cid:image001.png@01DA\" alt=\"Logo Goldenergy\"><![endif]></span></p>"
+    )
+    parts.append("</div></td></tr></table></td></tr></table>")
+    parts.append("<img src=\"https://track.example.com/open.gif?id=8f7e6d5c\" width=\"1\" height=\"1\" alt=\"\" style=\"display:block\">")
+    parts.append("</body></html>")
+    return "".join(parts)
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (4 characters per token)"""
+    return len(text) // 4
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=300)
+    parser.add_argument("--chunk-size", type=int, default=8192)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = [build_email(rng) for _ in range(args.emails)]
+    size_mb = sum(len(email.encode("utf-8")) for email in corpus) / 1_000_000
+
+    start = time.perf_counter()
+    converted = [html_to_markdown(email) for email in corpus]
+    whole_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for email in corpus:
+        chunks = (email[i:i + args.chunk_size] for i in range(0, len(email), args.chunk_size))
+        for _ in convert_stream(chunks):
+            pass
+    stream_seconds = time.perf_counter() - start
+
+    tokens_html = sum(estimate_tokens(email) for email in corpus)
+    tokens_markdown = sum(estimate_tokens(markdown) for markdown in converted)
+
+    print("📝 HTML to markdown benchmark")
+    print(f"   Corpus: {len(corpus)} Outlook-shaped emails, {size_mb:.2f} MB of HTML")
+    print("=" * 50)
+    print(f"   Whole documents:      {size_mb / whole_seconds:8.2f} MB/s")
+    print(f"   Streamed ({args.chunk_size} B chunks): {size_mb / stream_seconds:6.2f} MB/s")
+    print(f"   Tokens (raw HTML):    {tokens_html:8d}")
+    print(f"   Tokens (markdown):    {tokens_markdown:8d}")
+    print(f"   Reduction:            {1 - tokens_markdown / tokens_html:8.1%}")
+    print("=" * 50)
+    print("   Sample output:")
+    for line in converted[0].splitlines()[:12]:
+        print(f"   | {line}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Async job API under a burst: submit latency vs. answer latency.
+
+A burst of `--requests` emails is posted to /api/v1/email/jobs and each
+client then long-polls its job. Submission returns as soon as the job is
+queued, so the client-facing request time stays in milliseconds while the
+worker pool (`--workers`) drains the burst against the mock OpenAI API.
+
+Usage:
+    python benchmarks/bench_jobs.py --requests 200 --workers 16 --latency 0.5
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from mock_openai import MockOpenAIServer
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(latency=args.latency).start_in_thread()
+    try:
+        os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+        os.environ["OPENAI_BASE_URL"] = server.url
+        os.environ["JOB_WORKERS"] = str(args.workers)
+        os.environ["JOB_QUEUE_MAX"] = str(args.requests)
+
+        from src.main import app
+        from src.services.job_workers import job_workers
+        from src.services.near_duplicate import near_duplicate_index
+        from src.services.openai_service import close_openai_client
+
+        near_duplicate_index.enabled = False
+        job_workers.start()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://smartemails", timeout=120) as client:
+
+            async def one(index: int) -> tuple:
+                start = time.perf_counter()
+                response = await client.post("/api/v1/email/jobs", json={
+                    "domain": "goldenergy.pt",
+                    "to": ["apoio@goldenergy.pt"],
+                    "from": f"cliente{index}@example.com",
+                    "subject": f"Pedido {index}",
+                    "body": f"Bom dia, preciso da segunda via da fatura número {index}.",
+                    "emailId": f"job-{index}"
+                })
+                submitted = time.perf_counter() - start
+                job = response.json()
+                while job["status"] not in ("completed", "failed"):
+                    job = (await client.get(response.headers["Location"], params={"wait": 30})).json()
+                return submitted, time.perf_counter() - start, job["status"]
+
+            start = time.perf_counter()
+            results = await asyncio.gather(*(one(index) for index in range(args.requests)))
+            elapsed = time.perf_counter() - start
+
+        await job_workers.stop()
+        await close_openai_client()
+
+        submit_times = [submitted * 1000 for submitted, _, _ in results]
+        answer_times = [answered for _, answered, _ in results]
+        completed = sum(1 for _, _, status in results if status == "completed")
+        stats = job_workers.stats()
+
+        print("📬 Async job API benchmark")
+        print(f"   Burst: {args.requests} emails, {args.workers} workers, mock latency {args.latency}s")
+        print("=" * 50)
+        print(f"   Completed:          {completed}/{args.requests} in {elapsed:.2f}s")
+        print(f"   Submit latency:     p50 {percentile(submit_times, 0.5):6.1f} ms, p99 {percentile(submit_times, 0.99):6.1f} ms")
+        print(f"   Answer latency:     p50 {percentile(answer_times, 0.5):6.2f} s,  p99 {percentile(answer_times, 0.99):6.2f} s")
+        print(f"   Avg queue wait:     {stats['avg_queue_wait_seconds']:.2f}s, avg run {stats['avg_run_seconds']:.2f}s")
+        print(f"   Peak upstream concurrency: {server.max_in_flight} (bounded by workers)")
+        print("=" * 50)
+    finally:
+        server.stop_thread()
+
+if __name__ == "__main__":
+    asyncio.run(main())
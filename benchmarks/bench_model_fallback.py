@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Ordered model fallback chain vs. failing on the routed model.
+
+Emails routed to o4-mini (each one tool call round plus the answer) are
+sent every `--gap` seconds against the mock OpenAI API while o4-mini is
+unavailable in one of two ways:
+
+  - overloaded: every o4-mini call fails with a 503 after `--fail-latency`
+    seconds, until its circuit opens and later emails skip it at once;
+  - hanging: o4-mini calls take `--hang` seconds, past the OpenAI read
+    timeout of `--timeout` seconds.
+
+Each scenario is run without a fallback chain and with the chain
+o4-mini -> gpt-4.1-mini -> gpt-4o-mini. Reported per run: emails answered,
+their latency, which model served them and the seconds each hop added.
+
+Usage:
+    python benchmarks/bench_model_fallback.py --emails 40 --deadline 6 --timeout 3
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from mock_openai import MockOpenAIServer
+
+CHAIN = ["o4-mini", "gpt-4.1-mini", "gpt-4o-mini"]
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def run(args, processor, email_request_cls, tag: str) -> dict:
+    result = {"latencies": [], "failed": 0, "served_by": {}, "hop_seconds": {}}
+
+    async def one(index: int) -> None:
+        await asyncio.sleep(index * args.gap)
+        request = email_request_cls(
+            domain="goldenergy.pt",
+            to=["apoio@goldenergy.pt"],
+            subject=f"Pedido {index}",
+            body=f"Bom dia, pedido número {index} sobre a minha fatura.",
+            emailId=f"{tag}-{index}",
+            AiModel="o4-mini",
+            **{"from": f"cliente{index}@example.com"}
+        )
+        model_info = {}
+        start = time.perf_counter()
+        try:
+            await processor.process_email(request, use_cache=False, model_info=model_info)
+        except Exception:
+            result["failed"] += 1
+            return
+        result["latencies"].append(time.perf_counter() - start)
+        result["served_by"][model_info["served_by"]] = result["served_by"].get(model_info["served_by"], 0) + 1
+        for hop in model_info["hops"]:
+            result["hop_seconds"].setdefault(hop["reason"], []).append(hop["seconds"])
+
+    await asyncio.gather(*(one(index) for index in range(args.emails)))
+    return result
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=40)
+    parser.add_argument("--gap", type=float, default=0.1, help="seconds between emails")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--fail-latency", type=float, default=0.5, help="seconds an overloaded call takes to fail")
+    parser.add_argument("--hang", type=float, default=30.0, help="latency of a hanging model")
+    parser.add_argument("--deadline", type=float, default=6.0, help="retry deadline per model call")
+    parser.add_argument("--timeout", type=float, default=3.0, help="OpenAI read timeout per attempt")
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(latency=args.latency, tool_rounds=1, fail_latency=args.fail_latency).start_in_thread()
+    try:
+        os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+        os.environ["OPENAI_BASE_URL"] = server.url
+        os.environ["RATE_GOVERNOR_ENABLED"] = "false"
+        os.environ["SERVICE_TIER_SELECTION"] = "false"
+        os.environ["HTTP_POOL_OPENAI_TIMEOUT"] = str(args.timeout)
+
+        from src.api import email_ai_endpoint
+        from src.api.email_ai_endpoint import EmailAIProcessor
+        from src.models.request_models import EmailRequest
+        from src.services import openai_service
+        from src.services.circuit_breaker import CircuitBreakers
+        from src.services.model_fallback import ModelFallbacks
+        from src.services.near_duplicate import near_duplicate_index
+        from src.services.openai_service import close_openai_client
+        from src.services.retry_policy import RetryPolicy
+
+        near_duplicate_index.enabled = False
+        processor = EmailAIProcessor()
+        policy = RetryPolicy(deadline=args.deadline)
+        email_ai_endpoint.openai_retry_policy = openai_service.openai_retry_policy = policy
+
+        scenarios = {
+            "overloaded": lambda: setattr(server, "model_fail_rate", {"o4-mini": 1.0}),
+            "hanging": lambda: setattr(server, "model_latency", {"o4-mini": args.hang})
+        }
+
+        print("🪜 Model fallback chain benchmark")
+        print(f"   {args.emails} emails routed to o4-mini, one every {args.gap}s; retry deadline {args.deadline}s, "
+              f"read timeout {args.timeout}s")
+        print("=" * 50)
+        for name, inject in scenarios.items():
+            server.model_fail_rate, server.model_latency = {}, {}
+            inject()
+            print(f"   o4-mini {name}:")
+            for chain in ([], CHAIN):
+                fallbacks = ModelFallbacks(chains={"*": chain})
+                breakers = CircuitBreakers()
+                email_ai_endpoint.model_fallbacks = fallbacks
+                email_ai_endpoint.circuit_breakers = openai_service.circuit_breakers = breakers
+                result = await run(args, processor, EmailRequest, f"{name}-{len(chain)}")
+                latencies = result["latencies"]
+                print(f"      {'fallback chain' if chain else 'no fallback':>14}: "
+                      f"{len(latencies)}/{args.emails} answered (p50 {percentile(latencies, 0.5):5.2f}s, "
+                      f"p95 {percentile(latencies, 0.95):5.2f}s), {result['failed']} failed; served by {result['served_by']}")
+                for reason, seconds in sorted(result["hop_seconds"].items()):
+                    print(f"      {'':>14}  {len(seconds)} hops on {reason}, "
+                          f"adding p50 {percentile(seconds, 0.5):5.2f}s, max {max(seconds):5.2f}s")
+        print("=" * 50)
+
+        await close_openai_client()
+    finally:
+        server.stop_thread()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Precision/recall and lookup latency of the near-duplicate index on a
+synthetic corpus of templated support emails.
+
+The corpus mixes web-form submissions (same template and request, different
+names, phone and customer numbers) with short free-text emails signed by
+different customers. Two emails are true near duplicates when they were
+generated from the same template and request (or the same free-text request).
+
+Usage:
+    python benchmarks/bench_near_duplicate.py --emails 2000 --threshold 0.8
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.services.near_duplicate import NearDuplicateIndex
+
+FIRST_NAMES = ["João", "Maria", "Ana", "Pedro", "Rita", "Carlos", "Sofia", "Miguel", "Inês", "Tiago"]
+LAST_NAMES = ["Silva", "Santos", "Ferreira", "Pereira", "Costa", "Oliveira", "Rodrigues", "Martins"]
+
+FORM_TEMPLATES = [
+    "Formulário de contacto submetido no site\nNome: {name}\nEmail: {email}\nTelefone: {phone}\n"
+    "Nº Cliente: {customer}\nAssunto: {topic}\nMensagem: {message}\nAceito a política de privacidade: Sim",
+    "Novo pedido recebido via website goldenergy.pt\n\nCliente: {name}\nContacto telefónico: {phone}\n"
+    "Endereço de email: {email}\nCódigo de cliente: {customer}\nTipo de pedido: {topic}\n\nDescrição:\n{message}",
+    "<html><body><table><tr><td>Nome</td><td>{name}</td></tr><tr><td>Email</td><td>{email}</td></tr>"
+    "<tr><td>Telefone</td><td>{phone}</td></tr><tr><td>CPE</td><td>PT000{customer}</td></tr>"
+    "<tr><td>Pedido</td><td>{topic}</td></tr><tr><td>Comentários</td><td>{message}</td></tr></table></body></html>",
+]
+
+REQUESTS = [
+    ("Alteração de titular", "Pretendo alterar o titular do contrato de eletricidade da minha casa para o nome do meu marido."),
+    ("Leitura do contador", "Envio a leitura do contador de gás deste mês para evitar faturação por estimativa."),
+    ("Rescisão de contrato", "Venho por este meio pedir a rescisão do meu contrato de energia a partir do próximo mês."),
+    ("Fatura elevada", "A minha última fatura veio com um valor muito superior ao habitual e gostaria de perceber o motivo."),
+    ("Débito direto", "Gostaria de aderir ao débito direto para pagamento das faturas mensais na minha conta bancária."),
+    ("Mudança de casa", "Vou mudar de casa no próximo mês e quero transferir o contrato para a nova morada."),
+    ("Tarifa social", "Gostaria de saber se tenho direito à tarifa social de energia e quais os documentos necessários."),
+    ("Fatura eletrónica", "Quero deixar de receber a fatura em papel e passar a receber apenas a fatura eletrónica."),
+]
+
+FREE_TEXT = [
+    "Bom dia, a luz foi abaixo em toda a rua desde ontem à noite, sabem quando volta?",
+    "Boa tarde, recebi uma carta a dizer que tenho uma dívida mas já paguei tudo em março.",
+    "Olá, o técnico não apareceu na visita marcada para hoje de manhã, podem remarcar?",
+    "Caros senhores, solicito o envio da segunda via do contrato assinado em janeiro.",
+    "Bom dia, qual é o IBAN para transferência do valor em atraso da fatura de fevereiro?",
+    "Olá, gostaria de saber se têm tarifas bi-horárias para carregamento de carro elétrico.",
+]
+
+def random_person(rng: random.Random) -> dict:
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    return {
+        "name": f"{first} {last}",
+        "email": f"{first.lower()}.{last.lower()}{rng.randint(1, 999)}@example.com",
+        "phone": f"+351 9{rng.randint(10, 99)} {rng.randint(100, 999)} {rng.randint(100, 999)}",
+        "customer": str(rng.randint(100000000, 999999999)),
+    }
+
+def build_corpus(size: int, seed: int = 7) -> list:
+    """List of (group, text); emails sharing a group are true near duplicates"""
+    rng = random.Random(seed)
+    corpus = []
+    for index in range(size):
+        if rng.random() < 0.75:
+            template_index = rng.randrange(len(FORM_TEMPLATES))
+            request_index = rng.randrange(len(REQUESTS))
+            topic, message = REQUESTS[request_index]
+            text = FORM_TEMPLATES[template_index].format(topic=topic, message=message, **random_person(rng))
+            corpus.append((f"form-{template_index}-{request_index}", text))
+        else:
+            person = random_person(rng)
+            phrase_index = rng.randrange(len(FREE_TEXT))
+            text = f"{FREE_TEXT[phrase_index]}\n\nCumprimentos,\n{person['name']}\n{person['phone']}"
+            corpus.append((f"free-{phrase_index}", text))
+    return corpus
+
+def evaluate(corpus: list, threshold: float) -> dict:
+    index = NearDuplicateIndex(threshold=threshold, max_entries_per_scope=len(corpus))
+    seen_groups = set()
+    true_positive = false_positive = false_negative = 0
+    latencies = []
+    for position, (group, text) in enumerate(corpus):
+        start = time.perf_counter()
+        match = index.find("goldenergy.pt", text)
+        latencies.append(time.perf_counter() - start)
+        expected = group in seen_groups
+        if match and match.entry.tool_results.get("group") == group:
+            true_positive += 1
+        elif match:
+            false_positive += 1
+            if expected:
+                false_negative += 1
+        elif expected:
+            false_negative += 1
+        index.add("goldenergy.pt", f"email-{position}", text, tool_results={"group": group})
+        seen_groups.add(group)
+    precision = true_positive / (true_positive + false_positive) if true_positive + false_positive else 1.0
+    recall = true_positive / (true_positive + false_negative) if true_positive + false_negative else 1.0
+    latencies.sort()
+    return {
+        "precision": precision,
+        "recall": recall,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=2000)
+    parser.add_argument("--threshold", type=float, nargs="*", default=[0.6, 0.7, 0.8, 0.9])
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.emails)
+    print("🔍 Near-duplicate index benchmark")
+    print(f"   Corpus: {len(corpus)} emails, {len({group for group, _ in corpus})} distinct requests")
+    print("=" * 50)
+    print(f"   {'threshold':>9} {'precision':>10} {'recall':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for threshold in args.threshold:
+        result = evaluate(corpus, threshold)
+        print(f"   {threshold:>9.2f} {result['precision']:>10.3f} {result['recall']:>8.3f} "
+              f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f}")
+
+if __name__ == "__main__":
+    main()
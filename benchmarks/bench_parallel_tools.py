@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Tool calls of one model turn run one after another vs. concurrently.
+
+The mock OpenAI API asks, for every email, for `--calls` attachment
+analyses in a single turn (parallel tool calls); each one fetches the
+attachment from the mock attachment API (`--attachment-latency` seconds),
+uploads it and has it analysed. Emails are answered with the tool calls
+run one at a time (the previous loop), then concurrently, then
+concurrently with a tool timeout shorter than the attachment API takes,
+where the model gets a timeout error instead and still answers.
+
+Usage:
+    python benchmarks/bench_parallel_tools.py --emails 10 --calls 3
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from mock_openai import MockOpenAIServer
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def run(args, processor, email_request_cls, tag: str) -> list:
+    latencies = []
+    queue: asyncio.Queue = asyncio.Queue()
+    for index in range(args.emails):
+        queue.put_nowait(index)
+
+    async def worker() -> None:
+        while not queue.empty():
+            index = queue.get_nowait()
+            request = email_request_cls(
+                domain="goldenergy.pt",
+                to=["apoio@goldenergy.pt"],
+                subject=f"Faturas {index}",
+                body=f"Bom dia, envio em anexo as faturas do pedido {index}.",
+                emailId=f"{tag}-{index}",
+                **{"from": f"cliente{index}@example.com"}
+            )
+            start = time.perf_counter()
+            await processor.process_email(request, use_cache=False)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return latencies
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--calls", type=int, default=3, help="attachment analyses per turn")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--attachment-latency", type=float, default=1.0)
+    parser.add_argument("--timeout", type=float, default=0.5, help="tool timeout of the last run")
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(
+        latency=args.latency, tool_rounds=1, tool_name="analyze_email_attachment",
+        tool_calls_per_round=args.calls, attachment_latency=args.attachment_latency
+    ).start_in_thread()
+    try:
+        os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+        os.environ["OPENAI_BASE_URL"] = server.url
+        os.environ["GET_ATTACHMENT_API_URL"] = server.attachment_url
+
+        from src.api import email_ai_endpoint
+        from src.api.email_ai_endpoint import EmailAIProcessor
+        from src.models.request_models import EmailRequest
+        from src.services.near_duplicate import near_duplicate_index
+        from src.services.openai_service import close_openai_client
+        from src.services.tool_executor import ToolExecutor
+        from src.services.tool_registry import ToolRegistry
+
+        near_duplicate_index.enabled = False
+        processor = EmailAIProcessor()
+        # No process-wide limit on attachment analyses: only the calls of one turn are compared
+        unlimited = {"max_concurrency": 0}
+        executors = {
+            "one at a time": ToolExecutor(max_parallel=1, registry=ToolRegistry(settings={"analyze_email_attachment": unlimited})),
+            "concurrent": ToolExecutor(registry=ToolRegistry(settings={"analyze_email_attachment": unlimited})),
+            f"concurrent, {args.timeout}s timeout": ToolExecutor(registry=ToolRegistry(
+                settings={"analyze_email_attachment": {**unlimited, "timeout": args.timeout}}
+            ))
+        }
+
+        print("🧰 Parallel tool calls benchmark")
+        print(f"   {args.emails} emails, {args.concurrency} at a time; {args.calls} attachment analyses per turn, "
+              f"attachment API {args.attachment_latency}s")
+        print("=" * 50)
+        for name, executor in executors.items():
+            email_ai_endpoint.tool_executor = executor
+            latencies = await run(args, processor, EmailRequest, name)
+            stats = executor.stats()
+            tool = stats["tools"]["analyze_email_attachment"]
+            print(f"   {name:>27}: p50 {percentile(latencies, 0.5):5.2f}s, p95 {percentile(latencies, 0.95):5.2f}s "
+                  f"per email; tool p50 {tool['p50']:.2f}s, {tool['timeouts']} timeouts, "
+                  f"{stats['seconds_saved']:.2f}s saved by running calls concurrently")
+        print("=" * 50)
+
+        await close_openai_client()
+    finally:
+        server.stop_thread()
+
+if __name__ == "__main__":
+    asyncio.run(main())
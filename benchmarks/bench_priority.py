@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Importance-aware scheduling of OpenAI calls under saturation.
+
+A flood of low-importance emails is submitted together with a few normal
+and high-importance ones while the scheduler admits only `--concurrency`
+OpenAI calls at a time. The same workload is run first with importance
+ignored (plain FIFO) and then with priority classes, reporting the
+end-to-end answer latency of each class and the scheduler's wait metrics.
+
+Usage:
+    python benchmarks/bench_priority.py --low 80 --normal 15 --high 5 --concurrency 4
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from mock_openai import MockOpenAIServer
+
+async def run(args, processor, email_request_cls, use_importance: bool) -> dict:
+    workload = ["low"] * args.low + ["normal"] * args.normal + ["high"] * args.high
+    random.Random(args.seed).shuffle(workload)
+    latencies = {"low": [], "normal": [], "high": []}
+
+    async def one(index: int, importance: str) -> None:
+        # Staggered arrivals: the flood is already queued when urgent mail lands
+        await asyncio.sleep(index * args.arrival_gap)
+        request = email_request_cls(
+            domain="goldenergy.pt",
+            to=["apoio@goldenergy.pt"],
+            subject=f"Pedido {index}",
+            body=f"Bom dia, pedido número {index} sobre a minha fatura.",
+            emailId=f"{use_importance}-{index}",
+            importance=importance if use_importance else None,
+            **{"from": f"cliente{index}@example.com"}
+        )
+        start = time.perf_counter()
+        await processor.process_email(request, use_cache=False)
+        latencies[importance].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(index, importance) for index, importance in enumerate(workload)))
+    return {"elapsed": time.perf_counter() - start, "latencies": latencies}
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--low", type=int, default=80)
+    parser.add_argument("--normal", type=int, default=15)
+    parser.add_argument("--high", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--arrival-gap", type=float, default=0.01, help="seconds between arrivals")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(latency=args.latency).start_in_thread()
+    try:
+        os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+        os.environ["OPENAI_BASE_URL"] = server.url
+
+        from src.api import email_ai_endpoint
+        from src.api.email_ai_endpoint import EmailAIProcessor
+        from src.models.request_models import EmailRequest
+        from src.services.priority_scheduler import PriorityScheduler
+        from src.services.near_duplicate import near_duplicate_index
+        from src.services.openai_service import close_openai_client
+
+        near_duplicate_index.enabled = False
+        processor = EmailAIProcessor()
+
+        print("🚦 Priority scheduling benchmark")
+        print(f"   {args.low} low / {args.normal} normal / {args.high} high emails, "
+              f"{args.concurrency} concurrent OpenAI calls, mock latency {args.latency}s")
+        print("=" * 50)
+        for use_importance in (False, True):
+            scheduler = PriorityScheduler(max_concurrency=args.concurrency)
+            email_ai_endpoint.openai_scheduler = scheduler
+            result = await run(args, processor, EmailRequest, use_importance)
+            print(f"   {'priority' if use_importance else 'fifo':>8}: {result['elapsed']:.2f}s total")
+            for importance in ("high", "normal", "low"):
+                values = sorted(result["latencies"][importance])
+                if values:
+                    p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+                    print(f"      {importance:>6}: avg {sum(values) / len(values):6.2f}s, p95 {p95:6.2f}s")
+            if use_importance:
+                for importance, stats in scheduler.stats()["classes"].items():
+                    print(f"      scheduler {importance:>6}: max depth {stats['max_depth']:3d}, "
+                          f"avg wait {stats['avg_wait_seconds']:.2f}s, promoted {stats['promoted_by_aging']}")
+        print("=" * 50)
+
+        await close_openai_client()
+    finally:
+        server.stop_thread()
+
+if __name__ == "__main__":
+    asyncio.run(main())
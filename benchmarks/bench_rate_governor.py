@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Client-side TPM/RPM governor vs. discovering the limit through 429s.
+
+The mock OpenAI API enforces a tokens-per-minute limit (counting the input
+estimate plus max_output_tokens, like OpenAI) and answers 429 beyond it.
+A burst of emails larger than one minute of quota is sent twice: with the
+governor disabled, so calls run into 429s and the retry backoff, and with
+it enabled, seeded with the same limit, so calls wait for quota instead.
+Emails still unanswered after `--timeout` seconds are counted as timed out,
+emails whose calls run out of retries as failed.
+
+Usage:
+    python benchmarks/bench_rate_governor.py --emails 30 --tpm 120000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from mock_openai import MockOpenAIServer
+
+async def run(args, processor, email_request_cls, tag: str) -> dict:
+    failed, timed_out = [], []
+
+    async def one(index: int) -> Optional[float]:
+        try:
+            return await asyncio.wait_for(answer(index), args.timeout)
+        except asyncio.TimeoutError:
+            timed_out.append(index)
+        except Exception:
+            failed.append(index)
+        return None
+
+    async def answer(index: int) -> float:
+        request = email_request_cls(
+            domain="goldenergy.pt",
+            to=["apoio@goldenergy.pt"],
+            subject=f"Pedido {index}",
+            body=f"Bom dia, pedido número {index} sobre a minha fatura.",
+            emailId=f"{tag}-{index}",
+            **{"from": f"cliente{index}@example.com"}
+        )
+        start = time.perf_counter()
+        await processor.process_email(request, use_cache=False)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(index) for index in range(args.emails)))
+    # Latencies of the answered emails only; failures are counted separately
+    latencies = sorted(latency for latency in results if latency is not None)
+    return {
+        "elapsed": time.perf_counter() - start,
+        "answered": len(latencies),
+        "p50": latencies[len(latencies) // 2] if latencies else 0.0,
+        "max": latencies[-1] if latencies else 0.0,
+        "failed": len(failed),
+        "timed_out": len(timed_out)
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=30)
+    parser.add_argument("--tpm", type=int, default=120000)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--timeout", type=float, default=90.0, help="give up on an email after this many seconds")
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(latency=args.latency, tpm_limit=args.tpm).start_in_thread()
+    try:
+        os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+        os.environ["OPENAI_BASE_URL"] = server.url
+        os.environ["DEFAULT_AI_MODEL"] = "gpt-4o-mini"
+        os.environ["OPENAI_RATE_LIMITS"] = json.dumps({"gpt-4o-mini": {"tpm": args.tpm}})
+
+        from src.api.email_ai_endpoint import EmailAIProcessor
+        from src.models.request_models import EmailRequest
+        from src.services.near_duplicate import near_duplicate_index
+        from src.services.openai_service import close_openai_client
+        from src.services.rate_governor import rate_governor
+
+        near_duplicate_index.enabled = False
+        processor = EmailAIProcessor()
+
+        print("⏱️  Rate governor benchmark")
+        print(f"   {args.emails} emails at once, TPM limit {args.tpm}, mock latency {args.latency}s")
+        print("=" * 50)
+        for enabled in (True, False):
+            rate_governor.enabled = enabled
+            # Start each run with a full minute of quota
+            server.reset_rate_limits()
+            rate_limited = server.rate_limited
+            result = await run(args, processor, EmailRequest, f"governor-{enabled}")
+            print(f"   governor {'on ' if enabled else 'off'}: {result['elapsed']:6.2f}s total, "
+                  f"{result['answered']}/{args.emails} answered (p50 {result['p50']:5.2f}s, max {result['max']:5.2f}s), "
+                  f"{server.rate_limited - rate_limited} x 429, {result['failed']} failed, "
+                  f"{result['timed_out']} timed out")
+        for name, stats in rate_governor.stats()["models"].items():
+            print(f"   {name}: throttled {stats['throttled']}x for {stats['seconds_throttled']}s, "
+                  f"{stats['header_syncs']} header syncs, {stats['refunded_tokens']} tokens refunded")
+        print("=" * 50)
+
+        await close_openai_client()
+    finally:
+        server.stop_thread()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Deadline-aware retry policy vs. the previous fixed tenacity schedule.
+
+The mock OpenAI API first fails a fraction of /v1/responses calls with a
+transient 503, then every call with a fatal 400 (an invalid request fails
+the same way each time). Each scenario is run with the previous schedule
+(5 attempts, every error retried, 5-60s exponential waits) and with the
+retry policy (retryable errors only, jittered backoff or Retry-After,
+within the request deadline). Emails still unanswered after `--timeout`
+seconds are counted as timed out.
+
+Usage:
+    python benchmarks/bench_retry.py --emails 20 --fail-rate 0.3
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from mock_openai import MockOpenAIServer
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def run(args, processor, email_request_cls, tag: str, emails: int) -> dict:
+    outcomes = {"ok": 0, "failed": 0, "timed_out": 0, "attempts": 0, "retry_seconds": 0.0}
+    latencies = []
+
+    async def one(index: int) -> None:
+        request = email_request_cls(
+            domain="goldenergy.pt",
+            to=["apoio@goldenergy.pt"],
+            subject=f"Pedido {index}",
+            body=f"Bom dia, pedido número {index} sobre a minha fatura.",
+            emailId=f"{tag}-{index}",
+            **{"from": f"cliente{index}@example.com"}
+        )
+        retry_info = {}
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(
+                processor.process_email(request, use_cache=False, retry_info=retry_info), args.timeout
+            )
+            outcomes["ok"] += 1
+            outcomes["attempts"] += retry_info.get("attempts", 0)
+            outcomes["retry_seconds"] += retry_info.get("retry_seconds", 0.0)
+        except asyncio.TimeoutError:
+            outcomes["timed_out"] += 1
+        except Exception:
+            outcomes["failed"] += 1
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(emails)))
+    outcomes.update(elapsed=time.perf_counter() - start, p50=percentile(latencies, 0.5), p95=percentile(latencies, 0.95))
+    return outcomes
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=20)
+    parser.add_argument("--fail-rate", type=float, default=0.3, help="fraction of calls failing with 503")
+    parser.add_argument("--fatal-emails", type=int, default=5, help="emails sent while every call fails with 400")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--timeout", type=float, default=45.0, help="give up on an email after this many seconds")
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(latency=args.latency).start_in_thread()
+    try:
+        os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+        os.environ["OPENAI_BASE_URL"] = server.url
+        os.environ["RATE_GOVERNOR_ENABLED"] = "false"
+        # Measure the retry schedules alone; a tripped breaker would fail the next run's calls
+        os.environ["CIRCUIT_BREAKERS_ENABLED"] = "false"
+
+        from src.api.email_ai_endpoint import EmailAIProcessor
+        from src.models.request_models import EmailRequest
+        from src.services import openai_service, retry_policy
+        from src.services.near_duplicate import near_duplicate_index
+        from src.services.openai_service import close_openai_client
+        from src.services.retry_policy import RetryPolicy
+
+        class TenacitySchedule(RetryPolicy):
+            """The previous decorator: 5 attempts, any error, wait_exponential(min=5, max=60)"""
+
+            def is_retryable(self, error: BaseException) -> bool:
+                return not retry_policy.is_expired_response_error(error)
+
+            def backoff(self, attempt: int, error: BaseException) -> float:
+                return min(60.0, max(5.0, 2.0 ** attempt))
+
+        near_duplicate_index.enabled = False
+        processor = EmailAIProcessor()
+        policies = {
+            "previous schedule": TenacitySchedule(max_attempts=5, deadline=3600.0),
+            "retry policy": RetryPolicy.from_env()
+        }
+
+        print("🔁 Retry policy benchmark")
+        print(f"   mock latency {args.latency}s, timeout {args.timeout}s per email")
+        print("=" * 50)
+        for status, rate, emails in ((503, args.fail_rate, args.emails), (400, 1.0, args.fatal_emails)):
+            server.fail_status, server.fail_rate = status, rate
+            print(f"   {emails} emails at once, {rate:.0%} of calls fail with {status}")
+            for name, policy in policies.items():
+                openai_service.openai_retry_policy = policy
+                result = await run(args, processor, EmailRequest, f"{status}-{name}", emails)
+                print(f"      {name:>17}: {result['elapsed']:6.2f}s total, p50 {result['p50']:5.2f}s, "
+                      f"p95 {result['p95']:5.2f}s, {result['ok']} ok, {result['failed']} failed, "
+                      f"{result['timed_out']} timed out")
+                if result["ok"]:
+                    print(f"      {'':>17}  {result['attempts'] / result['ok']:.2f} attempts and "
+                          f"{result['retry_seconds'] / result['ok']:.2f}s waiting per answered email")
+        print("=" * 50)
+
+        await close_openai_client()
+    finally:
+        server.stop_thread()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+SLO-driven service tier selection vs. always using flex for reasoning models.
+
+Emails of mixed importance (each one Responses API call to o4-mini) are
+sent against the mock OpenAI API, where flex calls are slower than the
+default tier, in two phases: flex healthy, then flex congested. With the
+previous behaviour every call goes to flex; with tier selection each email
+gets the cheapest tier whose observed latency fits its SLO, and flex calls
+running past their budget fall back to the default tier. SLOs and tier
+latencies are scaled down to seconds for the benchmark.
+
+Usage:
+    python benchmarks/bench_service_tiers.py --emails 100
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from mock_openai import MockOpenAIServer
+
+SLOS = {"high": 1.0, "normal": 3.0, "low": 30.0}
+IMPORTANCE_MIX = ["high", "normal", "normal", "low", "low"]
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def run(args, processor, email_request_cls, tag: str) -> dict:
+    latencies = {importance: [] for importance in SLOS}
+
+    async def one(index: int) -> None:
+        importance = IMPORTANCE_MIX[index % len(IMPORTANCE_MIX)]
+        await asyncio.sleep(index * args.gap)
+        request = email_request_cls(
+            domain="goldenergy.pt",
+            to=["apoio@goldenergy.pt"],
+            subject=f"Pedido {index}",
+            body=f"Bom dia, pedido número {index} sobre a minha fatura.",
+            emailId=f"{tag}-{index}",
+            importance=importance,
+            AiModel="o4-mini",
+            **{"from": f"cliente{index}@example.com"}
+        )
+        start = time.perf_counter()
+        await processor.process_email(request, use_cache=False)
+        latencies[importance].append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(index) for index in range(args.emails)))
+    return latencies
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=100, help="emails per phase")
+    parser.add_argument("--gap", type=float, default=0.1, help="seconds between emails")
+    parser.add_argument("--latency", type=float, default=0.4, help="default tier latency")
+    parser.add_argument("--flex-latency", type=float, default=2.0)
+    parser.add_argument("--congested-flex-latency", type=float, default=6.0)
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(latency=args.latency).start_in_thread()
+    try:
+        os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+        os.environ["OPENAI_BASE_URL"] = server.url
+
+        from src.api import email_ai_endpoint
+        from src.api.email_ai_endpoint import EmailAIProcessor
+        from src.models.request_models import EmailRequest
+        from src.services import openai_service
+        from src.services.service_tiers import ServiceTierSelector
+        from src.services.near_duplicate import near_duplicate_index
+        from src.services.openai_service import close_openai_client
+
+        near_duplicate_index.enabled = False
+        processor = EmailAIProcessor()
+
+        print("🎚️  Service tier benchmark")
+        print(f"   {args.emails} emails per phase (high/normal/low SLO {SLOS['high']}/{SLOS['normal']}/{SLOS['low']}s); "
+              f"default tier {args.latency}s, flex {args.flex_latency}s then {args.congested_flex_latency}s")
+        print("=" * 50)
+        for enabled in (False, True):
+            selector = ServiceTierSelector(
+                enabled=enabled,
+                slos=SLOS,
+                priors={"flex": args.flex_latency, "auto": args.latency},
+                probe_interval=5.0
+            )
+            email_ai_endpoint.service_tiers = openai_service.service_tiers = selector
+            print(f"   {'tier selection' if enabled else 'always flex'}:")
+            for phase, flex_latency in (("flex healthy", args.flex_latency), ("flex congested", args.congested_flex_latency)):
+                server.tier_latency = {"flex": flex_latency}
+                server.tier_calls = {}
+                latencies = await run(args, processor, EmailRequest, f"{enabled}-{phase}")
+                flex_share = server.tier_calls.get("flex", 0) / max(1, sum(server.tier_calls.values()))
+                summary = ", ".join(
+                    f"{importance} p95 {percentile(values, 0.95):4.2f}s "
+                    f"({sum(1 for value in values if value <= SLOS[importance]) / len(values):.0%} in SLO)"
+                    for importance, values in latencies.items()
+                )
+                print(f"      {phase:>14}: {summary}; {flex_share:.0%} of calls on flex")
+            if enabled:
+                stats = selector.stats()
+                print(f"      {stats['flex_fallbacks']} flex fallbacks, {stats['flex_probes']} probes, "
+                      f"tiers chosen {stats['choices']}")
+        print("=" * 50)
+
+        await close_openai_client()
+    finally:
+        server.stop_thread()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Token reduction and parse time of the quoted-thread stripper on a synthetic
+corpus of real-shaped RE:/FW: threads.
+
+Threads are built the way mail clients quote them: Outlook web and desktop
+HTML (reply divider / top-bordered From:-Sent: block), Gmail HTML
+(gmail_quote + blockquote), plain text with "From:/Sent:" or "De:/Enviado:"
+headers and plain text with "> " quoting, in Portuguese and English, 1 to 8
+messages deep, each quoted message carrying a signature and disclaimer.
+
+Usage:
+    python benchmarks/bench_thread_stripping.py --threads 500
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.services.thread_stripper import ThreadStripper
+
+PEOPLE = [
+    ("Maria Silva", "maria.silva@example.com"),
+    ("Apoio ao Cliente", "apoio@goldenergy.pt"),
+    ("John Carter", "john.carter@example.co.uk"),
+    ("Pedro Costa", "pedro.costa@example.pt"),
+]
+
+MESSAGES = [
+    "Bom dia,\nA minha última fatura veio com um valor muito superior ao habitual. Podem verificar se a leitura do contador está correta? Envio em anexo a fotografia do contador.",
+    "Boa tarde,\nObrigado pelo contacto. Vamos analisar a situação e entraremos em contacto num prazo de 5 dias úteis.",
+    "Hello,\nI moved out of the apartment last month and would like to terminate the electricity contract. Please let me know which documents you need.",
+    "Olá,\nJá enviei a leitura na semana passada mas continuo sem resposta. Podem dar-me uma previsão para a correção da fatura?",
+    "Dear customer,\nWe have received your request and forwarded it to the billing department. You will receive an answer shortly.",
+]
+
+SIGNATURE = (
+    "Com os melhores cumprimentos,\n{name}\nGoldenergy - Comercializadora de Energia, S.A.\n"
+    "Rua do Exemplo, 123, 4000-000 Porto | Tel.: +351 220 000 000\n"
+    "Esta mensagem e quaisquer ficheiros anexos são confidenciais e destinados exclusivamente ao destinatário. "
+    "Se recebeu esta mensagem por engano, por favor notifique o remetente e elimine-a. "
+    "This message and any attachments are confidential and intended solely for the addressee."
+)
+
+OUTLOOK_STYLE = (
+    "<style><!-- p.MsoNormal, li.MsoNormal, div.MsoNormal {margin:0cm; font-size:11.0pt; "
+    "font-family:\"Calibri\",sans-serif;} a:link {color:#0563C1; text-decoration:underline;} --></style>"
+)
+
+def html_paragraphs(text: str) -> str:
+    return "".join(
+        f"<p class=\"MsoNormal\"><span style=\"font-size:11.0pt;font-family:'Calibri',sans-serif\">{line}</span></p>"
+        for line in text.splitlines()
+    )
+
+def header_fields(rng: random.Random, english: bool) -> dict:
+    name, address = rng.choice(PEOPLE)
+    labels = ("From", "Sent", "To", "Subject") if english else ("De", "Enviado", "Para", "Assunto")
+    return {
+        "labels": labels,
+        "from": f"{name} <{address}>",
+        "name": name,
+        "sent": "Monday, 3 June 2024 10:12" if english else "segunda-feira, 3 de junho de 2024 10:12",
+        "to": "apoio@goldenergy.pt",
+        "subject": "RE: Fatura elevada",
+    }
+
+def quoted_message(rng: random.Random) -> tuple:
+    fields = header_fields(rng, rng.random() < 0.4)
+    text = f"{rng.choice(MESSAGES)}\n\n{SIGNATURE.format(name=fields['name'])}"
+    return fields, text
+
+def outlook_html(rng: random.Random, depth: int) -> str:
+    body = OUTLOOK_STYLE + "<div class=\"WordSection1\">" + html_paragraphs(rng.choice(MESSAGES))
+    for _ in range(depth):
+        fields, text = quoted_message(rng)
+        l_from, l_sent, l_to, l_subject = fields["labels"]
+        if rng.random() < 0.5:
+            # Outlook on the web / mobile
+            body += (
+                "<hr style=\"display:inline-block;width:98%\" tabindex=\"-1\"><div id=\"divRplyFwdMsg\" dir=\"ltr\">"
+                f"<font face=\"Calibri, sans-serif\" style=\"font-size:11pt\"><b>{l_from}:</b> {fields['from']}<br>"
+                f"<b>{l_sent}:</b> {fields['sent']}<br><b>{l_to}:</b> {fields['to']}<br>"
+                f"<b>{l_subject}:</b> {fields['subject']}</font><div>&nbsp;</div></div>"
+            )
+        else:
+            # Outlook desktop
+            body += (
+                "<div><div style=\"border:none;border-top:solid #E1E1E1 1.0pt;padding:3.0pt 0cm 0cm 0cm\">"
+                f"<p class=\"MsoNormal\"><b><span lang=\"EN-US\">{l_from}:</span></b><span lang=\"EN-US\"> {fields['from']}<br>"
+                f"<b>{l_sent}:</b> {fields['sent']}<br><b>{l_to}:</b> {fields['to']}<br>"
+                f"<b>{l_subject}:</b> {fields['subject']}</span></p></div></div>"
+            )
+        body += html_paragraphs(text)
+    return body + "</div>"
+
+def gmail_html(rng: random.Random, depth: int) -> str:
+    body = f"<div dir=\"ltr\">{rng.choice(MESSAGES).replace(chr(10), '<br>')}</div>"
+    closing = ""
+    for _ in range(depth):
+        fields, text = quoted_message(rng)
+        wrote = "wrote" if fields["labels"][0] == "From" else "escreveu"
+        on = "On" if wrote == "wrote" else "Em"
+        body += (
+            f"<div class=\"gmail_quote\"><div dir=\"ltr\" class=\"gmail_attr\">{on} {fields['sent']}, "
+            f"{fields['from'].replace('<', '&lt;').replace('>', '&gt;')} {wrote}:<br></div>"
+            "<blockquote class=\"gmail_quote\" style=\"margin:0px 0px 0px 0.8ex;border-left:1px solid rgb(204,204,204);padding-left:1ex\">"
+            f"<div dir=\"ltr\">{text.replace(chr(10), '<br>')}</div>"
+        )
+        closing += "</blockquote></div>"
+    return body + closing
+
+def header_text(rng: random.Random, depth: int) -> str:
+    body = rng.choice(MESSAGES)
+    for _ in range(depth):
+        fields, text = quoted_message(rng)
+        l_from, l_sent, l_to, l_subject = fields["labels"]
+        separator = "-----Original Message-----\n" if rng.random() < 0.3 else ""
+        body += (
+            f"\n\n{separator}{l_from}: {fields['from']}\n{l_sent}: {fields['sent']}\n"
+            f"{l_to}: {fields['to']}\n{l_subject}: {fields['subject']}\n\n{text}"
+        )
+    return body
+
+def angle_quoted_text(rng: random.Random, depth: int) -> str:
+    body = rng.choice(MESSAGES)
+    for level in range(1, depth + 1):
+        fields, text = quoted_message(rng)
+        wrote = "wrote" if fields["labels"][0] == "From" else "escreveu"
+        on = "On" if wrote == "wrote" else "Em"
+        prefix = "> " * level
+        body += f"\n\n{'> ' * (level - 1)}{on} {fields['sent']}, {fields['from']} {wrote}:\n"
+        body += "\n".join(f"{prefix}{line}" for line in text.splitlines())
+    return body
+
+BUILDERS = [
+    ("outlook-html", True, outlook_html),
+    ("gmail-html", True, gmail_html),
+    ("header-text", False, header_text),
+    ("quoted-text", False, angle_quoted_text),
+]
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (4 characters per token)"""
+    return len(text) // 4
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=500)
+    parser.add_argument("--max-messages", type=int, default=3)
+    parser.add_argument("--max-chars", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    stripper = ThreadStripper(max_messages=args.max_messages, max_chars_per_message=args.max_chars)
+
+    print("✂️  Quoted-thread stripping benchmark")
+    print(f"   {args.threads} threads per client style, 1-8 messages deep")
+    print("=" * 72)
+    print(f"   {'style':<14} {'tokens in':>10} {'tokens out':>11} {'reduction':>10} {'detected':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for style, is_html, build in BUILDERS:
+        tokens_in = tokens_out = detected = 0
+        timings = []
+        for _ in range(args.threads):
+            depth = rng.randint(1, 8)
+            body = build(rng, depth)
+            start = time.perf_counter()
+            result = stripper.strip(body, is_html=is_html)
+            timings.append(time.perf_counter() - start)
+            tokens_in += estimate_tokens(body)
+            tokens_out += estimate_tokens(result.body) + estimate_tokens(result.history)
+            detected += 1 if result.quoted_messages else 0
+        timings.sort()
+        print(f"   {style:<14} {tokens_in:>10} {tokens_out:>11} {1 - tokens_out / tokens_in:>10.1%} "
+              f"{detected / args.threads:>9.1%} {statistics.median(timings) * 1000:>8.2f} "
+              f"{timings[int(len(timings) * 0.95)] * 1000:>8.2f}")
+    print("=" * 72)
+    stats = stripper.stats()
+    print(f"   Overall reduction {stats['reduction']:.1%}, average parse time {stats['avg_parse_ms']:.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Attachment analyses with and without a process-wide concurrency limit.
+
+`--emails` emails arrive at once and each asks, in a single turn, for
+`--calls` attachment analyses. The mock attachment API takes
+`--attachment-latency` seconds per call up to `--capacity` calls in
+flight; past that every call slows down (a saturated backend). Tool calls
+time out after `--timeout` seconds.
+
+Without a limit every call is sent at once, the API saturates and calls
+run past their timeout, so the model answers without the attachments.
+With the registry's max_concurrency set to the API's capacity, calls
+queue for a slot instead (the wait does not count against the timeout)
+and each one runs at full speed.
+
+Usage:
+    python benchmarks/bench_tool_limits.py --emails 12 --calls 3
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from mock_openai import MockOpenAIServer
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def run(args, processor, email_request_cls, tag: str) -> list:
+    async def one(index: int) -> float:
+        request = email_request_cls(
+            domain="goldenergy.pt",
+            to=["apoio@goldenergy.pt"],
+            subject=f"Faturas {index}",
+            body=f"Bom dia, envio em anexo as faturas do pedido {index}.",
+            emailId=f"{tag}-{index}",
+            **{"from": f"cliente{index}@example.com"}
+        )
+        start = time.perf_counter()
+        await processor.process_email(request, use_cache=False)
+        return time.perf_counter() - start
+
+    return await asyncio.gather(*(one(index) for index in range(args.emails)))
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=12)
+    parser.add_argument("--calls", type=int, default=3, help="attachment analyses per turn")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--attachment-latency", type=float, default=0.5)
+    parser.add_argument("--capacity", type=int, default=4, help="attachment API calls served at full speed")
+    parser.add_argument("--timeout", type=float, default=3.0, help="attachment analysis timeout")
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(
+        latency=args.latency, tool_rounds=1, tool_name="analyze_email_attachment",
+        tool_calls_per_round=args.calls, attachment_latency=args.attachment_latency,
+        attachment_capacity=args.capacity
+    ).start_in_thread()
+    try:
+        os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+        os.environ["OPENAI_BASE_URL"] = server.url
+        os.environ["GET_ATTACHMENT_API_URL"] = server.attachment_url
+        os.environ["RATE_GOVERNOR_ENABLED"] = "false"
+
+        from src.api import email_ai_endpoint
+        from src.api.email_ai_endpoint import EmailAIProcessor
+        from src.models.request_models import EmailRequest
+        from src.services.near_duplicate import near_duplicate_index
+        from src.services.openai_service import close_openai_client
+        from src.services.tool_executor import ToolExecutor
+        from src.services.tool_registry import ToolRegistry
+
+        near_duplicate_index.enabled = False
+        processor = EmailAIProcessor()
+
+        print("🚦 Tool concurrency limit benchmark")
+        print(f"   {args.emails} emails at once, {args.calls} attachment analyses each; attachment API "
+              f"{args.attachment_latency}s up to {args.capacity} calls in flight, tool timeout {args.timeout}s")
+        print("=" * 50)
+        for max_concurrency in (0, args.capacity):
+            registry = ToolRegistry(settings={
+                "analyze_email_attachment": {"timeout": args.timeout, "max_concurrency": max_concurrency}
+            })
+            executor = ToolExecutor(registry=registry)
+            email_ai_endpoint.tool_executor = executor
+            # Calls that timed out in the previous run may still be loading the attachment API
+            while server.attachments_in_flight:
+                await asyncio.sleep(0.1)
+            server.max_attachments_in_flight = 0
+            latencies = await run(args, processor, EmailRequest, f"limit-{max_concurrency}")
+            tool = executor.stats()["tools"]["analyze_email_attachment"]
+            limits = registry.stats()["analyze_email_attachment"]
+            print(f"   {f'max_concurrency {max_concurrency}' if max_concurrency else 'no limit':>17}: "
+                  f"email p50 {percentile(latencies, 0.5):5.2f}s, p95 {percentile(latencies, 0.95):5.2f}s; "
+                  f"{tool['calls'] - tool['timeouts']}/{tool['calls']} analyses in time "
+                  f"(run p50 {tool['p50']:.2f}s, slot wait p95 {limits['wait_p95']:.2f}s); "
+                  f"attachment API peak {server.max_attachments_in_flight} in flight")
+        print("=" * 50)
+
+        await close_openai_client()
+    finally:
+        server.stop_thread()
+
+if __name__ == "__main__":
+    asyncio.run(main())
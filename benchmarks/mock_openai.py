@@ -0,0 +1,576 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI HTTP API used by the benchmark scripts.
+
+It is a tiny dependency-free asyncio HTTP/1.1 server (keep-alive, chunked
+responses) that answers POST /v1/responses after a configurable latency, so
+the service can be exercised end-to-end without network access or tokens.
+It also emulates the Files and Batch APIs: an uploaded JSONL batch is run
+through the same /v1/responses handler after `batch_latency` seconds.
+With rpm_limit / tpm_limit set, /v1/responses enforces per-minute limits as
+continuously refilled buckets, reports them in x-ratelimit-* headers and
+answers 429 beyond them. With fail_rate set, that fraction of /v1/responses
+calls fails with fail_status instead (after fail_latency seconds); with
+slow_rate set, that fraction takes slow_latency seconds instead of latency
+(a latency tail). tier_latency overrides the latency per requested
+service_tier; model_latency and model_fail_rate override the latency and
+fail_rate per requested model. tool_name picks the function asked for in
+tool rounds, tool_calls_per_round how many calls of it each round asks for.
+Point the service at it with OPENAI_BASE_URL=<server.url>.
+POST /attachments stands in for the attachment API
+(GET_ATTACHMENT_API_URL=<server.attachment_url>), answering after
+attachment_latency seconds, or with a 503 after fail_latency seconds for
+attachment_fail_rate of calls. With attachment_capacity set, calls beyond
+that many in flight share its capacity and all slow down (a saturated
+backend).
+"""
+
+import asyncio
+import base64
+import json
+import random
+from email.parser import BytesParser
+from email.policy import HTTP
+import threading
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple, Union
+
+Body = Union[bytes, AsyncIterator[bytes]]
+MockResponse = Tuple[int, Dict[str, str], Body]
+Handler = Callable[["MockRequest"], Awaitable[MockResponse]]
+
+FINAL_ANSWER = {
+    "subjectPrefix": "RE: ",
+    "body": "<p>Bom dia,</p><p>Obrigado pelo seu contacto.</p>",
+    "confidence": 80,
+    "language": "pt-PT"
+}
+
+# Arguments of the function calls asked for in tool rounds
+TOOL_ARGUMENTS = {
+    "analyze_email_attachment": {
+        "emailId": "AAMk-mock", "attachmentId": "AAMk-attachment", "attachmentFileName": "fatura.pdf",
+        "prompt": "Qual é o valor da fatura?"
+    }
+}
+
+class MockRequest:
+    def __init__(self, method: str, path: str, headers: Dict[str, str], body: bytes):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> Any:
+        return json.loads(self.body or b"{}")
+
+def json_response(payload: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> MockResponse:
+    """Build a JSON response tuple"""
+    response_headers = {"content-type": "application/json"}
+    response_headers.update(headers or {})
+    return status, response_headers, json.dumps(payload).encode("utf-8")
+
+def completed_response(
+    text: str,
+    model: str = "mock-model",
+    input_tokens: int = 1200,
+    output_tokens: int = 300,
+    previous_response_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Responses API payload with a single completed assistant message"""
+    return {
+        "id": f"resp_{uuid.uuid4().hex}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "status": "completed",
+        "model": model,
+        "previous_response_id": previous_response_id,
+        "output": [
+            {
+                "id": f"msg_{uuid.uuid4().hex}",
+                "type": "message",
+                "role": "assistant",
+                "status": "completed",
+                "content": [{"type": "output_text", "text": text, "annotations": []}]
+            }
+        ],
+        "usage": {
+            "input_tokens": input_tokens,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": input_tokens + output_tokens
+        }
+    }
+
+def estimate_tokens(content: Any) -> int:
+    """Rough token count (4 characters per token) of a request fragment"""
+    if content is None:
+        return 0
+    if not isinstance(content, str):
+        content = json.dumps(content, ensure_ascii=False)
+    return len(content) // 4
+
+def function_call_response(
+    name: str,
+    arguments: Dict[str, Any],
+    model: str = "mock-model",
+    input_tokens: int = 1200
+) -> Dict[str, Any]:
+    """Responses API payload asking the caller to run one function"""
+    payload = completed_response("", model=model, input_tokens=input_tokens, output_tokens=40)
+    payload["output"] = [
+        {
+            "id": f"fc_{uuid.uuid4().hex}",
+            "type": "function_call",
+            "status": "completed",
+            "call_id": f"call_{uuid.uuid4().hex[:12]}",
+            "name": name,
+            "arguments": json.dumps(arguments, ensure_ascii=False)
+        }
+    ]
+    return payload
+
+class MockOpenAIServer:
+    """Minimal OpenAI API stand-in with pluggable route handlers"""
+
+    def __init__(
+        self,
+        latency: float = 1.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        tool_rounds: int = 0,
+        latency_per_1k_input: float = 0.0,
+        batch_latency: float = 0.5,
+        rpm_limit: Optional[int] = None,
+        tpm_limit: Optional[int] = None,
+        fail_rate: float = 0.0,
+        fail_status: int = 503,
+        fail_latency: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_latency: float = 10.0,
+        tier_latency: Optional[Dict[str, float]] = None,
+        model_latency: Optional[Dict[str, float]] = None,
+        model_fail_rate: Optional[Dict[str, float]] = None,
+        tool_name: str = "content_not_available",
+        tool_calls_per_round: int = 1,
+        attachment_latency: float = 0.05,
+        attachment_fail_rate: float = 0.0,
+        attachment_capacity: int = 0
+    ):
+        self.latency = latency
+        self.batch_latency = batch_latency
+        self.files: Dict[str, Tuple[str, bytes]] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.tool_rounds = tool_rounds
+        self.latency_per_1k_input = latency_per_1k_input
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self.rate_available = {"requests": float(rpm_limit or 0), "tokens": float(tpm_limit or 0)}
+        self.rate_updated = time.monotonic()
+        self.rate_limited = 0
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.fail_latency = fail_latency
+        self.failures_injected = 0
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.slow_calls = 0
+        self.tier_latency = tier_latency or {}
+        self.tier_calls: Dict[str, int] = {}
+        self.model_latency = model_latency or {}
+        self.model_fail_rate = model_fail_rate or {}
+        self.model_calls: Dict[str, int] = {}
+        self.tool_name = tool_name
+        self.tool_calls_per_round = tool_calls_per_round
+        self.attachment_latency = attachment_latency
+        self.attachment_fail_rate = attachment_fail_rate
+        self.attachment_calls = 0
+        self.attachment_capacity = attachment_capacity
+        self.attachments_in_flight = 0
+        self.max_attachments_in_flight = 0
+        self.expire_responses = False
+        self.stored_responses: Dict[str, Tuple[int, int]] = {}
+        self.host = host
+        self.port = port
+        self.requests_served = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.connections_opened = 0
+        self.request_log: list = []
+        self.seen_prefixes: set = set()
+        self.routes: Dict[Tuple[str, str], Handler] = {
+            ("POST", "/v1/responses"): self.handle_responses,
+            ("POST", "/v1/files"): self.handle_file_upload,
+            ("GET", "/v1/files/"): self.handle_file_get,
+            ("POST", "/v1/batches"): self.handle_batch_create,
+            ("GET", "/v1/batches/"): self.handle_batch_get,
+            ("POST", "/attachments"): self.handle_attachment
+        }
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: set = set()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    @property
+    def attachment_url(self) -> str:
+        return f"http://{self.host}:{self.port}/attachments"
+
+    async def start(self) -> "MockOpenAIServer":
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            # Calls the client gave up on (e.g. a losing hedge) may still be sleeping
+            for task in list(self._connections):
+                task.cancel()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    def start_in_thread(self) -> "MockOpenAIServer":
+        """Serve from a dedicated event loop thread, isolated from the caller's loop"""
+        ready = threading.Event()
+        self._loop = asyncio.new_event_loop()
+
+        def _run():
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self.start())
+            ready.set()
+            self._loop.run_forever()
+
+        threading.Thread(target=_run, name="mock-openai", daemon=True).start()
+        ready.wait()
+        return self
+
+    def stop_thread(self) -> None:
+        asyncio.run_coroutine_threadsafe(self.stop(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    async def __aenter__(self) -> "MockOpenAIServer":
+        return await self.start()
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+    def reset_rate_limits(self) -> None:
+        self.rate_available = {"requests": float(self.rpm_limit or 0), "tokens": float(self.tpm_limit or 0)}
+        self.rate_updated = time.monotonic()
+
+    def rate_limit(self, tokens: int) -> Tuple[bool, Dict[str, str]]:
+        """Admit a request of `tokens` against the per-minute buckets"""
+        limits = {"requests": self.rpm_limit, "tokens": self.tpm_limit}
+        if not any(limits.values()):
+            return True, {}
+        now = time.monotonic()
+        for kind, limit in limits.items():
+            if limit:
+                self.rate_available[kind] = min(
+                    float(limit), self.rate_available[kind] + (now - self.rate_updated) * limit / 60.0
+                )
+        self.rate_updated = now
+        cost = {"requests": 1, "tokens": tokens}
+        allowed = all(not limit or self.rate_available[kind] >= cost[kind] for kind, limit in limits.items())
+        headers = {}
+        for kind, limit in limits.items():
+            if not limit:
+                continue
+            if allowed:
+                self.rate_available[kind] -= cost[kind]
+            available = self.rate_available[kind]
+            headers[f"x-ratelimit-limit-{kind}"] = str(limit)
+            headers[f"x-ratelimit-remaining-{kind}"] = str(max(0, int(available)))
+            headers[f"x-ratelimit-reset-{kind}"] = f"{(limit - available) * 60.0 / limit:.3f}s"
+        if not allowed:
+            self.rate_limited += 1
+            headers["retry-after"] = f"{max((cost[kind] - self.rate_available[kind]) * 60.0 / limit for kind, limit in limits.items() if limit):.3f}"
+        return allowed, headers
+
+    async def handle_responses(self, request: MockRequest) -> MockResponse:
+        """Default /v1/responses handler: sleep, then return the final JSON answer.
+
+        With tool_rounds > 0 the first turns of a conversation return a
+        tool_name function call instead. Conversations chained with
+        previous_response_id are billed for the stored context plus the new
+        input, like the real API.
+        """
+        body = request.json()
+        model = body.get("model", "mock-model")
+        self.model_calls[model] = self.model_calls.get(model, 0) + 1
+        fail_rate = self.model_fail_rate.get(model, self.fail_rate)
+        if fail_rate and random.random() < fail_rate:
+            self.failures_injected += 1
+            await asyncio.sleep(self.fail_latency)
+            return json_response({"error": {
+                "message": f"Injected failure ({self.fail_status})",
+                "type": "server_error" if self.fail_status >= 500 else "invalid_request_error",
+                "code": None
+            }}, status=self.fail_status)
+        allowed, rate_headers = self.rate_limit(
+            estimate_tokens(body.get("input")) + estimate_tokens(body.get("instructions"))
+            + estimate_tokens(body.get("tools")) + body.get("max_output_tokens", 4096)
+        )
+        if not allowed:
+            return json_response({"error": {
+                "message": "Rate limit reached, please try again later.",
+                "type": "tokens",
+                "code": "rate_limit_exceeded"
+            }}, status=429, headers=rate_headers)
+        previous_response_id = body.get("previous_response_id")
+        context_tokens, tool_outputs = 0, 0
+        if previous_response_id:
+            if self.expire_responses or previous_response_id not in self.stored_responses:
+                return json_response({"error": {
+                    "message": f"Previous response with id '{previous_response_id}' not found.",
+                    "type": "invalid_request_error",
+                    "param": "previous_response_id",
+                    "code": "previous_response_not_found"
+                }}, status=400)
+            context_tokens, tool_outputs = self.stored_responses[previous_response_id]
+
+        new_items = body.get("input") if isinstance(body.get("input"), list) else []
+        tool_outputs += sum(1 for item in new_items if item.get("type") == "function_call_output")
+        input_tokens = (
+            context_tokens
+            + estimate_tokens(body.get("input"))
+            + estimate_tokens(body.get("instructions"))
+            + estimate_tokens(body.get("tools"))
+        )
+
+        if tool_outputs < self.tool_rounds * self.tool_calls_per_round:
+            payload = function_call_response(
+                self.tool_name,
+                TOOL_ARGUMENTS.get(self.tool_name, {"Subject": f"Tema {tool_outputs + 1}"}),
+                model=body.get("model", "mock-model"),
+                input_tokens=input_tokens
+            )
+            for index in range(1, self.tool_calls_per_round):
+                # Parallel tool calls: more function calls in the same turn
+                arguments = dict(TOOL_ARGUMENTS.get(self.tool_name, {"Subject": f"Tema {tool_outputs + 1}"}))
+                arguments.update({key: f"{arguments[key]}-{index}" for key in ("Subject", "attachmentId") if key in arguments})
+                payload["output"] += function_call_response(self.tool_name, arguments)["output"]
+        else:
+            payload = completed_response(
+                json.dumps(FINAL_ANSWER),
+                model=body.get("model", "mock-model"),
+                input_tokens=input_tokens,
+                previous_response_id=previous_response_id
+            )
+        self.stored_responses[payload["id"]] = (
+            input_tokens + payload["usage"]["output_tokens"], tool_outputs
+        )
+        # Emulate prefix prompt caching: a repeated tools + instructions prefix is cached
+        prefix = json.dumps([body.get("tools"), body.get("instructions")], sort_keys=True)
+        if prefix in self.seen_prefixes:
+            payload["usage"]["input_tokens_details"]["cached_tokens"] = 1024
+        self.seen_prefixes.add(prefix)
+        if body.get("stream"):
+            return 200, {"content-type": "text/event-stream", **rate_headers}, self.stream_response(payload)
+        tier = body.get("service_tier", "auto")
+        self.tier_calls[tier] = self.tier_calls.get(tier, 0) + 1
+        payload["service_tier"] = "default" if tier == "auto" else tier
+        latency = self.model_latency.get(model, self.tier_latency.get(tier, self.latency))
+        if self.slow_rate and random.random() < self.slow_rate:
+            self.slow_calls += 1
+            latency = self.slow_latency
+        await asyncio.sleep(latency + input_tokens / 1000 * self.latency_per_1k_input)
+        return json_response(payload, headers=rate_headers)
+
+    async def handle_attachment(self, request: MockRequest) -> MockResponse:
+        """POST /attachments: the attachment API, returning a small base64 document"""
+        self.attachment_calls += 1
+        if self.attachment_fail_rate and random.random() < self.attachment_fail_rate:
+            await asyncio.sleep(self.fail_latency)
+            return json_response({"error": "Injected attachment API failure"}, status=503)
+        self.attachments_in_flight += 1
+        self.max_attachments_in_flight = max(self.max_attachments_in_flight, self.attachments_in_flight)
+        try:
+            # Processor sharing: past capacity every call progresses at capacity / in-flight speed
+            remaining = self.attachment_latency
+            while remaining > 0:
+                share = min(1.0, self.attachment_capacity / self.attachments_in_flight) if self.attachment_capacity else 1.0
+                step = min(0.05, remaining / share)
+                await asyncio.sleep(step)
+                remaining -= step * share
+        finally:
+            self.attachments_in_flight -= 1
+        return json_response({"contentBytes": base64.b64encode(b"%PDF-1.4 mock invoice").decode("ascii")})
+
+    async def handle_file_upload(self, request: MockRequest) -> MockResponse:
+        """POST /v1/files (multipart/form-data with "file" and "purpose" parts)"""
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"content-type: {request.headers.get('content-type', '')}\r\n\r\n".encode("latin-1") + request.body
+        )
+        content, purpose = b"", "batch"
+        for part in message.iter_parts():
+            if part.get_param("name", header="content-disposition") == "file":
+                content = part.get_payload(decode=True) or b""
+            elif part.get_param("name", header="content-disposition") == "purpose":
+                purpose = (part.get_payload(decode=True) or b"batch").decode()
+        return json_response(self._store_file(content, purpose))
+
+    def _store_file(self, content: bytes, purpose: str) -> Dict[str, Any]:
+        file_id = f"file-{uuid.uuid4().hex}"
+        self.files[file_id] = (purpose, content)
+        return {
+            "id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+            "filename": f"{file_id}.jsonl", "purpose": purpose, "status": "processed"
+        }
+
+    async def handle_file_get(self, request: MockRequest) -> MockResponse:
+        """GET /v1/files/{id} and GET /v1/files/{id}/content"""
+        parts = request.path.split("?", 1)[0].rstrip("/").split("/")
+        file_id = parts[3] if len(parts) > 3 else ""
+        if file_id not in self.files:
+            return json_response({"error": {"message": f"No such file: {file_id}"}}, status=404)
+        purpose, content = self.files[file_id]
+        if parts[-1] == "content":
+            return 200, {"content-type": "application/octet-stream"}, content
+        return json_response({"id": file_id, "object": "file", "bytes": len(content), "purpose": purpose})
+
+    async def handle_batch_create(self, request: MockRequest) -> MockResponse:
+        """POST /v1/batches: run the input file after batch_latency seconds"""
+        body = request.json()
+        if body.get("input_file_id") not in self.files:
+            return json_response({"error": {"message": "input_file_id not found"}}, status=400)
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        batch = {
+            "id": batch_id, "object": "batch", "endpoint": body.get("endpoint"),
+            "input_file_id": body["input_file_id"], "completion_window": body.get("completion_window", "24h"),
+            "status": "in_progress", "created_at": int(time.time()), "output_file_id": None,
+            "error_file_id": None, "metadata": body.get("metadata"),
+            "request_counts": {"total": 0, "completed": 0, "failed": 0}
+        }
+        self.batches[batch_id] = batch
+        asyncio.ensure_future(self._run_batch(batch))
+        return json_response(batch)
+
+    async def _run_batch(self, batch: Dict[str, Any]) -> None:
+        await asyncio.sleep(self.batch_latency)
+        lines = [json.loads(line) for line in self.files[batch["input_file_id"]][1].decode("utf-8").splitlines() if line.strip()]
+        latency, self.latency = self.latency, 0.0
+
+        async def run(line: Dict[str, Any]) -> Dict[str, Any]:
+            request = MockRequest("POST", line["url"], {}, json.dumps(line["body"]).encode("utf-8"))
+            status, _, response_body = await self.handle_responses(request)
+            return {
+                "id": f"batch_req_{uuid.uuid4().hex}", "custom_id": line["custom_id"],
+                "response": {"status_code": status, "request_id": uuid.uuid4().hex, "body": json.loads(response_body)},
+                "error": None
+            }
+
+        try:
+            results = await asyncio.gather(*(run(line) for line in lines))
+        finally:
+            self.latency = latency
+        output = "".join(json.dumps(result) + "\n" for result in results).encode("utf-8")
+        batch.update({
+            "status": "completed",
+            "output_file_id": self._store_file(output, "batch_output")["id"],
+            "completed_at": int(time.time()),
+            "request_counts": {"total": len(lines), "completed": len(lines), "failed": 0}
+        })
+
+    async def handle_batch_get(self, request: MockRequest) -> MockResponse:
+        """GET /v1/batches/{id}"""
+        batch_id = request.path.split("?", 1)[0].rstrip("/").split("/")[-1]
+        if batch_id not in self.batches:
+            return json_response({"error": {"message": f"No such batch: {batch_id}"}}, status=404)
+        return json_response(self.batches[batch_id])
+
+    async def stream_response(self, payload: Dict[str, Any], chunk_chars: int = 8) -> AsyncIterator[bytes]:
+        """Replay a response as Responses API SSE events spread over `latency`"""
+        def event(kind: str, data: Dict[str, Any]) -> bytes:
+            return f"event: {kind}\ndata: {json.dumps({'type': kind, **data})}\n\n".encode("utf-8")
+
+        yield event("response.created", {"response": {**payload, "status": "in_progress", "output": []}})
+        text = "".join(
+            part.get("text", "")
+            for item in payload["output"] if item["type"] == "message"
+            for part in item["content"]
+        )
+        chunks = [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)] or [""]
+        # Time to first token is ~20% of the latency; the rest is spread over the deltas
+        await asyncio.sleep(self.latency * 0.2)
+        for chunk in chunks:
+            yield event("response.output_text.delta", {
+                "item_id": payload["output"][0]["id"], "output_index": 0,
+                "content_index": 0, "delta": chunk
+            })
+            await asyncio.sleep(self.latency * 0.8 / len(chunks))
+        yield event("response.completed", {"response": payload})
+
+    async def _dispatch(self, request: MockRequest) -> MockResponse:
+        path = request.path.split("?", 1)[0]
+        handler = self.routes.get((request.method, path))
+        if handler is None:
+            for (method, prefix), candidate in self.routes.items():
+                if method == request.method and prefix.endswith("/") and path.startswith(prefix):
+                    handler = candidate
+                    break
+        if handler is None:
+            return json_response({"error": {"message": f"No route for {request.method} {path}"}}, status=404)
+        return await handler(request)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections_opened += 1
+        self._connections.add(asyncio.current_task())
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers: Dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", "0"))
+                body = await reader.readexactly(length) if length else b""
+                request = MockRequest(method, path, headers, body)
+                self.request_log.append(request)
+
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                try:
+                    status, response_headers, response_body = await self._dispatch(request)
+                finally:
+                    self.in_flight -= 1
+                self.requests_served += 1
+
+                head = [f"HTTP/1.1 {status} MOCK"]
+                head += [f"{name}: {value}" for name, value in response_headers.items()]
+                if isinstance(response_body, bytes):
+                    head.append(f"content-length: {len(response_body)}")
+                    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + response_body)
+                else:
+                    head.append("transfer-encoding: chunked")
+                    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+                    async for chunk in response_body:
+                        writer.write(f"{len(chunk):x}\r\n".encode("latin-1") + chunk + b"\r\n")
+                        await writer.drain()
+                    writer.write(b"0\r\n\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError, asyncio.CancelledError):
+            # Cancelled only by stop(); ending quietly keeps shutdown free of tracebacks
+            pass
+        finally:
+            self._connections.discard(asyncio.current_task())
+            writer.close()
+
+if __name__ == "__main__":
+    async def _serve():
+        async with MockOpenAIServer(latency=1.0, port=8765) as server:
+            print(f"Mock OpenAI API listening on {server.url}")
+            await asyncio.Event().wait()
+
+    asyncio.run(_serve())
@@ -1,63 +1,294 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from typing import Dict, Any, List, Optional
+import os
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Header, Query, Response
+from fastapi.responses import StreamingResponse
+from typing import Dict, Any, List, Optional, AsyncIterator, Tuple
 import json
+import time
 import asyncio
+from dataclasses import replace
 from src.models.request_models import EmailRequest, EmailResponse
 from src.services.openai_service import OpenAIService
 from src.services.teams_service import TeamsService
 from src.services.attachment_service import AttachmentService
-from src.config import tools, default_persona
+from src.services.json_stream import IncrementalJSONFieldParser, PARTIAL
+from src.services.response_cache import response_cache, content_version
+from src.services.near_duplicate import near_duplicate_index, tool_call_signature, redact_customer_details
+from src.services.single_flight import SingleFlight
+from src.services.prompt_assembly import prompt_assembler, PromptPrefix
+from src.services.email_classifier import email_router, ModelRoute
+from src.services.thread_stripper import thread_stripper
+from src.services.html_markdown import html_converter
+from src.services.job_store import job_store, Job, JobStoreFull
+from src.services.job_workers import job_workers
+from src.services.priority_scheduler import openai_scheduler, Ticket
+from src.services.retry_policy import openai_retry_policy, RetryBudget
+from src.services.service_tiers import service_tiers, ServiceLevel, REALTIME, JOB
+from src.services.batch_service import BatchPipeline
+from src.services.circuit_breaker import circuit_breakers, CircuitOpenError
+from src.services.model_fallback import model_fallbacks, format_hops
+from src.services.tool_executor import tool_executor, OK as TOOL_OK
+from src.services.tool_registry import tool_registry, ToolContext
+from src.services.token_budget import token_budget, estimate_request_tokens, TokenBudgetExceeded, BudgetResult
+from src.services.conversation_state import (
+    DELTA, REPLAY, conversation_mode, conversation_stats, delta_input, is_expired_response_error
+)
 
 router = APIRouter(prefix="/api/v1", tags=["email-ai"])
 
+# Longest a job status request may be held open waiting for the job to finish
+JOB_MAX_WAIT_SECONDS = float(os.getenv("JOB_MAX_WAIT_SECONDS", "60"))
+
+NEAR_DUPLICATE_DRAFT_PROMPT = (
+    "A near-identical email (similarity {similarity:.0%}) to the same mailbox, possibly from "
+    "another customer, was previously answered with the reply below. Its names, addresses and "
+    "numbers were masked ([nome], [email], [número]). Use it as a skeleton: keep its structure "
+    "and the general information it gives, but take every customer detail from the current "
+    "email only.\n\n{draft}"
+)
+
+def near_duplicate_scope(email_request: EmailRequest) -> str:
+    """Near-duplicate index partition of an email: its domain and receiving mailbox"""
+    return f"{email_request.domain.lower()}/{(email_request.originalMailbox or '').lower()}"
+
 class EmailAIProcessor:
     def __init__(self):
         self.openai_service = OpenAIService()
         self.teams_service = TeamsService()
         self.attachment_service = AttachmentService()
+        self.single_flight = SingleFlight()
+    
+    def route_for(self, email_request: EmailRequest) -> ModelRoute:
+        """Model, reasoning effort and output budget picked for this email"""
+        return email_router.route(
+            email_request.subject,
+            email_request.body,
+            len(email_request.attachments or []),
+            model_override=email_request.AiModel,
+            reasoning_override=email_request.ReasoningLevel
+        )
+    
+    def cache_key(self, email_request: EmailRequest) -> str:
+        """Response cache key for an email under the model configuration it is routed to"""
+        prefix = prompt_assembler.prefix(email_request.domain)
+        route = self.route_for(email_request)
+        return response_cache.make_key(
+            email_request,
+            model=route.model,
+            reasoning_level=route.reasoning_effort,
+            persona_version=prefix.persona_version,
+            toolset_version=prefix.toolset_version
+        )
+    
+    def get_cached_response(self, email_request: EmailRequest) -> Optional[Dict[str, Any]]:
+        """Previously composed answer for an identical email, if still cached"""
+        return response_cache.get(self.cache_key(email_request))
+    
+    async def process_email(
+        self, 
+        email_request: EmailRequest,
+        use_cache: bool = True,
+        budget_info: Optional[Dict[str, Any]] = None,
+        retry_info: Optional[Dict[str, Any]] = None,
+        request_mode: str = REALTIME,
+        model_info: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Main processing logic matching Power Automate flow.
+
+        With use_cache, an identical email answered recently is served from the
+        response cache; the computed answer is always stored for later repeats.
+        Concurrent duplicates (same emailId or same content) share one run.
+        When given, budget_info is filled with the input token estimate and
+        retry_info with the OpenAI attempts and time spent retrying, and
+        model_info with the model that served the email and any fallback hops.
+        The request_mode (REALTIME or JOB) sets how long the caller can wait,
+        which picks the OpenAI service tier.
+        """
+        cache_key = self.cache_key(email_request)
+        if use_cache:
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                print(f"Response cache hit for email {email_request.emailId}")
+                return cached
+        
+        async def compute() -> Dict[str, Any]:
+            outcome = {"response": None, "budget": None, "retries": None, "model": None}
+            async for event, data in self.run_email_loop(email_request, request_mode=request_mode):
+                if event == "final":
+                    outcome["response"] = data
+                elif event in ("budget", "retries", "model"):
+                    outcome[event] = data
+            response_cache.set(cache_key, outcome["response"])
+            return outcome
+        
+        flight_keys = [f"content:{cache_key}"]
+        if email_request.emailId:
+            flight_keys.append(f"email:{email_request.domain}:{email_request.emailId}")
+        outcome = await self.single_flight.do(flight_keys, compute)
+        if budget_info is not None and outcome["budget"]:
+            budget_info.update(outcome["budget"])
+        if retry_info is not None and outcome["retries"]:
+            retry_info.update(outcome["retries"])
+        if model_info is not None and outcome["model"]:
+            model_info.update(outcome["model"])
+        return dict(outcome["response"])
     
-    async def process_email(self, email_request: EmailRequest) -> Dict[str, Any]:
-        """Main processing logic matching Power Automate flow"""
+    async def process_email_stream(
+        self, 
+        email_request: EmailRequest,
+        use_cache: bool = True
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Streaming variant of process_email yielding (event, data) progress events"""
+        if use_cache:
+            cached = self.get_cached_response(email_request)
+            if cached is not None:
+                yield "final", cached
+                return
+        
+        events = self.run_email_loop(email_request, stream=True)
+        try:
+            async for event, data in events:
+                if event == "final":
+                    response_cache.set(self.cache_key(email_request), data)
+                yield event, data
+        finally:
+            await events.aclose()
+    
+    async def run_email_loop(
+        self, 
+        email_request: EmailRequest,
+        stream: bool = False,
+        request_mode: str = REALTIME
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Run the Responses API / tool-call loop, yielding (event, data) tuples.
+
+        Events: "budget" (estimated input tokens, before any OpenAI call),
+        "iteration" (loop turn started), "tool_call" (function dispatched),
+        "tool_result" (function output, status and seconds taken; the calls
+        of a turn run concurrently and their results follow in call order),
+        "model" (the model that served the email and the fallback hops made)
+        and "retries" (OpenAI attempts made), just before the answer, "final"
+        (the parsed JSON answer, always the last event) and, in stream mode
+        only, "delta" (raw answer text),
+        "field" (a top-level answer field as soon as it is closed) and
+        "body_delta" (decoded text appended to the answer body).
+        """
         
         # Initialize variables matching Power Automate flow
         previous_response_id = None
         function_responses = []
         final_response = None
+        # Every tool call and output so far, for a full replay if the stored
+        # previous response has expired
+        transcript = []
+        
+        # Static instructions + tool schemas, identical across calls for this
+        # domain so that OpenAI's prompt cache can serve them
+        prefix = prompt_assembler.prefix(email_request.domain)
+        
+        # Cheap local pre-classification: easy emails get a lighter model
+        # configuration, hard ones more reasoning and output budget
+        route = self.route_for(email_request)
+        print(f"Routing email as {route.label}: {route.model} / {route.reasoning_effort}")
+        # Models to fall back to when the routed one times out or is overloaded
+        model_trail = model_fallbacks.trail(email_request.domain, route.model)
+        loop_started = time.perf_counter()
         
         # Prepare initial system messages and user message
         system_messages = []
-        messages = [
-            {
-                "role": "user", 
-                "content": json.dumps({
-                    "originalMailbox": email_request.originalMailbox,
-                    "to": email_request.to,
-                    "cc": email_request.cc,
-                    "subject": email_request.subject,
-                    "body": email_request.body,
-                    "bodyFormat": email_request.bodyFormat,
-                    "attachments": [att.dict() for att in email_request.attachments] if email_request.attachments else []
+        
+        # Reuse cacheable tool results and the (redacted) answer of a near-duplicate
+        # email to the same mailbox (e.g. the same web form submitted by another customer)
+        tool_results = {}
+        reusable_results = {}
+        near_duplicate = near_duplicate_index.find(near_duplicate_scope(email_request), email_request.body)
+        if near_duplicate:
+            print(f"Near-duplicate email found (similarity {near_duplicate.similarity:.2f})")
+            reusable_results = near_duplicate.entry.tool_results
+            draft = (near_duplicate.entry.final_response or {}).get("body")
+            if draft:
+                system_messages.append({
+                    "role": "developer",
+                    "content": NEAR_DUPLICATE_DRAFT_PROMPT.format(
+                        similarity=near_duplicate.similarity,
+                        draft=redact_customer_details(draft)
+                    )
                 })
-            }
-        ]
+        messages, fitted = self.build_email_input(email_request, prefix, route, system_messages)
+        
+        # Place in the OpenAI call queue, kept for every iteration of this email
+        ticket = openai_scheduler.ticket(
+            email_request.importance,
+            email_request.receivedDateTime,
+            domain=email_request.domain,
+            tokens=fitted.estimated_tokens + route.max_output_tokens
+        )
+        # Retry report for every OpenAI call made for this email; each call
+        # gets its own retry window once it holds a scheduler slot
+        retry_budget = openai_retry_policy.budget()
+        # Latency objective for the calls, choosing their service tier
+        service_level = service_tiers.service_level(email_request.importance, email_request.to, request_mode)
+        yield "budget", {
+            "estimated_tokens": fitted.estimated_tokens,
+            "budget": fitted.budget,
+            "trimmed": fitted.trimmed
+        }
         
         # Do until loop - max 10 iterations for safety (matching Power Automate pattern)
         for iteration in range(10):
             try:
                 print(f"Processing iteration {iteration + 1}")
+                yield "iteration", {"iteration": iteration + 1}
                 
-                # Combine system messages, user messages, and function responses
-                # This matches the Power Automate union operation:
-                # @union(union(variables('SystemMessages'), variables('Messages')), variables('FunctionResponse'))
-                all_input = system_messages + messages + function_responses
+                # In delta mode a continuation turn only carries the new tool
+                # outputs; the email and earlier turns are referenced through
+                # previous_response_id instead of being re-sent every iteration
+                mode = conversation_mode()
+                if previous_response_id and mode == DELTA:
+                    all_input = delta_input(function_responses)
+                else:
+                    # Combine system messages, user messages, and function responses
+                    # This matches the Power Automate union operation:
+                    # @union(union(variables('SystemMessages'), variables('Messages')), variables('FunctionResponse'))
+                    all_input = system_messages + messages + function_responses
                 
                 # Call OpenAI Responses API
-                response = await self.openai_service.call_openai_responses(
-                    messages=all_input,
-                    tools=tools,
-                    previous_response_id=previous_response_id,
-                    instructions=default_persona
-                )
+                response = None
+                while response is None:
+                    started = time.perf_counter()
+                    streamed = False
+                    try:
+                        with model_fallbacks.hop_deadline(model_trail, retry_budget):
+                            # Closed as soon as this loop is, so an abandoned stream
+                            # releases the call's scheduler slot at once
+                            events = self.call_model(
+                                stream, all_input, previous_response_id, prefix, route, ticket,
+                                retry_budget, service_level
+                            )
+                            try:
+                                async for event, data in events:
+                                    if event == "response":
+                                        response = data
+                                    else:
+                                        streamed = True
+                                        yield event, data
+                            finally:
+                                await events.aclose()
+                    except Exception as e:
+                        if previous_response_id and is_expired_response_error(e):
+                            # The stored response expired: replay the whole conversation
+                            print(f"Previous response {previous_response_id} expired, replaying full conversation")
+                            conversation_stats.record_fallback()
+                        elif streamed or not model_fallbacks.fall_back(model_trail, e, time.perf_counter() - started):
+                            # Answer text already sent cannot be taken back by another model
+                            raise
+                        else:
+                            # Carry the conversation to the next model by replaying it
+                            route = replace(route, model=model_trail.model)
+                        mode = REPLAY
+                        previous_response_id = None
+                        all_input = system_messages + messages + transcript
+                if iteration > 0:
+                    conversation_stats.record(mode, response.get("usage"), time.perf_counter() - started)
                 
                 print(f"OpenAI Response ID: {response.get('id')}")
                 
@@ -98,9 +329,31 @@ class EmailAIProcessor:
                 # Clear function responses for new iteration
                 function_responses = []
                 
-                # Process each function call (matching Power Automate For Each)
+                # Announce every function call, then run them concurrently
+                # (parallel_tool_calls) and add their results in call order
                 for call in tools_called:
                     print(f"Processing function call: {call.get('name')}")
+                    yield "tool_call", {
+                        "name": call.get("name"),
+                        "call_id": call.get("call_id"),
+                        "arguments": call.get("arguments")
+                    }
+                
+                async def run_tool(call: Dict[str, Any]) -> str:
+                    # Process the specific function, unless a near-duplicate email
+                    # already made the same call to a cacheable tool
+                    signature = tool_call_signature(call.get("name"), call.get("arguments"))
+                    if tool_registry.is_cacheable(call.get("name")) and signature in reusable_results:
+                        print(f"Reusing near-duplicate result for {call.get('name')}")
+                        near_duplicate_index.record_reuse()
+                        return reusable_results[signature]
+                    return await self.process_function_call(call, email_request)
+                
+                for run in await tool_executor.run(tools_called, run_tool):
+                    call, result = run.call, run.output
+                    if run.status == TOOL_OK and tool_registry.is_cacheable(call.get("name")):
+                        # Only results that depend on the arguments alone are kept for reuse
+                        tool_results[tool_call_signature(call.get("name"), call.get("arguments"))] = result
                     
                     # First append the function call (matching Power Automate logic)
                     # This matches: @removeProperty(removeProperty(removeProperty(items('For_Each_Tool_Called'),'status'),'id'),'role')
@@ -112,9 +365,6 @@ class EmailAIProcessor:
                     }
                     function_responses.append(function_call_entry)
                     
-                    # Process the specific function
-                    result = await self.process_function_call(call, email_request)
-                    
                     # Add function result (matching Power Automate structure)
                     function_result_entry = {
                         "type": "function_call_output",
@@ -122,9 +372,23 @@ class EmailAIProcessor:
                         "output": result
                     }
                     function_responses.append(function_result_entry)
+                    yield "tool_result", {
+                        "name": call.get("name"),
+                        "call_id": call.get("call_id"),
+                        "output": result,
+                        "status": run.status,
+                        "seconds": round(run.seconds, 3)
+                    }
                 
+                transcript.extend(function_responses)
                 print(f"Completed iteration {iteration + 1}, continuing...")
                 
+            except CircuitOpenError as e:
+                # The breaker already knows OpenAI is down; no alert per rejected email
+                print(f"Error in iteration {iteration + 1}: {e}")
+                raise HTTPException(
+                    status_code=503, detail=str(e), headers={"Retry-After": str(max(1, round(e.retry_after)))}
+                )
             except Exception as e:
                 error_message = f"Detalhes do erro: {str(e)}"
                 print(f"Error in iteration {iteration + 1}: {error_message}")
@@ -144,147 +408,218 @@ class EmailAIProcessor:
             )
             raise HTTPException(status_code=500, detail=error_message)
         
-        # Parse the JSON response
+        parsed_response = self.parse_final_response(final_response)
+        
+        near_duplicate_index.add(
+            near_duplicate_scope(email_request),
+            email_request.emailId or content_version(email_request.body),
+            email_request.body,
+            tool_results=tool_results,
+            final_response=parsed_response
+        )
+        email_router.stats.record(route, time.perf_counter() - loop_started)
+        model_fallbacks.record(model_trail)
+        yield "model", model_trail.report()
+        yield "retries", retry_budget.report()
+        yield "final", parsed_response
+    
+    def build_email_input(
+        self,
+        email_request: EmailRequest,
+        prefix: PromptPrefix,
+        route: ModelRoute,
+        system_messages: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], BudgetResult]:
+        """User message with the email plus the date context, trimmed to the input budget"""
+        # Keep the newest message of RE:/FW: chains; older quoted messages are
+        # summarised so they are not re-sent in full on every iteration
+        is_html = email_request.bodyFormat.lower() == "html"
+        stripped = thread_stripper.strip(email_request.body, is_html=is_html, subject=email_request.subject)
+        body, body_format = stripped.body, email_request.bodyFormat
+        if is_html and html_converter.enabled:
+            # Inline CSS, VML and tracking markup cost tokens on every iteration
+            body, body_format = html_converter.convert(body), "markdown"
+        email_content = {
+            "originalMailbox": email_request.originalMailbox,
+            "to": email_request.to,
+            "cc": email_request.cc,
+            "subject": email_request.subject,
+            "body": body,
+            "bodyFormat": body_format,
+            "attachments": [att.dict() for att in email_request.attachments] if email_request.attachments else []
+        }
+        if stripped.history:
+            email_content["quotedHistory"] = stripped.history
+        
+        # Estimate the request locally and trim it to the model's input budget
+        # before anything is sent; requests that cannot fit are refused here
+        context_message = prompt_assembler.context_message()
+        try:
+            fitted = token_budget.fit(
+                email_content,
+                estimate_request_tokens(prefix.instructions, prefix.tools, system_messages + [context_message]),
+                token_budget.budget_for(route.model, route.max_output_tokens)
+            )
+        except TokenBudgetExceeded as e:
+            print(f"Refusing email {email_request.emailId}: {str(e)}")
+            raise HTTPException(status_code=413, detail=str(e))
+        
+        messages = [
+            {
+                "role": "user", 
+                "content": json.dumps(fitted.email, ensure_ascii=False)
+            },
+            # Volatile context (today's date) goes last to keep the prefix stable
+            context_message
+        ]
+        return messages, fitted
+    
+    def parse_final_response(self, final_response: str) -> Dict[str, Any]:
+        """Parse the model's final JSON answer, always into an object"""
         try:
-            parsed_response = json.loads(final_response)
-            return parsed_response
+            parsed = json.loads(final_response)
         except json.JSONDecodeError:
-            # If not valid JSON, return a basic structure
-            return {
-                "subjectPrefix": "",
-                "body": final_response,
-                "confidence": 50,
-                "language": "pt-PT"
-            }
+            parsed = None
+        if isinstance(parsed, dict):
+            return parsed
+        # Not valid JSON, or JSON that is not an object (a list, a bare
+        # string): return a basic structure around the text
+        return {
+            "subjectPrefix": "",
+            "body": parsed if isinstance(parsed, str) else final_response,
+            "confidence": 50,
+            "language": "pt-PT"
+        }
+    
+    async def call_model(
+        self,
+        stream: bool,
+        input_items: List[Dict[str, Any]],
+        previous_response_id: Optional[str],
+        prefix: PromptPrefix,
+        route: Optional[ModelRoute] = None,
+        ticket: Optional[Ticket] = None,
+        retry_budget: Optional[RetryBudget] = None,
+        service_level: Optional[ServiceLevel] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """One Responses API call, yielding ("response", <response>) last.
+
+        The scheduler slot is held until the generator finishes or is closed;
+        callers close it (aclose) when they stop early. In stream mode the answer's "delta", "field" and "body_delta" events are
+        yielded as they arrive, before the final response. The call waits for
+        a slot from the priority scheduler according to its ticket, and
+        reports the tokens it used back to its domain's quota. Transient
+        failures are retried within retry_budget, and the service tier is
+        chosen from service_level. While the model's circuit is open the call
+        fails fast with CircuitOpenError, without queueing for a slot.
+        """
+        model = route.model if route else self.openai_service.default_model
+        circuit_breakers.get(f"openai/{model}").raise_if_open()
+        async with openai_scheduler.slot(ticket) as lease:
+            if retry_budget:
+                # The retry window runs from here, not from the email's arrival
+                retry_budget.start()
+            events = self._call_model(
+                stream, input_items, previous_response_id, prefix, route, retry_budget, service_level
+            )
+            try:
+                async for event, data in events:
+                    if event == "response" and data.get("usage"):
+                        lease.used_tokens = data["usage"].get("total_tokens")
+                    yield event, data
+            finally:
+                await events.aclose()
+    
+    async def _call_model(
+        self,
+        stream: bool,
+        input_items: List[Dict[str, Any]],
+        previous_response_id: Optional[str],
+        prefix: PromptPrefix,
+        route: Optional[ModelRoute],
+        retry_budget: Optional[RetryBudget] = None,
+        service_level: Optional[ServiceLevel] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        if not stream:
+            response = await self.openai_service.call_openai_responses(
+                messages=input_items,
+                tools=prefix.tools,
+                previous_response_id=previous_response_id,
+                instructions=prefix.instructions,
+                prompt_cache_key=prefix.cache_key,
+                route=route,
+                retry_budget=retry_budget,
+                service_level=service_level
+            )
+            yield "response", response
+            return
+        
+        response = None
+        answer_parser = IncrementalJSONFieldParser()
+        stream_events = self.openai_service.stream_openai_responses(
+            messages=input_items,
+            tools=prefix.tools,
+            previous_response_id=previous_response_id,
+            instructions=prefix.instructions,
+            prompt_cache_key=prefix.cache_key,
+            route=route,
+            retry_budget=retry_budget,
+            service_level=service_level
+        )
+        try:
+            async for stream_event in stream_events:
+                event_type = stream_event.get("type")
+                if event_type == "response.output_text.delta":
+                    delta = stream_event.get("delta", "")
+                    yield "delta", {"text": delta}
+                    # Surface answer fields as soon as each one is closed
+                    for kind, name, value in answer_parser.feed(delta):
+                        if kind == PARTIAL:
+                            yield "body_delta", {"text": value}
+                        else:
+                            yield "field", {"name": name, "value": value}
+                elif event_type == "response.completed":
+                    response = stream_event.get("response")
+                elif event_type in ("response.failed", "error"):
+                    raise Exception(f"OpenAI stream failed: {stream_event}")
+        finally:
+            await stream_events.aclose()
+        if response is None:
+            raise Exception("OpenAI stream ended without a completed response")
+        yield "response", response
+    
+    def tool_context(self, email_request: EmailRequest) -> ToolContext:
+        """What the tool handlers of this email act on"""
+        return ToolContext(email_request, self.teams_service, self.attachment_service, self.openai_service)
     
     async def process_function_call(
         self, 
         call: Dict[str, Any], 
         email_request: EmailRequest
     ) -> str:
-        """Process individual function calls matching Power Automate Switch logic"""
-        function_name = call.get("name")
-        arguments_str = call.get("arguments", "{}")
-        
-        try:
-            arguments = json.loads(arguments_str)
-        except json.JSONDecodeError:
-            arguments = {}
-        
-        print(f"Processing function: {function_name} with args: {arguments}")
-        
-        if function_name == "content_not_available":
-            # Handle content_not_available case
-            subject = arguments.get("Subject", "Unknown")
-            
-            # Send Teams alert matching Power Automate flow
-            await self.teams_service.send_content_not_available_alert(
-                domain=email_request.domain,
-                from_email=email_request.from_email,
-                subject_text=email_request.subject,
-                missing_subject=subject
-            )
-            
-            # Return success response matching Power Automate
-            return json.dumps({
-                "success": True,
-                "description": "A equipa do NewEnergy foi avisada desta questão, sobre a qual eu (o assistente) não consegui responder."
-            })
-        
-        elif function_name == "analyze_email_attachment":
-            # Handle analyze_email_attachment case
-            try:
-                email_id = arguments.get("emailId")
-                attachment_id = arguments.get("attachmentId")
-                attachment_filename = arguments.get("attachmentFileName", "document")
-                prompt = arguments.get("prompt")
-                system_prompt = arguments.get("systemPrompt")
-                
-                if not all([email_id, attachment_id, prompt]):
-                    return json.dumps({
-                        "error": "Missing required parameters for analyze_email_attachment"
-                    })
-                
-                print(f"Getting attachment content for email {email_id}, attachment {attachment_id}")
-                
-                # Get attachment content (matching Power Automate HTTP call)
-                attachment_content = await self.attachment_service.get_attachment_content(
-                    email_id=email_id,
-                    attachment_id=attachment_id,
-                    mailbox=email_request.originalMailbox
-                )
-                
-                print(f"Got attachment content, size: {len(attachment_content)} bytes")
-                
-                # Upload file to OpenAI (matching Power Automate Upload File)
-                file_id = await self.openai_service.upload_file(
-                    file_content=attachment_content,
-                    filename=attachment_filename
-                )
-                
-                print(f"Uploaded file to OpenAI, file_id: {file_id}")
-                
-                # Analyze document (matching Power Automate Analyze Document)
-                analysis_result = await self.openai_service.analyze_document(
-                    file_id=file_id,
-                    prompt=prompt,
-                    system_prompt=system_prompt
-                )
-                
-                print(f"Analysis complete, processing results...")
-                
-                # Extract completed messages from analysis (matching Power Automate Query)
-                output = analysis_result.get("output", [])
-                completed_messages = [
-                    item for item in output
-                    if item.get("type") == "message" and item.get("status") == "completed"
-                ]
-                
-                if completed_messages:
-                    content = completed_messages[-1].get("content", [])
-                    if content and isinstance(content, list):
-                        analysis_text = content[0].get("text", "Analysis completed")
-                        
-                        # Return success response matching Power Automate
-                        return json.dumps({
-                            "success": True,
-                            "description": analysis_text
-                        })
-                
-                return json.dumps({
-                    "success": True,
-                    "description": "Document analyzed successfully"
-                })
-                
-            except Exception as e:
-                error_msg = f"Failed to analyze attachment: {str(e)}"
-                print(f"Error analyzing attachment: {error_msg}")
-                return json.dumps({
-                    "error": error_msg
-                })
-        
-        else:
-            # Default case - function not implemented
-            print(f"Function {function_name} not implemented")
-            
-            # Send Teams alert matching Power Automate default case
-            await self.teams_service.send_function_not_implemented_alert(
-                domain=email_request.domain,
-                from_email=email_request.from_email,
-                subject=email_request.subject,
-                function_name=function_name
-            )
-            
-            # Return empty string matching Power Automate default behavior
-            return ""
+        """Run a function call with the handler registered for it (see ToolRegistry)"""
+        return await tool_registry.invoke(call, self.tool_context(email_request))
 
 # Create processor instance
 processor = EmailAIProcessor()
+batch_pipeline = BatchPipeline.from_env(processor)
+
+def is_cache_bypass(x_cache_bypass: Optional[str], cache_control: Optional[str]) -> bool:
+    """True when the caller asked for a fresh answer (X-Cache-Bypass or Cache-Control: no-cache)"""
+    if x_cache_bypass and x_cache_bypass.strip().lower() in ("1", "true", "yes"):
+        return True
+    return bool(cache_control) and any(
+        directive.strip().lower() in ("no-cache", "no-store")
+        for directive in cache_control.split(",")
+    )
 
 @router.post("/email/compose", response_model=EmailResponse)
 async def compose_email_response(
     email_request: EmailRequest,
-    background_tasks: BackgroundTasks
+    background_tasks: BackgroundTasks,
+    response: Response,
+    x_cache_bypass: Optional[str] = Header(None),
+    cache_control: Optional[str] = Header(None)
 ) -> Dict[str, Any]:
     """
     Process an email and generate an AI-powered response.
@@ -296,10 +631,46 @@ async def compose_email_response(
     - Function calling for content_not_available and analyze_email_attachment
     - Teams notifications for alerts
     - Retry logic and error handling
+    
+    Identical emails answered recently are served from the response cache
+    (`X-Cache: HIT`); send `X-Cache-Bypass: true` or `Cache-Control: no-cache`
+    to force a fresh answer. Computed answers report the locally estimated
+    input tokens in `X-Estimated-Input-Tokens` and the OpenAI attempts made
+    and seconds spent waiting to retry in `X-OpenAI-Attempts` and
+    `X-OpenAI-Retry-Seconds`, the model that answered in `X-Served-By-Model`
+    and, when the routed model failed, each fallback hop with the seconds it
+    added in `X-Model-Fallbacks`; emails that cannot fit the model's input
+    budget are rejected with 413 before calling OpenAI.
     """
     try:
         print(f"Processing email request from {email_request.from_email} with subject: {email_request.subject}")
-        result = await processor.process_email(email_request)
+        if is_cache_bypass(x_cache_bypass, cache_control):
+            response_cache.record_bypass()
+            response.headers["X-Cache"] = "BYPASS"
+        else:
+            cached = processor.get_cached_response(email_request)
+            if cached is not None:
+                response.headers["X-Cache"] = "HIT"
+                return cached
+            response.headers["X-Cache"] = "MISS"
+        
+        budget_info = {}
+        retry_info = {}
+        model_info = {}
+        result = await processor.process_email(
+            email_request, use_cache=False, budget_info=budget_info, retry_info=retry_info, model_info=model_info
+        )
+        if budget_info:
+            response.headers["X-Estimated-Input-Tokens"] = str(budget_info["estimated_tokens"])
+            if budget_info["trimmed"]:
+                response.headers["X-Input-Trimmed"] = ",".join(budget_info["trimmed"])
+        if retry_info:
+            response.headers["X-OpenAI-Attempts"] = str(retry_info["attempts"])
+            response.headers["X-OpenAI-Retry-Seconds"] = f"{retry_info['retry_seconds']:.3f}"
+        if model_info:
+            response.headers["X-Served-By-Model"] = model_info["served_by"]
+            if model_info["hops"]:
+                response.headers["X-Model-Fallbacks"] = format_hops(model_info["hops"])
         print(f"Successfully processed email, confidence: {result.get('confidence', 'unknown')}")
         return result
     except HTTPException:
@@ -316,3 +687,141 @@ async def compose_email_response(
         )
         
         raise HTTPException(status_code=500, detail=error_message)
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Encode one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/email/compose/stream")
+async def compose_email_response_stream(
+    email_request: EmailRequest,
+    x_cache_bypass: Optional[str] = Header(None),
+    cache_control: Optional[str] = Header(None)
+) -> StreamingResponse:
+    """
+    Streaming variant of /email/compose using Server-Sent Events.
+    
+    Emits `budget` (estimated input tokens), `iteration`, `tool_call`, `tool_result`, `delta` (raw answer text),
+    `field` (each answer field once closed) and `body_delta` (decoded body
+    text) events while the loop runs, `model` (serving model and fallback
+    hops) and `retries` (OpenAI attempts and retry time) once it is done, then a `final` event with the same JSON
+    body returned by /email/compose, or an `error` event if processing failed.
+    """
+    print(f"Streaming email request from {email_request.from_email} with subject: {email_request.subject}")
+    use_cache = not is_cache_bypass(x_cache_bypass, cache_control)
+    if not use_cache:
+        response_cache.record_bypass()
+    
+    async def event_source() -> AsyncIterator[str]:
+        events = processor.process_email_stream(email_request, use_cache=use_cache)
+        try:
+            async for event, data in events:
+                yield format_sse(event, data)
+        except HTTPException as e:
+            yield format_sse("error", {"status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            error_message = f"Unexpected error processing email: {str(e)}"
+            print(error_message)
+            await processor.teams_service.send_alert(
+                error_message,
+                "SmartEmails API - Unexpected Error"
+            )
+            yield format_sse("error", {"status_code": 500, "detail": error_message})
+        finally:
+            # A client that disconnects mid-stream must not keep its OpenAI slot
+            await events.aclose()
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def answer_job(email_request: EmailRequest) -> Dict[str, Any]:
+    """process_email for a queued job, alerting Teams on unexpected errors like /email/compose"""
+    try:
+        return await processor.process_email(email_request, request_mode=JOB)
+    except HTTPException:
+        raise
+    except Exception as e:
+        error_message = f"Unexpected error processing email: {str(e)}"
+        print(error_message)
+        await processor.teams_service.send_alert(error_message, "SmartEmails API - Unexpected Error")
+        raise HTTPException(status_code=500, detail=error_message)
+
+def create_job(kind: str, email_request: EmailRequest) -> Job:
+    """A new job for the email; 503 when the job store is full of live jobs"""
+    try:
+        return job_store.create(kind, emailId=email_request.emailId, domain=email_request.domain)
+    except JobStoreFull as e:
+        raise HTTPException(status_code=503, detail=f"Job store is full, retry later ({e})", headers={"Retry-After": "5"})
+
+def enqueue_job(kind: str, email_request: EmailRequest) -> Job:
+    """Create a job answered by the worker pool; 503 when the queue is full"""
+    job = create_job(kind, email_request)
+    try:
+        job_workers.submit(job.id, lambda: answer_job(email_request))
+    except asyncio.QueueFull:
+        job_store.fail(job.id, "Job queue is full", statusCode=503)
+        raise HTTPException(status_code=503, detail="Job queue is full, retry later", headers={"Retry-After": "5"})
+    return job
+
+async def job_status(job_id: str, wait: float) -> Dict[str, Any]:
+    """The job, after waiting up to `wait` seconds for it to finish"""
+    job = await job_store.wait(job_id, min(max(wait, 0.0), JOB_MAX_WAIT_SECONDS))
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.to_dict()
+
+@router.post("/email/jobs", status_code=202)
+async def submit_email_job(email_request: EmailRequest, response: Response) -> Dict[str, Any]:
+    """
+    Queue an email for the worker pool and return its job id immediately.
+    
+    The answer is fetched from GET /email/jobs/{job_id} (see `Location`), so
+    callers with short HTTP timeouts (Power Automate) are not held open for
+    the whole model loop. Returns 503 with Retry-After when the queue is full.
+    """
+    job = enqueue_job("compose", email_request)
+    response.headers["Location"] = f"{router.prefix}/email/jobs/{job.id}"
+    return job.to_dict()
+
+@router.get("/email/jobs/{job_id}")
+async def get_email_job(job_id: str, wait: float = Query(0.0, description="Seconds to wait for the job to finish")) -> Dict[str, Any]:
+    """
+    Status and, once finished, the answer of a queued email.
+    
+    With `wait` the request is held open (long-poll, at most JOB_MAX_WAIT_SECONDS)
+    until the job completes or fails, instead of polling in a tight loop.
+    """
+    return await job_status(job_id, wait)
+
+@router.post("/email/batch", status_code=202)
+async def submit_batch_email(email_request: EmailRequest) -> Dict[str, Any]:
+    """
+    Queue an email for an out-of-band answer and return a job id.
+    
+    Emails from BATCH_MAILBOXES (or with importance "low") wait for the next
+    OpenAI Batch API submission; any other email is answered by the job
+    worker pool. Either way the answer is collected from
+    GET /email/batch/{job_id} (and POSTed to BATCH_CALLBACK_URL for batches).
+    """
+    if batch_pipeline.is_eligible(email_request):
+        job = create_job("batch", email_request)
+        try:
+            await batch_pipeline.submit(email_request, job.id)
+        except HTTPException as e:
+            # e.g. 413 from the token budget: the job must not stay queued
+            job_store.fail(job.id, str(e.detail), statusCode=e.status_code)
+            raise
+        except Exception as e:
+            job_store.fail(job.id, str(e), statusCode=500)
+            raise HTTPException(status_code=500, detail=f"Failed to queue email for a batch: {str(e)}")
+        return job.to_dict()
+    return enqueue_job("realtime", email_request).to_dict()
+
+@router.get("/email/batch/{job_id}")
+async def get_batch_email(job_id: str, wait: float = Query(0.0, description="Seconds to wait for the job to finish")) -> Dict[str, Any]:
+    """Status and, once finished, the answer of a queued email (long-poll with `wait`)"""
+    return await job_status(job_id, wait)
@@ -15,7 +15,7 @@ Devolve um objecto JSON com a seguinte informação:
 - **Não inventes informação**: se faltar contexto essencial ou não existirem instruções claras e absolutas sobre como tratar o email, atribui um emailClassificationConfidence inferior a 30.
 - Usa a base de conhecimento fornecida para compôr uma resposta.
 - Se o email indicar alguma ação (pedido de rescisão, pedido de assistência, etc), podes usar a executar a ação usando a lista de ações disponibilizada.
-- No caso de respostas (RE:) ou forwards (FW:) considera que o último pedido do cliente está no inicio do email. Abaixo estão encadeadas as restantes trocas de mensagens.
+- No caso de respostas (RE:) ou forwards (FW:) considera que o último pedido do cliente está no inicio do email. Abaixo estão encadeadas as restantes trocas de mensagens; quando existir, o campo quotedHistory resume-as (uma linha por mensagem anterior, da mais recente para a mais antiga).
 - No caso do email ser o preenchimento de um formulário, que foi reencaminhado, analisa o conteúdo do corpo do email para identificar o nome do cliente, endereço de email e outros dados.
 - Formata o body, da acção reply, em formato HTML, mas n\ão devolvas as tags HTML nem a HEAD. Devolve apenas o corpo do email.
 - No caso de falta de alguma informação ou no caso do email original não estar totalmente claro, devolve um 
@@ -24,14 +24,21 @@ Devolve um objecto JSON com a seguinte informação:
 You are an agent - please keep going until the user's query is completely 
 resolved, before ending your turn and providing the final JSON response.
 
-# CONTEXT
-Today's date is: {current_date}
-Use this information when composing responses that require date references.
-
 # FINAL OUTPUT
 Always return a valid JSON object with the required fields: subjectPrefix, body, confidence, and language.
 """
 
+# Volatile context sent after the email rather than in the persona, so the
+# instructions stay byte-identical between calls and hit OpenAI's prompt cache
+context_template = """# CONTEXT
+Today's date is: {current_date}
+Use this information when composing responses that require date references.
+"""
+
+# Extra instructions per domain, appended to the persona (static per domain).
+# Can be extended at runtime with a JSON file set in DOMAIN_INSTRUCTIONS_FILE.
+domain_instructions = {}
+
 tools = [
     {
         "type": "function",
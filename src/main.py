@@ -1,18 +1,53 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+from dataclasses import asdict
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Response
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
-import openai
 import json
 from .services.email_generation import generate_email_reply
+from .services.openai_service import get_openai_client, close_openai_client
+from .services.http_clients import http_clients
+from .services.response_cache import response_cache
+from .services.near_duplicate import near_duplicate_index
+from .services.prompt_assembly import prompt_cache_stats
+from .services.conversation_state import conversation_stats
+from .services.email_classifier import email_router
+from .services.thread_stripper import thread_stripper
+from .services.html_markdown import html_converter
+from .services.token_budget import token_budget, TokenBudgetExceeded
 from .settings import settings
 from .api.email_ai_endpoint import router as email_ai_router  # Import the new email AI endpoint
+from .api.email_ai_endpoint import processor, batch_pipeline
+from .services.job_store import job_store
+from .services.job_workers import job_workers
+from .services.priority_scheduler import openai_scheduler, DomainQuota
+from .services.rate_governor import rate_governor
+from .services.retry_policy import openai_retry_policy
+from .services.hedging import request_hedger
+from .services.service_tiers import service_tiers
+from .services.circuit_breaker import circuit_breakers
+from .services.model_fallback import model_fallbacks, format_hops
+from .services.tool_executor import tool_executor
+from .services.tool_registry import tool_registry
 
-client = openai.OpenAI(api_key=settings.openai_api_key)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the shared upstream clients and start the job workers and batch pipeline on startup; stop them on shutdown."""
+    get_openai_client()
+    job_workers.start()
+    batch_task = asyncio.create_task(batch_pipeline.run())
+    yield
+    batch_task.cancel()
+    await job_workers.stop()
+    await close_openai_client()
+    await http_clients.aclose()
 
 app = FastAPI(
     title="SmartGold-SmartCompose",
     description="A FastAPI application to replicate the Power Automate flow for generating email replies.",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # Include the new email AI router
@@ -53,16 +88,24 @@ class EmailResponse(BaseModel):
     confidence: int
     language: str
 
+class DomainQuotaInput(BaseModel):
+    weight: float = Field(1.0, gt=0)
+    max_concurrency: Optional[int] = Field(None, ge=1)
+    tokens_per_minute: Optional[int] = Field(None, ge=1)
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint to verify service status."""
     try:
         # Check if OpenAI client is configured
         api_key_configured = settings.openai_api_key != "not_configured"
+        circuits = circuit_breakers.states()
         
         return {
-            "status": "healthy",
+            # Degraded while any upstream's circuit is not closed
+            "status": "healthy" if all(state == "closed" for state in circuits.values()) else "degraded",
             "api_key_configured": api_key_configured,
+            "circuits": circuits,
             "default_model": settings.default_ai_model,
             "timestamp": "2025-07-02T00:00:00Z"
         }
@@ -73,8 +116,50 @@ async def health_check():
             "timestamp": "2025-07-02T00:00:00Z"
         }
 
+@app.get("/metrics")
+async def metrics():
+    """Runtime statistics for monitoring."""
+    return {
+        "http_pools": http_clients.stats(),
+        "response_cache": response_cache.stats(),
+        "near_duplicates": near_duplicate_index.stats(),
+        "single_flight": processor.single_flight.stats(),
+        "prompt_cache": prompt_cache_stats.stats(),
+        "conversation_state": conversation_stats.stats(),
+        "routing": email_router.stats.stats(),
+        "thread_stripping": thread_stripper.stats(),
+        "html_conversion": html_converter.stats(),
+        "token_budget": token_budget.stats(),
+        "batch": batch_pipeline.stats(),
+        "jobs": job_store.stats(),
+        "job_workers": job_workers.stats(),
+        "scheduler": openai_scheduler.stats(),
+        "rate_limits": rate_governor.stats(),
+        "retries": openai_retry_policy.stats(),
+        "hedging": request_hedger.stats(),
+        "service_tiers": service_tiers.stats(),
+        "circuit_breakers": circuit_breakers.stats(),
+        "model_fallbacks": model_fallbacks.stats(),
+        "tools": tool_executor.stats(),
+        "tool_registry": tool_registry.stats()
+    }
+
+@app.get("/scheduler/domains")
+async def get_domain_quotas():
+    """Per-domain quotas and live scheduling metrics."""
+    return {
+        "quotas": {domain: asdict(quota) for domain, quota in openai_scheduler.quotas.items()},
+        "domains": openai_scheduler.domain_stats()
+    }
+
+@app.put("/scheduler/domains/{domain}")
+async def set_domain_quota(domain: str, quota: DomainQuotaInput):
+    """Change a domain's weight, max concurrency and token rate at runtime ("*" sets the default)."""
+    openai_scheduler.set_quota(domain, DomainQuota(**quota.dict()))
+    return {"domain": domain.lower(), **asdict(openai_scheduler.quota_for(domain.lower()))}
+
 @app.post("/generate_reply", response_model=EmailResponse)
-async def generate_reply(email_input: EmailInput):
+async def generate_reply(email_input: EmailInput, http_response: Response):
     try:
         # Validate OpenAI API key
         if settings.openai_api_key == "not_configured":
@@ -83,7 +168,18 @@ async def generate_reply(email_input: EmailInput):
                 detail="OpenAI API key not configured. Please check your .env file."
             )
         
-        response = await generate_email_reply(email_input, client)
+        response = await generate_email_reply(email_input, get_openai_client())
+        if response and response.get("estimatedInputTokens") is not None:
+            http_response.headers["X-Estimated-Input-Tokens"] = str(response.pop("estimatedInputTokens"))
+        if response and response.get("retries") is not None:
+            retries = response.pop("retries")
+            http_response.headers["X-OpenAI-Attempts"] = str(retries["attempts"])
+            http_response.headers["X-OpenAI-Retry-Seconds"] = f"{retries['retry_seconds']:.3f}"
+        if response and response.get("model") is not None:
+            model = response.pop("model")
+            http_response.headers["X-Served-By-Model"] = model["served_by"]
+            if model["hops"]:
+                http_response.headers["X-Model-Fallbacks"] = format_hops(model["hops"])
         
         # Validate response structure
         if not response or 'body' not in response:
@@ -97,6 +193,11 @@ async def generate_reply(email_input: EmailInput):
     except HTTPException:
         # Re-raise HTTP exceptions
         raise
+    except TokenBudgetExceeded as e:
+        # Refused before calling OpenAI, as /email/compose does
+        raise HTTPException(
+            status_code=413, detail=str(e), headers={"X-Estimated-Input-Tokens": str(e.estimated_tokens)}
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
@@ -21,6 +21,10 @@ class EmailRequest(BaseModel):
     attachments: Optional[List[EmailAttachment]] = []
     originalMailbox: Optional[str] = None
     emailId: Optional[str] = None
+    AiModel: Optional[str] = None
+    ReasoningLevel: Optional[str] = None
+    importance: Optional[str] = None
+    receivedDateTime: Optional[str] = None
     
     class Config:
         populate_by_name = True
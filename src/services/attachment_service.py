@@ -1,12 +1,25 @@
 import os
-import httpx
 from typing import Dict, Any, Optional
 import base64
+import httpx
+from src.services.http_clients import http_clients
+from src.services.circuit_breaker import circuit_breakers
 
 class AttachmentService:
     def __init__(self):
         self.get_attachment_api = os.getenv("GET_ATTACHMENT_API_URL")
     
+    async def _post(self, request_body: Dict[str, Any]) -> httpx.Response:
+        """POST to the attachment API; fails fast with CircuitOpenError while its circuit is open"""
+        async with circuit_breakers.get("attachments").guard():
+            response = await http_clients.get("attachments").post(
+                self.get_attachment_api,
+                json=request_body,
+                headers={"content-type": "application/json"}
+            )
+            response.raise_for_status()
+            return response
+    
     async def get_attachment_content(
         self, 
         email_id: str, 
@@ -25,22 +38,16 @@ class AttachmentService:
         if mailbox:
             request_body["mailbox"] = mailbox
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                self.get_attachment_api,
-                json=request_body,
-                headers={"content-type": "application/json"}
-            )
-            response.raise_for_status()
-            
-            # Parse response - expecting same format as Power Automate
-            result = response.json()
-            content_bytes = result.get("contentBytes", "")
-            
-            if content_bytes:
-                return base64.b64decode(content_bytes)
-            else:
-                raise ValueError("No content bytes returned from attachment API")
+        response = await self._post(request_body)
+        
+        # Parse response - expecting same format as Power Automate
+        result = response.json()
+        content_bytes = result.get("contentBytes", "")
+        
+        if content_bytes:
+            return base64.b64decode(content_bytes)
+        else:
+            raise ValueError("No content bytes returned from attachment API")
     
     async def get_attachment_info(
         self,
@@ -60,11 +67,5 @@ class AttachmentService:
         if mailbox:
             request_body["mailbox"] = mailbox
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                self.get_attachment_api,
-                json=request_body,
-                headers={"content-type": "application/json"}
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await self._post(request_body)
+        return response.json()
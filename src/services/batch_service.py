@@ -0,0 +1,307 @@
+import os
+import json
+import time
+import asyncio
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional
+from src.models.request_models import EmailRequest
+from src.services.openai_service import get_openai_client
+from src.services.http_clients import http_clients
+from src.services.prompt_assembly import prompt_assembler, PromptPrefix
+from src.services.email_classifier import ModelRoute
+from src.services.job_store import job_store, RUNNING
+from src.services.tool_executor import tool_executor
+
+BATCH_ENDPOINT = "/v1/responses"
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+@dataclass
+class BatchConversation:
+    """One email's tool-call loop, advanced one batch round at a time"""
+    job_id: str
+    email_request: EmailRequest
+    prefix: PromptPrefix
+    route: ModelRoute
+    messages: List[Dict[str, Any]]
+    transcript: List[Dict[str, Any]] = field(default_factory=list)
+    rounds: int = 0
+    resubmissions: int = 0
+    queued_at: float = field(default_factory=time.time)
+
+    @property
+    def custom_id(self) -> str:
+        return f"{self.job_id}:{self.rounds}"
+
+class BatchPipeline:
+    """Answers non-urgent emails through the OpenAI Batch API at batch pricing.
+
+    Eligible emails are accumulated and submitted as one JSONL file once
+    max_batch_size requests are waiting or the oldest has waited
+    max_wait_seconds. Open batches are polled every poll_interval seconds;
+    answers whose model asked for tools have the tools run locally and go
+    back in the next batch round. Results land in the job store and, when
+    configured, are POSTed to the callback URL.
+    """
+
+    def __init__(
+        self,
+        processor: Any,
+        mailboxes: Optional[List[str]] = None,
+        low_importance: bool = True,
+        max_batch_size: int = 500,
+        max_wait_seconds: float = 300.0,
+        poll_interval: float = 60.0,
+        max_rounds: int = 10,
+        max_resubmissions: int = 1,
+        completion_window: str = "24h",
+        callback_url: Optional[str] = None
+    ):
+        self.processor = processor
+        self.mailboxes = {mailbox.strip().lower() for mailbox in mailboxes or [] if mailbox.strip()}
+        self.low_importance = low_importance
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.poll_interval = poll_interval
+        self.max_rounds = max_rounds
+        self.max_resubmissions = max_resubmissions
+        self.completion_window = completion_window
+        self.callback_url = callback_url
+        self._pending: List[BatchConversation] = []
+        self._open_batches: Dict[str, Dict[str, BatchConversation]] = {}
+        self._lock = asyncio.Lock()
+        self._last_poll = 0.0
+        self.batches_submitted = 0
+        self.requests_submitted = 0
+        self.jobs_completed = 0
+        self.jobs_failed = 0
+        self.total_turnaround = 0.0
+
+    @classmethod
+    def from_env(cls, processor: Any) -> "BatchPipeline":
+        return cls(
+            processor,
+            mailboxes=os.getenv("BATCH_MAILBOXES", "").split(","),
+            low_importance=os.getenv("BATCH_LOW_IMPORTANCE", "true").lower() == "true",
+            max_batch_size=int(os.getenv("BATCH_MAX_SIZE", "500")),
+            max_wait_seconds=float(os.getenv("BATCH_MAX_WAIT_SECONDS", "300")),
+            poll_interval=float(os.getenv("BATCH_POLL_INTERVAL", "60")),
+            completion_window=os.getenv("BATCH_COMPLETION_WINDOW", "24h"),
+            callback_url=os.getenv("BATCH_CALLBACK_URL") or None
+        )
+
+    def is_eligible(self, email_request: EmailRequest) -> bool:
+        """Whether an email may wait for a batch window instead of a live call"""
+        mailbox = (email_request.originalMailbox or "").lower()
+        if mailbox and mailbox in self.mailboxes:
+            return True
+        return self.low_importance and (email_request.importance or "").lower() == "low"
+
+    async def submit(self, email_request: EmailRequest, job_id: str) -> None:
+        """Queue an email for the next batch"""
+        prefix = prompt_assembler.prefix(email_request.domain)
+        route = self.processor.route_for(email_request)
+        messages, _ = self.processor.build_email_input(email_request, prefix, route, [])
+        self._pending.append(BatchConversation(job_id, email_request, prefix, route, messages))
+        job_store.update(job_id, RUNNING, batchRound=1)
+
+    def request_line(self, conversation: BatchConversation) -> Dict[str, Any]:
+        """JSONL line for the conversation's next Responses API call.
+
+        Each round re-sends the whole conversation rather than chaining with
+        previous_response_id, as rounds can be hours apart.
+        """
+        body = self.processor.openai_service.build_request_body(
+            conversation.messages + conversation.transcript,
+            conversation.prefix.tools,
+            instructions=conversation.prefix.instructions,
+            prompt_cache_key=conversation.prefix.cache_key,
+            route=conversation.route
+        )
+        # Batch pricing applies instead of a service tier
+        body.pop("service_tier", None)
+        return {"custom_id": conversation.custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+
+    async def flush(self, force: bool = False) -> Optional[str]:
+        """Submit the waiting requests as one batch when the batch is full or due"""
+        async with self._lock:
+            if not self._pending:
+                return None
+            oldest = min(conversation.queued_at for conversation in self._pending)
+            if not force and len(self._pending) < self.max_batch_size \
+                    and time.time() - oldest < self.max_wait_seconds:
+                return None
+            conversations, self._pending = self._pending[:self.max_batch_size], self._pending[self.max_batch_size:]
+            jsonl = "\n".join(json.dumps(self.request_line(c), ensure_ascii=False) for c in conversations) + "\n"
+            try:
+                client = get_openai_client()
+                input_file = await client.files.create(
+                    file=("smartemails-batch.jsonl", jsonl.encode("utf-8")),
+                    purpose="batch"
+                )
+                batch = await client.batches.create(
+                    input_file_id=input_file.id,
+                    endpoint=BATCH_ENDPOINT,
+                    completion_window=self.completion_window,
+                    metadata={"source": "smartemails"}
+                )
+            except Exception as e:
+                print(f"Batch submission failed, requeueing {len(conversations)} requests: {str(e)}")
+                self._pending = conversations + self._pending
+                return None
+            self._open_batches[batch.id] = {c.custom_id: c for c in conversations}
+            self.batches_submitted += 1
+            self.requests_submitted += len(conversations)
+            for conversation in conversations:
+                job_store.update(conversation.job_id, batchId=batch.id)
+            print(f"Submitted batch {batch.id} with {len(conversations)} requests")
+            return batch.id
+
+    async def poll(self) -> None:
+        """Collect finished batches and advance their conversations"""
+        self._last_poll = time.time()
+        client = get_openai_client()
+        for batch_id in list(self._open_batches):
+            try:
+                batch = await client.batches.retrieve(batch_id)
+            except Exception as e:
+                print(f"Failed to poll batch {batch_id}: {str(e)}")
+                continue
+            if batch.status not in TERMINAL_STATUSES:
+                continue
+            print(f"Batch {batch_id} {batch.status}")
+            try:
+                lines = []
+                for file_id in (batch.output_file_id, batch.error_file_id):
+                    if file_id:
+                        content = await client.files.content(file_id)
+                        lines += [json.loads(line) for line in content.text.splitlines() if line.strip()]
+            except Exception as e:
+                # Keep the batch open so its results are fetched again on the next poll
+                print(f"Failed to fetch results of batch {batch_id}: {str(e)}")
+                continue
+            conversations = self._open_batches.pop(batch_id)
+            await asyncio.gather(*(
+                self._handle_result(conversations[line["custom_id"]], line)
+                for line in lines if line.get("custom_id") in conversations
+            ))
+            answered = {line.get("custom_id") for line in lines}
+            for custom_id, conversation in conversations.items():
+                if custom_id in answered:
+                    continue
+                # Not processed within the completion window: try once more
+                if batch.status == "expired" and conversation.resubmissions < self.max_resubmissions:
+                    conversation.resubmissions += 1
+                    conversation.queued_at = time.time()
+                    self._pending.append(conversation)
+                else:
+                    await self._finish(conversation, error=f"Batch {batch_id} {batch.status} without a result")
+
+    async def _handle_result(self, conversation: BatchConversation, line: Dict[str, Any]) -> None:
+        try:
+            await self._advance(conversation, line)
+        except Exception as e:
+            await self._finish(conversation, error=str(e))
+
+    async def _advance(self, conversation: BatchConversation, line: Dict[str, Any]) -> None:
+        response = line.get("response") or {}
+        if line.get("error") or response.get("status_code") != 200:
+            error = line.get("error") or (response.get("body") or {}).get("error") or response
+            await self._finish(conversation, error=f"Batch request failed: {error}")
+            return
+        output = (response.get("body") or {}).get("output", [])
+        messages = [item for item in output if item.get("type") == "message" and item.get("status") == "completed"]
+        if messages and messages[-1].get("content"):
+            parsed = self.processor.parse_final_response(messages[-1]["content"][0].get("text"))
+            await self._finish(conversation, result=parsed)
+            return
+        calls = [item for item in output if item.get("type") == "function_call" and item.get("status") == "completed"]
+        conversation.rounds += 1
+        if not calls or conversation.rounds >= self.max_rounds:
+            await self._finish(conversation, error="Failed to get response from AI after maximum iterations")
+            return
+        # Run the requested tools now and send the continuation in the next batch
+        runs = await tool_executor.run(
+            calls, lambda call: self.processor.process_function_call(call, conversation.email_request)
+        )
+        for run in runs:
+            conversation.transcript.append({
+                "type": run.call.get("type"),
+                "name": run.call.get("name"),
+                "arguments": run.call.get("arguments"),
+                "call_id": run.call.get("call_id")
+            })
+            conversation.transcript.append({
+                "type": "function_call_output",
+                "call_id": run.call.get("call_id"),
+                "output": run.output
+            })
+        conversation.queued_at = time.time()
+        self._pending.append(conversation)
+        job_store.update(conversation.job_id, batchRound=conversation.rounds + 1)
+
+    async def _finish(
+        self,
+        conversation: BatchConversation,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None
+    ) -> None:
+        job = job_store.get(conversation.job_id)
+        turnaround = time.time() - job.created_at if job else 0.0
+        if error:
+            self.jobs_failed += 1
+            job_store.fail(conversation.job_id, error, batchRounds=conversation.rounds + 1)
+            print(f"Batch job {conversation.job_id} failed: {error}")
+            await self.processor.teams_service.send_alert(f"Detalhes do erro: {error}", "SmartEmails Batch Error")
+        else:
+            self.jobs_completed += 1
+            self.total_turnaround += turnaround
+            job_store.complete(conversation.job_id, result, batchRounds=conversation.rounds + 1)
+        if self.callback_url:
+            await self.deliver(conversation, result, error)
+
+    async def deliver(
+        self,
+        conversation: BatchConversation,
+        result: Optional[Dict[str, Any]],
+        error: Optional[str]
+    ) -> None:
+        """POST the outcome to the configured callback URL"""
+        payload = {
+            "jobId": conversation.job_id,
+            "emailId": conversation.email_request.emailId,
+            "domain": conversation.email_request.domain,
+            "status": "failed" if error else "completed",
+            "result": result,
+            "error": error
+        }
+        try:
+            response = await http_clients.get("callbacks").post(self.callback_url, json=payload)
+            response.raise_for_status()
+        except Exception as e:
+            print(f"Failed to deliver batch result for {conversation.job_id}: {str(e)}")
+
+    async def run(self, tick: float = 1.0) -> None:
+        """Background loop: submit due batches and poll open ones"""
+        while True:
+            try:
+                await self.flush()
+                if self._open_batches and time.time() - self._last_poll >= self.poll_interval:
+                    await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Batch pipeline error: {str(e)}")
+            await asyncio.sleep(tick)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "open_batches": len(self._open_batches),
+            "in_open_batches": sum(len(conversations) for conversations in self._open_batches.values()),
+            "batches_submitted": self.batches_submitted,
+            "requests_submitted": self.requests_submitted,
+            "jobs_completed": self.jobs_completed,
+            "jobs_failed": self.jobs_failed,
+            "avg_turnaround_seconds": round(self.total_turnaround / self.jobs_completed, 1)
+            if self.jobs_completed else None
+        }
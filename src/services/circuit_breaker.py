@@ -0,0 +1,248 @@
+import os
+import json
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any, AsyncIterator, Callable, Optional
+
+import httpx
+import openai
+
+from src.services.rate_governor import error_status
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Per-upstream defaults; "*" applies to every breaker. A slow call is one
+# that still completed, but later than its upstream normally answers.
+# OpenAI calls are recorded once openai_retry_policy is done with them, so
+# only errors retries could not recover from count as failures.
+DEFAULT_SETTINGS: Dict[str, Dict[str, Any]] = {
+    "*": {"failure_rate": 0.5, "slow_rate": 0.8, "min_calls": 10, "open_seconds": 30.0, "half_open_calls": 3},
+    "openai": {"slow_call_seconds": 120.0},
+    "graph": {"slow_call_seconds": 10.0},
+    "attachments": {"slow_call_seconds": 20.0}
+}
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit {name} is open, retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """True for errors that say the upstream is unhealthy: no answer, timeouts, 408/429/5xx"""
+    if isinstance(error, CircuitOpenError):
+        return False
+    status, _ = error_status(error)
+    # Graph (kiota) errors carry the status as response_status_code
+    status = status or getattr(error, "response_status_code", None)
+    if status is not None:
+        return status in (408, 429) or status >= 500
+    return isinstance(error, (openai.APIConnectionError, httpx.TransportError, asyncio.TimeoutError, OSError))
+
+class CircuitBreaker:
+    """Closed / open / half-open circuit breaker of one upstream.
+
+    While closed, the outcomes of the last `window` calls (no older than
+    `window_seconds`) are kept; once there are `min_calls` of them and the
+    share of failed calls reaches `failure_rate`, or the share of calls
+    slower than `slow_call_seconds` reaches `slow_rate`, the circuit opens.
+    An open circuit rejects calls with CircuitOpenError for `open_seconds`,
+    then lets `half_open_calls` trial calls through: the circuit closes if
+    all of them succeed in time and opens again on the first one that does
+    not.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        slow_rate: float = 0.8,
+        slow_call_seconds: float = 60.0,
+        min_calls: int = 10,
+        window: int = 50,
+        window_seconds: float = 60.0,
+        open_seconds: float = 30.0,
+        half_open_calls: int = 3,
+        enabled: bool = True,
+        is_failure: Callable[[BaseException], bool] = is_upstream_failure
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_rate = slow_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.min_calls = max(1, min_calls)
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_calls = max(1, half_open_calls)
+        self.enabled = enabled
+        self.is_failure = is_failure
+        # (finished at, failed, slow) of recent calls while closed
+        self.outcomes: deque = deque(maxlen=window)
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.trial_calls = 0
+        self.trial_successes = 0
+        self.trip_reason: Optional[str] = None
+        self.calls = 0
+        self.failures = 0
+        self.slow_calls = 0
+        self.rejected = 0
+        self.opened = 0
+
+    def current_state(self) -> str:
+        """The state, moving an open circuit to half-open once `open_seconds` have passed"""
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+            self.transition(HALF_OPEN)
+        return self.state
+
+    def retry_after(self) -> float:
+        return max(0.0, self.open_seconds - (time.monotonic() - self.opened_at))
+
+    def transition(self, state: str, reason: Optional[str] = None) -> None:
+        print(f"Circuit {self.name}: {self.state} -> {state}" + (f" ({reason})" if reason else ""))
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+            self.trip_reason = reason
+            self.opened += 1
+        elif state == HALF_OPEN:
+            self.trial_calls = self.trial_successes = 0
+        else:
+            self.outcomes.clear()
+
+    def raise_if_open(self) -> None:
+        """Fail fast before spending anything (rate capacity, a queue slot) on a call"""
+        if self.enabled and self.current_state() == OPEN:
+            self.rejected += 1
+            raise CircuitOpenError(self.name, self.retry_after())
+
+    def allow(self) -> bool:
+        """Admit a call, or raise CircuitOpenError; True when it is a half-open trial"""
+        if not self.enabled:
+            return False
+        state = self.current_state()
+        if state == OPEN or (state == HALF_OPEN and self.trial_calls >= self.half_open_calls):
+            self.rejected += 1
+            raise CircuitOpenError(self.name, self.retry_after())
+        if state == HALF_OPEN:
+            self.trial_calls += 1
+            return True
+        return False
+
+    def record(self, latency: float, failed: bool, trial: bool) -> None:
+        self.calls += 1
+        slow = not failed and latency >= self.slow_call_seconds
+        self.failures += failed
+        self.slow_calls += slow
+        if not self.enabled or self.state == OPEN:
+            return
+        if self.state == HALF_OPEN:
+            if not trial:
+                # Admitted before the circuit opened; says nothing about recovery
+                return
+            if failed or slow:
+                self.transition(OPEN, "trial call " + ("failed" if failed else f"took {latency:.1f}s"))
+            else:
+                self.trial_successes += 1
+                if self.trial_successes >= self.half_open_calls:
+                    self.transition(CLOSED)
+            return
+        now = time.monotonic()
+        self.outcomes.append((now, failed, slow))
+        while now - self.outcomes[0][0] > self.window_seconds:
+            self.outcomes.popleft()
+        calls = len(self.outcomes)
+        if calls < self.min_calls:
+            return
+        failures = sum(1 for outcome in self.outcomes if outcome[1])
+        slow_calls = sum(1 for outcome in self.outcomes if outcome[2])
+        if failures >= self.failure_rate * calls:
+            self.transition(OPEN, f"{failures}/{calls} calls failed")
+        elif slow_calls >= self.slow_rate * calls:
+            self.transition(OPEN, f"{slow_calls}/{calls} calls slower than {self.slow_call_seconds}s")
+
+    @asynccontextmanager
+    async def guard(self) -> AsyncIterator[bool]:
+        """Run the body as one call of this upstream, recording its outcome and latency.
+
+        Yields True when the call is a half-open trial, which callers should
+        not retry so that it reports on the upstream promptly.
+        """
+        trial = self.allow()
+        started = time.perf_counter()
+        try:
+            yield trial
+        except asyncio.CancelledError:
+            # Abandoned by the caller (a hedge or tier fallback won); no verdict
+            if trial and self.state == HALF_OPEN:
+                self.trial_calls = max(0, self.trial_calls - 1)
+            raise
+        except Exception as e:
+            self.record(time.perf_counter() - started, self.is_failure(e), trial)
+            raise
+        self.record(time.perf_counter() - started, False, trial)
+
+    def stats(self) -> Dict[str, Any]:
+        state = self.current_state()
+        failures = sum(1 for outcome in self.outcomes if outcome[1])
+        return {
+            "state": state,
+            "retry_after": round(self.retry_after(), 1) if state == OPEN else None,
+            "trip_reason": self.trip_reason,
+            "window_calls": len(self.outcomes),
+            "window_failure_rate": round(failures / len(self.outcomes), 3) if self.outcomes else 0.0,
+            "calls": self.calls,
+            "failures": self.failures,
+            "slow_calls": self.slow_calls,
+            "rejected": self.rejected,
+            "opened": self.opened
+        }
+
+class CircuitBreakers:
+    """Circuit breakers by name, created on first use.
+
+    Names are "<upstream>" or "<upstream>/<part>" (OpenAI gets one per
+    model, "openai/o4-mini"); settings are merged from "*", the upstream
+    and the full name, so a single model can be tuned on its own.
+    """
+
+    def __init__(self, enabled: bool = True, settings: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.enabled = enabled
+        self.settings = {key: dict(value) for key, value in DEFAULT_SETTINGS.items()}
+        for key, value in (settings or {}).items():
+            self.settings.setdefault(key, {}).update(value)
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    @classmethod
+    def from_env(cls) -> "CircuitBreakers":
+        return cls(
+            enabled=os.getenv("CIRCUIT_BREAKERS_ENABLED", "true").lower() == "true",
+            settings=json.loads(os.getenv("CIRCUIT_BREAKERS", "{}"))
+        )
+
+    def get(self, name: str) -> CircuitBreaker:
+        breaker = self.breakers.get(name)
+        if breaker is None:
+            upstream = name.split("/", 1)[0]
+            settings = {
+                **self.settings.get("*", {}), **self.settings.get(upstream, {}), **self.settings.get(name, {})
+            }
+            breaker = self.breakers[name] = CircuitBreaker(name, enabled=self.enabled, **settings)
+        return breaker
+
+    def states(self) -> Dict[str, str]:
+        return {name: breaker.current_state() for name, breaker in self.breakers.items()}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "circuits": {name: breaker.stats() for name, breaker in self.breakers.items()}
+        }
+
+circuit_breakers = CircuitBreakers.from_env()
@@ -0,0 +1,66 @@
+import os
+from typing import Dict, Any, List, Optional
+
+# "delta": once a previous_response_id exists only the new function_call_output
+# items are sent, the rest of the conversation lives server-side.
+# "replay": every turn re-sends the email and the tool calls (previous behaviour).
+DELTA = "delta"
+REPLAY = "replay"
+
+def conversation_mode() -> str:
+    mode = os.getenv("CONVERSATION_STATE_MODE", DELTA).lower()
+    return mode if mode in (DELTA, REPLAY) else DELTA
+
+def delta_input(function_responses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Only the tool outputs; the calls themselves are part of the previous response"""
+    return [item for item in function_responses if item.get("type") == "function_call_output"]
+
+def is_expired_response_error(error: Exception) -> bool:
+    """True when OpenAI no longer has the response referenced by previous_response_id"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status not in (400, 404):
+        return False
+    message = str(error)
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            message += " " + response.text
+        except Exception:
+            pass
+    message = message.lower()
+    return "previous_response" in message or ("previous response" in message and "not found" in message)
+
+class ConversationStats:
+    """Input tokens and latency of continuation calls per conversation mode"""
+
+    def __init__(self):
+        self.modes: Dict[str, Dict[str, float]] = {}
+        self.expired_fallbacks = 0
+
+    def record(self, mode: str, usage: Optional[Dict[str, Any]], latency: float) -> None:
+        entry = self.modes.setdefault(mode, {"calls": 0, "input_tokens": 0, "latency": 0.0})
+        entry["calls"] += 1
+        entry["input_tokens"] += (usage or {}).get("input_tokens") or 0
+        entry["latency"] += latency
+
+    def record_fallback(self) -> None:
+        self.expired_fallbacks += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": conversation_mode(),
+            "expired_fallbacks": self.expired_fallbacks,
+            **{
+                mode: {
+                    "calls": entry["calls"],
+                    "input_tokens": entry["input_tokens"],
+                    "avg_input_tokens": round(entry["input_tokens"] / entry["calls"], 1),
+                    "avg_latency": round(entry["latency"] / entry["calls"], 3)
+                }
+                for mode, entry in self.modes.items()
+            }
+        }
+
+conversation_stats = ConversationStats()
@@ -0,0 +1,260 @@
+import os
+import re
+import sys
+import json
+import math
+from collections import Counter
+from dataclasses import dataclass, replace
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from src.settings import settings
+
+SIMPLE = "simple"
+STANDARD = "standard"
+COMPLEX = "complex"
+CLASSES = (SIMPLE, STANDARD, COMPLEX)
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_TAG_RE = re.compile(r"<[^>]+>")
+_REPLY_RE = re.compile(r"^\s*(re|fw|fwd|enc|res)\s*:", re.I)
+
+# Seed vocabulary for the rule-based fallback used until a model is trained
+_SIMPLE_WORDS = {
+    "obrigado", "obrigada", "agradeço", "agradecemos", "recebido", "recebi", "ok", "perfeito",
+    "thanks", "thank", "received", "cumprimentos", "confirmo", "confirmado"
+}
+_COMPLEX_WORDS = {
+    "rescisão", "rescindir", "reclamação", "reclamar", "contrato", "tribunal", "advogado", "dívida",
+    "litígio", "indemnização", "penalização", "fidelização", "deco", "erse", "livro", "contestar",
+    "complaint", "termination", "lawyer", "refund", "reembolso", "injunção", "corte"
+}
+
+@dataclass(frozen=True)
+class ModelRoute:
+    """Model settings chosen for one request"""
+    label: str
+    model: str
+    reasoning_effort: str
+    max_output_tokens: int
+
+def is_reasoning_model(model: str) -> bool:
+    """o-series and gpt-5 models: they take a reasoning effort and reject temperature"""
+    return model.startswith("o") or model.startswith("gpt-5")
+
+def email_features(subject: str, body: str, attachment_count: int = 0) -> List[str]:
+    """Discrete features of an email: words plus bucketed shape signals"""
+    text = _TAG_RE.sub(" ", body or "")
+    words = _WORD_RE.findall(text.lower())
+    subject_words = _WORD_RE.findall((subject or "").lower())
+    length = len(words)
+    length_bucket = "tiny" if length < 25 else "short" if length < 120 else "medium" if length < 600 else "long"
+    features = [f"w:{word}" for word in words[:400]]
+    features += [f"s:{word}" for word in subject_words]
+    features += [
+        f"len:{length_bucket}",
+        f"att:{min(attachment_count, 3)}",
+        f"q:{min(text.count('?'), 3)}",
+        f"reply:{int(bool(_REPLY_RE.match(subject or '')))}"
+    ]
+    return features
+
+class NaiveBayesEmailClassifier:
+    """Multinomial Naive Bayes over email_features, trainable from logged history"""
+
+    def __init__(self, model: Optional[Dict[str, Any]] = None):
+        self.model = model
+
+    @property
+    def trained(self) -> bool:
+        return bool(self.model)
+
+    def train(self, examples: Iterable[Tuple[List[str], str]], alpha: float = 1.0) -> None:
+        class_counts: Counter = Counter()
+        feature_counts: Dict[str, Counter] = {label: Counter() for label in CLASSES}
+        for features, label in examples:
+            class_counts[label] += 1
+            feature_counts.setdefault(label, Counter()).update(features)
+        vocabulary = set().union(*(counts.keys() for counts in feature_counts.values()))
+        total = sum(class_counts.values())
+        model = {"alpha": alpha, "vocabulary_size": len(vocabulary), "classes": {}}
+        for label, counts in feature_counts.items():
+            if not class_counts[label]:
+                continue
+            model["classes"][label] = {
+                "prior": math.log(class_counts[label] / total),
+                "total": sum(counts.values()),
+                "counts": dict(counts)
+            }
+        self.model = model
+
+    def predict(self, features: List[str]) -> Tuple[str, float]:
+        """Most likely class and its posterior probability"""
+        alpha = self.model["alpha"]
+        vocabulary_size = self.model["vocabulary_size"]
+        scores = {}
+        for label, params in self.model["classes"].items():
+            denominator = math.log(params["total"] + alpha * vocabulary_size)
+            counts = params["counts"]
+            scores[label] = params["prior"] + sum(
+                math.log(counts.get(feature, 0) + alpha) - denominator for feature in features
+            )
+        best = max(scores, key=scores.get)
+        norm = max(scores.values())
+        total = sum(math.exp(score - norm) for score in scores.values())
+        return best, 1.0 / total
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.model, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> "NaiveBayesEmailClassifier":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+def rule_based_label(subject: str, body: str, attachment_count: int = 0) -> str:
+    """Heuristic class used until a trained model is available"""
+    words = set(_WORD_RE.findall(_TAG_RE.sub(" ", f"{subject} {body}").lower()))
+    length = len(_WORD_RE.findall(body or ""))
+    if words & _COMPLEX_WORDS or attachment_count > 0 or length > 600:
+        return COMPLEX
+    if length < 40 and words & _SIMPLE_WORDS and "?" not in (body or ""):
+        return SIMPLE
+    return STANDARD
+
+def label_from_history(record: Dict[str, Any]) -> Optional[str]:
+    """Class of a logged request: explicit "label", else derived from how hard it was"""
+    if record.get("label") in CLASSES:
+        return record["label"]
+    if "iterations" not in record and "toolCalls" not in record:
+        return None
+    iterations = int(record.get("iterations") or 1)
+    tool_calls = int(record.get("toolCalls") or 0)
+    if iterations <= 1 and tool_calls == 0 and int(record.get("outputTokens") or 0) < 600:
+        return SIMPLE
+    if iterations >= 3 or tool_calls >= 2:
+        return COMPLEX
+    return STANDARD
+
+class RoutingStats:
+    """Observed end-to-end latency per routing class and the route it was served with.
+
+    The classes hold emails of different difficulty, so their latencies are
+    not comparable with each other: a simple email is faster whatever route
+    it gets. No savings are derived from them.
+    """
+
+    def __init__(self):
+        self.classes: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, route: ModelRoute, latency: float) -> None:
+        entry = self.classes.setdefault(route.label, {"requests": 0, "latency": 0.0, "routes": Counter()})
+        entry["requests"] += 1
+        entry["latency"] += latency
+        entry["routes"][f"{route.model}/{route.reasoning_effort}"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            label: {
+                "requests": entry["requests"],
+                "avg_latency": round(entry["latency"] / entry["requests"], 3),
+                "routes": dict(entry["routes"])
+            }
+            for label, entry in self.classes.items()
+        }
+
+class EmailRouter:
+    """Picks model, reasoning effort and max_output_tokens per email before any API call"""
+
+    def __init__(
+        self,
+        default_model: str,
+        default_effort: str,
+        classifier: Optional[NaiveBayesEmailClassifier] = None,
+        routes: Optional[Dict[str, Dict[str, Any]]] = None,
+        min_confidence: float = 0.6
+    ):
+        self.classifier = classifier or NaiveBayesEmailClassifier()
+        self.min_confidence = min_confidence
+        self.routes = {
+            SIMPLE: ModelRoute(SIMPLE, default_model, "low", 1024),
+            STANDARD: ModelRoute(STANDARD, default_model, default_effort, 4096),
+            COMPLEX: ModelRoute(COMPLEX, default_model, "high", 8192),
+        }
+        for label, overrides in (routes or {}).items():
+            if label in self.routes:
+                self.routes[label] = replace(self.routes[label], **overrides)
+        self.stats = RoutingStats()
+
+    @classmethod
+    def from_env(cls, default_model: str, default_effort: str) -> "EmailRouter":
+        classifier = None
+        model_path = os.getenv("EMAIL_CLASSIFIER_MODEL")
+        if model_path and os.path.exists(model_path):
+            classifier = NaiveBayesEmailClassifier.load(model_path)
+        routes = json.loads(os.getenv("MODEL_ROUTES", "{}"))
+        return cls(
+            default_model,
+            default_effort,
+            classifier=classifier,
+            routes=routes,
+            min_confidence=float(os.getenv("EMAIL_CLASSIFIER_MIN_CONFIDENCE", "0.6"))
+        )
+
+    def classify(self, subject: str, body: str, attachment_count: int = 0) -> str:
+        if self.classifier.trained:
+            label, confidence = self.classifier.predict(email_features(subject, body, attachment_count))
+            # Unsure predictions take the safe default
+            return label if confidence >= self.min_confidence else STANDARD
+        return rule_based_label(subject, body, attachment_count)
+
+    def route(
+        self,
+        subject: str,
+        body: str,
+        attachment_count: int = 0,
+        model_override: Optional[str] = None,
+        reasoning_override: Optional[str] = None
+    ) -> ModelRoute:
+        """Route for an email; explicit model / reasoning overrides always win"""
+        route = self.routes[self.classify(subject, body, attachment_count)]
+        if model_override:
+            route = replace(route, model=model_override)
+        if reasoning_override:
+            route = replace(route, reasoning_effort=reasoning_override.lower())
+        return route
+
+def train_from_history(history_path: str, model_path: str) -> Dict[str, int]:
+    """Train a classifier from a JSONL log of past requests and save it.
+
+    Each line holds "subject", "body", optional "attachments" (list or count)
+    and either "label" or the outcome fields "iterations", "toolCalls" and
+    "outputTokens" from which the class is derived.
+    """
+    examples = []
+    with open(history_path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            label = label_from_history(record)
+            if label is None:
+                continue
+            attachments = record.get("attachments") or 0
+            attachment_count = len(attachments) if isinstance(attachments, list) else int(attachments)
+            examples.append((email_features(record.get("subject", ""), record.get("body", ""), attachment_count), label))
+    classifier = NaiveBayesEmailClassifier()
+    classifier.train(examples)
+    classifier.save(model_path)
+    return dict(Counter(label for _, label in examples))
+
+email_router = EmailRouter.from_env(
+    os.getenv("DEFAULT_AI_MODEL", settings.default_ai_model),
+    os.getenv("REASONING_LEVEL", "medium")
+)
+
+if __name__ == "__main__":
+    # python -m src.services.email_classifier history.jsonl email_classifier.json
+    if len(sys.argv) != 3:
+        print("Usage: python -m src.services.email_classifier <history.jsonl> <model.json>")
+        sys.exit(1)
+    print(f"Trained on {train_from_history(sys.argv[1], sys.argv[2])}")
@@ -1,9 +1,34 @@
 import json
+import time
 import openai
 from typing import List, Optional, Dict, Any
-from ..config import default_persona, tools
+from ..config import default_persona
 from ..settings import settings
-from .utils import content_not_available, analyze_email_attachment
+from .prompt_assembly import prompt_assembler
+from .email_classifier import email_router, is_reasoning_model
+from .thread_stripper import thread_stripper
+from .html_markdown import html_converter
+from .token_budget import token_budget, estimate_request_tokens, TokenBudgetExceeded
+from .priority_scheduler import openai_scheduler, Ticket
+from .rate_governor import rate_governor
+from .retry_policy import openai_retry_policy, RetryBudget
+from .http_clients import http_clients
+from .circuit_breaker import circuit_breakers
+from .model_fallback import model_fallbacks
+from .tool_executor import tool_executor
+from .tool_registry import tool_registry, ToolContext
+from .teams_service import TeamsService
+from .attachment_service import AttachmentService
+from .openai_service import OpenAIService
+
+# Services the tool handlers act through, created on the first tool call
+_tool_services: Optional[tuple] = None
+
+def tool_context(email_input: Any) -> ToolContext:
+    global _tool_services
+    if _tool_services is None:
+        _tool_services = (TeamsService(), AttachmentService(), OpenAIService())
+    return ToolContext(email_input, *_tool_services)
 
 def extract_confidence_from_response(response_content: str) -> int:
     """Extract confidence score from AI response or calculate based on response quality."""
@@ -24,89 +49,151 @@ def extract_confidence_from_response(response_content: str) -> int:
     except:
         return 75  # Default confidence
 
-async def generate_email_reply(email_input: Any, client: openai.OpenAI):
+async def create_chat_completion(
+    client: openai.AsyncOpenAI, ticket: Ticket, retry_budget: RetryBudget, **kwargs: Any
+) -> Any:
+    """One chat completion through the priority scheduler and the TPM/RPM governor,
+    retried on transient failures within retry_budget and failing fast while the
+    model's circuit is open"""
+    messages = [m if isinstance(m, dict) else m.model_dump() for m in kwargs["messages"]]
+    tokens = estimate_request_tokens(None, kwargs.get("tools"), messages) + kwargs.get("max_completion_tokens", 4096)
+    read_timeout = http_clients.config("openai").read_timeout
+    breaker = circuit_breakers.get(f"openai/{kwargs['model']}")
+    breaker.raise_if_open()
+    async with openai_scheduler.slot(ticket) as lease:
+        # The retry window runs from here, not from the email's arrival
+        retry_budget.start()
+        async def attempt() -> Any:
+            breaker.raise_if_open()
+            async with rate_governor.reserve(client.api_key, kwargs["model"], tokens) as reservation:
+                raw = await client.chat.completions.with_raw_response.create(
+                    **kwargs, timeout=openai_retry_policy.attempt_timeout(retry_budget, read_timeout)
+                )
+                reservation.headers = raw.headers
+                response = raw.parse()
+                reservation.used_tokens = response.usage.total_tokens if response.usage else None
+                return response
+        # The circuit records the outcome once retries are over (half-open trials are not retried)
+        async with breaker.guard() as trial:
+            response = await (attempt() if trial else openai_retry_policy.run(attempt, retry_budget))
+        lease.used_tokens = response.usage.total_tokens if response.usage else None
+        return response
+
+async def generate_email_reply(email_input: Any, client: openai.AsyncOpenAI):
     try:
         system_messages = [
             {"role": "system", "content": email_input.persona or default_persona}
         ]
 
+        # Newest message of the thread plus a bounded summary of the quoted history
+        stripped = thread_stripper.strip(email_input.body, is_html=email_input.isHtml, subject=email_input.subject)
+        body, is_html = stripped.body, email_input.isHtml
+        if is_html and html_converter.enabled:
+            # Send compact markdown instead of Outlook's raw HTML
+            body, is_html = html_converter.convert(body), False
+
         email_object = {
             "emailId": None,  # Assuming emailId is not available in the input
             "from": email_input.from_email,
             "to": email_input.to,
             "cc": email_input.cc,
             "subject": email_input.subject,
-            "attachments": email_input.attachments,
-            "body": email_input.body,
-            "isHtml": email_input.isHtml,
+            "attachments": [attachment.dict() for attachment in email_input.attachments]
+            if email_input.attachments else None,
+            "body": body,
+            "isHtml": is_html,
             "receivedDateTime": email_input.receivedDateTime
         }
+        if stripped.history:
+            email_object["quotedHistory"] = stripped.history
+
+        # Pre-classify the email; explicit AiModel / ReasoningLevel win
+        route = email_router.route(
+            email_input.subject,
+            email_input.body,
+            len(email_input.attachments or []),
+            model_override=email_input.AiModel,
+            reasoning_override=email_input.ReasoningLevel
+        )
+
+        # Trim the email to the model's input budget before calling OpenAI;
+        # TokenBudgetExceeded propagates so the caller can refuse the email
+        context_message = prompt_assembler.context_message(role="system")
+        fitted = token_budget.fit(
+            email_object,
+            estimate_request_tokens(None, tool_registry.schemas(), system_messages + [context_message]),
+            token_budget.budget_for(route.model, route.max_output_tokens)
+        )
 
         messages = [
-            {"role": "user", "content": f"Analisa e processa o seguinte email:\n {email_object}"}
+            {"role": "user", "content": f"Analisa e processa o seguinte email:\n {fitted.email}"},
+            # Date context after the email so the persona prefix stays cacheable
+            context_message
         ]
+        # The routed model first, then the domain's fallback chain on timeouts or overload
+        model_trail = model_fallbacks.trail(email_input.domain, route.model)
 
-        # Use the correct attribute name from the model
-        model_to_use = email_input.AiModel or settings.default_ai_model
+        def route_options(model: str) -> Dict[str, Any]:
+            options = {"max_completion_tokens": route.max_output_tokens}
+            if is_reasoning_model(model):
+                options["reasoning_effort"] = route.reasoning_effort
+            return options
 
-        response = client.chat.completions.create(
-            model=model_to_use,
+        # Wait for an OpenAI slot by importance, receipt time and domain share
+        ticket = openai_scheduler.ticket(
+            email_input.importance,
+            email_input.receivedDateTime,
+            domain=email_input.domain,
+            tokens=fitted.estimated_tokens + route.max_output_tokens
+        )
+        retry_budget = openai_retry_policy.budget()
+        started = time.perf_counter()
+        response = await model_fallbacks.run(model_trail, retry_budget, lambda model: create_chat_completion(
+            client,
+            ticket,
+            retry_budget,
+            model=model,
             messages=system_messages + messages,
-            tools=tools,
+            tools=tool_registry.schemas(),
             tool_choice="auto",
-        )
+            **route_options(model)
+        ))
         response_message = response.choices[0].message
         tool_calls = response_message.tool_calls
 
         if tool_calls:
-            available_functions = {
-                "content_not_available": content_not_available,
-                "analyze_email_attachment": analyze_email_attachment,
-            }
             messages.append(response_message)
+            context = tool_context(email_input)
             
-            for tool_call in tool_calls:
-                function_name = tool_call.function.name
-                function_to_call = available_functions.get(function_name)
-                
-                if function_to_call:
-                    try:
-                        function_args = json.loads(tool_call.function.arguments)
-                        function_response = function_to_call(**function_args)
-                        messages.append(
-                            {
-                                "tool_call_id": tool_call.id,
-                                "role": "tool",
-                                "name": function_name,
-                                "content": function_response,
-                            }
-                        )
-                    except json.JSONDecodeError as e:
-                        # Handle JSON parsing error
-                        messages.append(
-                            {
-                                "tool_call_id": tool_call.id,
-                                "role": "tool",
-                                "name": function_name,
-                                "content": json.dumps({"error": f"Failed to parse arguments: {str(e)}"}),
-                            }
-                        )
-                else:
-                    # Call external API for other functions
-                    # This is a placeholder for the actual implementation
-                    messages.append(
-                        {
-                            "tool_call_id": tool_call.id,
-                            "role": "tool",
-                            "name": function_name,
-                            "content": json.dumps({"success": True, "description": "This is a dummy response from the external API."}),
-                        }
-                    )
+            # Run the tool calls concurrently with their registered handlers;
+            # their results are added in call order
+            runs = await tool_executor.run(
+                [
+                    {"name": tool_call.function.name, "arguments": tool_call.function.arguments, "call_id": tool_call.id}
+                    for tool_call in tool_calls
+                ],
+                lambda call: tool_registry.invoke(call, context)
+            )
+            for run in runs:
+                messages.append(
+                    {
+                        "tool_call_id": run.call["call_id"],
+                        "role": "tool",
+                        "name": run.call["name"],
+                        "content": run.output,
+                    }
+                )
             
-            second_response = client.chat.completions.create(
-                model=model_to_use,
+            second_response = await model_fallbacks.run(model_trail, retry_budget, lambda model: create_chat_completion(
+                client,
+                ticket,
+                retry_budget,
+                model=model,
                 messages=messages,
-            )
+                **route_options(model)
+            ))
+            email_router.stats.record(route, time.perf_counter() - started)
+            model_fallbacks.record(model_trail)
             
             final_content = second_response.choices[0].message.content
             confidence = extract_confidence_from_response(final_content)
@@ -114,18 +201,29 @@ async def generate_email_reply(email_input: Any, client: openai.OpenAI):
             return {
                 "body": final_content,
                 "confidence": confidence,
-                "language": email_input.language or "pt-PT"  # Default to Portuguese
+                "language": email_input.language or "pt-PT",  # Default to Portuguese
+                "estimatedInputTokens": fitted.estimated_tokens,
+                "retries": retry_budget.report(),
+                "model": model_trail.report()
             }
 
+        email_router.stats.record(route, time.perf_counter() - started)
+        model_fallbacks.record(model_trail)
         final_content = response_message.content
         confidence = extract_confidence_from_response(final_content)
         
         return {
             "body": final_content,
             "confidence": confidence,
-            "language": email_input.language or "pt-PT"  # Default to Portuguese
+            "language": email_input.language or "pt-PT",  # Default to Portuguese
+            "estimatedInputTokens": fitted.estimated_tokens,
+            "retries": retry_budget.report(),
+            "model": model_trail.report()
         }
         
+    except TokenBudgetExceeded:
+        # A refusal, not a reply: nothing was sent to OpenAI
+        raise
     except Exception as e:
         # Return error response with low confidence
         return {
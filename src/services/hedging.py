@@ -0,0 +1,150 @@
+import os
+import time
+import asyncio
+from collections import deque
+from typing import Dict, Any, Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+class LatencyWindow:
+    """Latencies of the most recent calls of one kind, for percentile estimates"""
+
+    def __init__(self, size: int = 200):
+        self.samples: deque = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def record(self, latency: float) -> None:
+        self.samples.append(latency)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def _discard_result(task: asyncio.Task) -> None:
+    # A cancelled or losing call may still fail; its error is not ours to raise
+    if not task.cancelled():
+        task.exception()
+
+class RequestHedger:
+    """Hedged OpenAI calls against the latency tail.
+
+    Latencies are tracked per call kind (model / reasoning effort). Once a
+    kind has `min_samples` of them, a call still running after its observed
+    `percentile` latency gets a duplicate (the hedge), possibly to a faster
+    model or service tier; whichever finishes first wins and the other is
+    cancelled. Hedges are capped at `budget` of all calls, since each one
+    is billed.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        percentile: float = 0.95,
+        min_samples: int = 20,
+        min_delay: float = 1.0,
+        budget: float = 0.05,
+        model: Optional[str] = None,
+        service_tier: Optional[str] = None,
+        window: int = 200
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.budget = budget
+        self.model = model
+        self.service_tier = service_tier
+        self.window = window
+        self.latencies: Dict[str, LatencyWindow] = {}
+        self.calls = 0
+        self.fired = 0
+        self.won = 0
+        self.over_budget = 0
+
+    @classmethod
+    def from_env(cls) -> "RequestHedger":
+        return cls(
+            enabled=os.getenv("HEDGING_ENABLED", "false").lower() == "true",
+            percentile=float(os.getenv("HEDGE_PERCENTILE", "0.95")),
+            min_samples=int(os.getenv("HEDGE_MIN_SAMPLES", "20")),
+            min_delay=float(os.getenv("HEDGE_MIN_DELAY", "1.0")),
+            budget=float(os.getenv("HEDGE_BUDGET", "0.05")),
+            model=os.getenv("HEDGE_MODEL") or None,
+            service_tier=os.getenv("HEDGE_SERVICE_TIER") or None
+        )
+
+    def window_for(self, key: str) -> LatencyWindow:
+        window = self.latencies.get(key)
+        if window is None:
+            window = self.latencies[key] = LatencyWindow(self.window)
+        return window
+
+    def delay_for(self, key: str) -> Optional[float]:
+        """Seconds after which a call of this kind is hedged, None until enough samples"""
+        window = self.window_for(key)
+        if len(window) < self.min_samples:
+            return None
+        return max(self.min_delay, window.percentile(self.percentile))
+
+    async def run(
+        self,
+        key: str,
+        primary: Callable[[], Awaitable[T]],
+        hedge: Optional[Callable[[], Awaitable[T]]] = None
+    ) -> T:
+        """Await primary(), racing it against hedge() if it runs past the hedge delay"""
+        self.calls += 1
+        started = time.perf_counter()
+        delay = self.delay_for(key) if self.enabled and hedge else None
+        tasks = [asyncio.ensure_future(primary())]
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    if self.fired < self.budget * self.calls:
+                        self.fired += 1
+                        print(f"Hedging {key} call after {delay:.2f}s")
+                        tasks.append(asyncio.ensure_future(hedge()))
+                    else:
+                        self.over_budget += 1
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        continue
+                    if task is not tasks[0]:
+                        self.won += 1
+                    self.window_for(key).record(time.perf_counter() - started)
+                    return task.result()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                task.add_done_callback(_discard_result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "budget": self.budget,
+            "calls": self.calls,
+            "hedges_fired": self.fired,
+            "hedges_won": self.won,
+            "over_budget": self.over_budget,
+            "delays": {
+                key: {
+                    "samples": len(window),
+                    "p50": round(window.percentile(0.5), 3),
+                    "hedge_after": round(self.delay_for(key), 3) if self.delay_for(key) is not None else None
+                }
+                for key, window in self.latencies.items() if len(window)
+            }
+        }
+
+request_hedger = RequestHedger.from_env()
@@ -0,0 +1,323 @@
+import os
+import re
+import time
+from html.parser import HTMLParser
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_SAFELINKS_HOST_RE = re.compile(r"\.safelinks\.protection\.outlook\.com$", re.I)
+
+# Elements whose content is never part of the message
+_SKIP_CONTENT = {"style", "script", "head", "title", "xml", "noscript", "template"}
+_BLOCKS = {
+    "p", "div", "section", "article", "header", "footer", "center", "address",
+    "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol", "li", "table", "tr", "blockquote", "pre"
+}
+
+def unwrap_link(href: str) -> str:
+    """Original URL of an Outlook Safe Links redirect; other links unchanged"""
+    parsed = urlparse(href)
+    if parsed.hostname and _SAFELINKS_HOST_RE.search(parsed.hostname):
+        target = parse_qs(parsed.query).get("url")
+        if target:
+            return target[0]
+    return href
+
+def _is_hidden(attrs: Dict[str, str]) -> bool:
+    style = (attrs.get("style") or "").replace(" ", "").lower()
+    return "display:none" in style or "mso-hide:all" in style or "hidden" in attrs
+
+def _is_tracking_pixel(attrs: Dict[str, str]) -> bool:
+    return attrs.get("width") in ("0", "1") or attrs.get("height") in ("0", "1")
+
+class MarkdownHTMLParser(HTMLParser):
+    """Incremental HTML to compact markdown converter.
+
+    Feed HTML in chunks of any size and take() the markdown lines completed
+    so far. Styles, scripts, conditional comments, VML/Office namespaced tags,
+    hidden elements and tracking pixels are dropped; paragraphs, headings,
+    links, lists and tables are kept. Single-column and nested layout tables
+    are flattened to their cell contents, data tables become markdown tables.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._out: List[str] = []
+        self._sinks: List[List[str]] = [self._out]
+        self._line: List[str] = []
+        self._pending_blank = False
+        self._last_line: Optional[str] = None
+        self._skip_tag: Optional[str] = None
+        self._skip_depth = 0
+        self._links: List[Tuple[str, int]] = []
+        self._lists: List[List[Any]] = []
+        self._tables: List[List[List[List[str]]]] = []
+        self._quote = 0
+        self._pre = 0
+
+    # Output helpers
+
+    def _emit(self, line: str) -> None:
+        sink = self._sinks[-1]
+        # take() drains the output, so remember its last line separately
+        last = sink[-1] if sink else (self._last_line if sink is self._out else None)
+        if self._pending_blank and last:
+            sink.append("")
+        self._pending_blank = False
+        sink.append("> " * self._quote + line)
+        if sink is self._out:
+            self._last_line = sink[-1]
+
+    def _break(self, blank: bool = False) -> None:
+        text = "".join(self._line).rstrip()
+        self._line = []
+        self._links = []
+        content = text.strip()
+        if content and content not in ("-", "*") and not re.fullmatch(r"\d+\.", content):
+            self._emit(text)
+        if blank:
+            self._pending_blank = True
+
+    def _write(self, text: str) -> None:
+        if not self._line and not self._pre:
+            text = text.lstrip()
+        elif self._line and self._line[-1].endswith(" ") and text.startswith(" "):
+            text = text[1:]
+        if text:
+            self._line.append(text)
+
+    # HTMLParser callbacks
+
+    def handle_starttag(self, tag: str, attrs_list: List[Tuple[str, Optional[str]]]) -> None:
+        if self._skip_tag:
+            if tag == self._skip_tag:
+                self._skip_depth += 1
+            return
+        attrs = {name: value or "" for name, value in attrs_list}
+        if tag in _SKIP_CONTENT or (_is_hidden(attrs) and tag not in ("img", "br", "hr")):
+            self._skip_tag, self._skip_depth = tag, 1
+            return
+        if ":" in tag:
+            return
+        if tag in ("td", "th"):
+            self._start_cell()
+        elif tag == "tr":
+            self._break()
+            if self._tables:
+                self._close_cell()
+                self._tables[-1].append([])
+        elif tag == "table":
+            self._break(blank=True)
+            self._tables.append([])
+        elif tag in ("ul", "ol"):
+            self._break(blank=not self._lists)
+            self._lists.append([tag, 0])
+        elif tag == "li":
+            self._break()
+            if not self._lists:
+                self._lists.append(["ul", 0])
+            kind, _ = self._lists[-1]
+            self._lists[-1][1] += 1
+            marker = f"{self._lists[-1][1]}. " if kind == "ol" else "- "
+            self._line = ["  " * (len(self._lists) - 1) + marker]
+        elif tag in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            self._break(blank=True)
+            self._line = ["#" * int(tag[1]) + " "]
+        elif tag == "blockquote":
+            self._break(blank=True)
+            self._quote += 1
+        elif tag == "pre":
+            self._break(blank=True)
+            self._pre += 1
+        elif tag in _BLOCKS:
+            self._break(blank=tag == "p")
+        elif tag == "br":
+            self._break()
+        elif tag == "hr":
+            self._break(blank=True)
+            self._emit("---")
+            self._pending_blank = True
+        elif tag == "a" and attrs.get("href"):
+            self._links.append((unwrap_link(attrs["href"].strip()), len(self._line)))
+        elif tag == "img":
+            alt = " ".join((attrs.get("alt") or "").split())
+            if alt and not _is_tracking_pixel(attrs):
+                self._write(f"[{alt}]")
+
+    def handle_startendtag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        self.handle_starttag(tag, attrs)
+        if tag not in ("br", "hr", "img") and not self._skip_tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag: str) -> None:
+        if self._skip_tag:
+            if tag == self._skip_tag:
+                self._skip_depth -= 1
+                if not self._skip_depth:
+                    self._skip_tag = None
+            return
+        if ":" in tag:
+            return
+        if tag == "a" and self._links:
+            self._close_link()
+        elif tag in ("td", "th"):
+            self._close_cell()
+        elif tag == "tr":
+            self._close_cell()
+        elif tag == "table":
+            self._close_table()
+        elif tag in ("ul", "ol"):
+            self._break(blank=len(self._lists) == 1)
+            if self._lists:
+                self._lists.pop()
+        elif tag == "blockquote":
+            self._break(blank=True)
+            self._quote = max(0, self._quote - 1)
+        elif tag == "pre":
+            self._break(blank=True)
+            self._pre = max(0, self._pre - 1)
+        elif tag in _BLOCKS:
+            self._break(blank=tag in ("p", "h1", "h2", "h3", "h4", "h5", "h6"))
+
+    def handle_data(self, data: str) -> None:
+        if self._skip_tag:
+            return
+        if self._pre:
+            lines = data.split("\n")
+            for index, line in enumerate(lines):
+                if index:
+                    self._break()
+                self._line.append(line.rstrip())
+            return
+        self._write(_WHITESPACE_RE.sub(" ", data.replace("\xa0", " ")))
+
+    def handle_comment(self, data: str) -> None:
+        # Conditional comments (<!--[if mso]> ... <![endif]-->) are comments too
+        pass
+
+    def unknown_decl(self, data: str) -> None:
+        pass
+
+    # Structures
+
+    def _close_link(self) -> None:
+        href, start = self._links.pop()
+        if start > len(self._line):
+            return
+        text = "".join(self._line[start:]).strip()
+        if href.lower().startswith("mailto:") and text.lower() == href[7:].split("?")[0].lower():
+            return
+        if not text:
+            return
+        link = f"<{href}>" if text == href else f"[{text}]({href})"
+        self._line[start:] = [(" " if self._line[start:] and self._line[start].startswith(" ") else "") + link]
+
+    def _start_cell(self) -> None:
+        self._break()
+        if not self._tables:
+            return
+        self._close_cell()
+        if not self._tables[-1]:
+            self._tables[-1].append([])
+        cell: List[str] = []
+        self._tables[-1][-1].append(cell)
+        self._sinks.append(cell)
+
+    def _close_cell(self) -> None:
+        self._break()
+        if len(self._sinks) > 1 and self._tables and self._tables[-1] and self._tables[-1][-1] \
+                and self._sinks[-1] is self._tables[-1][-1][-1]:
+            self._sinks.pop()
+
+    def _close_table(self) -> None:
+        self._close_cell()
+        if not self._tables:
+            return
+        rows = [row for row in self._tables.pop() if any(cell for cell in row)]
+        columns = max((len(row) for row in rows), default=0)
+        nested = any(len(cell) > 1 for row in rows for cell in row)
+        self._pending_blank = True
+        if columns >= 2 and len(rows) >= 2 and not nested:
+            # Data table
+            for index, row in enumerate(rows):
+                cells = [" ".join(cell).replace("|", "\\|") for cell in row]
+                cells += [""] * (columns - len(cells))
+                self._emit("| " + " | ".join(cells) + " |")
+                if index == 0:
+                    self._emit("|" + " --- |" * columns)
+        else:
+            # Layout table: keep the content, drop the grid
+            for row in rows:
+                for cell in row:
+                    for line in cell:
+                        self._emit(line)
+        self._pending_blank = True
+
+    # Streaming interface
+
+    def take(self) -> str:
+        """Markdown completed since the last call"""
+        if len(self._sinks) > 1 or not self._out:
+            return ""
+        text = "\n".join(self._out) + "\n"
+        self._out.clear()
+        return text
+
+    def close(self) -> None:
+        super().close()
+        while self._tables:
+            self._close_table()
+        self._break()
+
+def convert_stream(chunks: Iterable[str]) -> Iterator[str]:
+    """Convert an iterable of HTML chunks, yielding markdown as it is produced"""
+    parser = MarkdownHTMLParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+        text = parser.take()
+        if text:
+            yield text
+    parser.close()
+    text = parser.take()
+    if text:
+        yield text
+
+def html_to_markdown(body: str) -> str:
+    """Compact markdown of an HTML email body"""
+    return "".join(convert_stream([body])).strip()
+
+class HtmlMarkdownConverter:
+    """Converts HTML bodies to compact markdown before they are sent to the model"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.emails = 0
+        self.chars_in = 0
+        self.chars_out = 0
+        self.total_seconds = 0.0
+
+    @classmethod
+    def from_env(cls) -> "HtmlMarkdownConverter":
+        return cls(enabled=os.getenv("HTML_TO_MARKDOWN_ENABLED", "true").lower() == "true")
+
+    def convert(self, body: str) -> str:
+        start = time.perf_counter()
+        markdown = html_to_markdown(body or "")
+        self.emails += 1
+        self.chars_in += len(body or "")
+        self.chars_out += len(markdown)
+        self.total_seconds += time.perf_counter() - start
+        return markdown
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "emails": self.emails,
+            "chars_in": self.chars_in,
+            "chars_out": self.chars_out,
+            "reduction": round(1 - self.chars_out / self.chars_in, 4) if self.chars_in else 0.0,
+            "mb_per_second": round(self.chars_in / self.total_seconds / 1_000_000, 2) if self.total_seconds else 0.0
+        }
+
+html_converter = HtmlMarkdownConverter.from_env()
@@ -0,0 +1,163 @@
+import os
+import time
+import importlib.util
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+import httpx
+
+# HTTP/2 needs the optional `h2` package (pip install "httpx[http2]")
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+@dataclass
+class UpstreamConfig:
+    """Connection pool settings for one upstream service"""
+    name: str
+    base_url: str = ""
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    connect_timeout: float = 10.0
+    read_timeout: float = 60.0
+    http2: bool = True
+
+    @classmethod
+    def from_env(cls, name: str, **defaults) -> "UpstreamConfig":
+        """Build a config, letting HTTP_POOL_<NAME>_* environment variables override defaults"""
+        prefix = f"HTTP_POOL_{name.upper()}_"
+        config = cls(name=name, **defaults)
+        config.max_connections = int(os.getenv(prefix + "MAX_CONNECTIONS", config.max_connections))
+        config.max_keepalive_connections = int(
+            os.getenv(prefix + "MAX_KEEPALIVE", config.max_keepalive_connections)
+        )
+        config.keepalive_expiry = float(os.getenv(prefix + "KEEPALIVE_EXPIRY", config.keepalive_expiry))
+        config.connect_timeout = float(os.getenv(prefix + "CONNECT_TIMEOUT", config.connect_timeout))
+        config.read_timeout = float(os.getenv(prefix + "TIMEOUT", config.read_timeout))
+        config.http2 = os.getenv(prefix + "HTTP2", str(config.http2)).lower() == "true"
+        return config
+
+    @property
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+
+    @property
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry
+        )
+
+class PoolStatsTransport(httpx.AsyncBaseTransport):
+    """Transport wrapper counting requests, in-flight calls and pool waits"""
+
+    def __init__(self, transport: httpx.AsyncHTTPTransport, max_connections: int):
+        self.transport = transport
+        self.max_connections = max_connections
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.pool_waits = 0
+        self.errors = 0
+        self.total_time = 0.0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        # Every connection is busy: this request has to wait for one to free up
+        if self.in_flight >= self.max_connections:
+            self.pool_waits += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        start = time.perf_counter()
+        try:
+            return await self.transport.handle_async_request(request)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.total_time += time.perf_counter() - start
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        connections = getattr(getattr(self.transport, "_pool", None), "connections", [])
+        idle = sum(1 for connection in connections if connection.is_idle())
+        http2 = sum(1 for connection in connections if getattr(connection, "_connection", None) is not None
+                    and type(connection._connection).__name__.startswith("AsyncHTTP2"))
+        return {
+            "open_connections": len(connections),
+            "idle_connections": idle,
+            "active_connections": len(connections) - idle,
+            "http2_connections": http2,
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "pool_waits": self.pool_waits,
+            "errors": self.errors,
+            "avg_request_seconds": round(self.total_time / self.requests, 4) if self.requests else 0.0
+        }
+
+class HttpClientRegistry:
+    """Pooled keep-alive httpx clients, one per upstream, shared by every service.
+
+    Clients are created lazily and closed by the FastAPI lifespan on shutdown.
+    """
+
+    def __init__(self, upstreams: Dict[str, UpstreamConfig]):
+        self.upstreams = upstreams
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._transports: Dict[str, PoolStatsTransport] = {}
+
+    def config(self, name: str) -> UpstreamConfig:
+        if name not in self.upstreams:
+            self.upstreams[name] = UpstreamConfig.from_env(name)
+        return self.upstreams[name]
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """Return the pooled client for an upstream, creating it on first use"""
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            config = self.config(name)
+            transport = PoolStatsTransport(
+                httpx.AsyncHTTPTransport(
+                    http2=config.http2 and HTTP2_AVAILABLE,
+                    limits=config.limits
+                ),
+                max_connections=config.max_connections
+            )
+            client = httpx.AsyncClient(
+                base_url=config.base_url,
+                timeout=config.timeout,
+                transport=transport
+            )
+            self._clients[name] = client
+            self._transports[name] = transport
+        return client
+
+    async def aclose(self) -> None:
+        """Close every pooled client (called on application shutdown)"""
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+        self._transports.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool statistics per upstream for monitoring"""
+        return {
+            name: {
+                "http2_enabled": self.upstreams[name].http2 and HTTP2_AVAILABLE,
+                "max_connections": self.upstreams[name].max_connections,
+                **transport.stats()
+            }
+            for name, transport in self._transports.items()
+        }
+
+http_clients = HttpClientRegistry({
+    "openai": UpstreamConfig.from_env("openai", read_timeout=300.0),
+    "attachments": UpstreamConfig.from_env("attachments", read_timeout=60.0, max_connections=20),
+    "graph": UpstreamConfig.from_env(
+        "graph", base_url="https://graph.microsoft.com/v1.0", read_timeout=30.0, max_connections=10
+    ),
+    "callbacks": UpstreamConfig.from_env("callbacks", read_timeout=30.0, max_connections=10),
+})
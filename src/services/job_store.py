@@ -0,0 +1,142 @@
+import os
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+class JobStoreFull(Exception):
+    """Every stored job is still queued or running, so none can be evicted"""
+
+@dataclass
+class Job:
+    """An email answered out of band, and where its answer is"""
+    id: str
+    kind: str
+    status: str = QUEUED
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    done: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "jobId": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "createdAt": self.created_at,
+            "updatedAt": self.updated_at,
+            **self.metadata
+        }
+
+class JobStore:
+    """In-memory store of out-of-band jobs and their results.
+
+    Finished jobs are kept for ttl_seconds (and at most max_entries jobs) so
+    clients can collect them; waiters are woken as soon as a job finishes.
+    Only finished jobs are evicted: when all max_entries jobs are still
+    queued or running, create() raises JobStoreFull.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 86400.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self.created = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls) -> "JobStore":
+        return cls(
+            max_entries=int(os.getenv("JOB_STORE_MAX_ENTRIES", "10000")),
+            ttl_seconds=float(os.getenv("JOB_STORE_TTL_SECONDS", "86400"))
+        )
+
+    def create(self, kind: str, **metadata: Any) -> Job:
+        """A new queued job; raises JobStoreFull when no finished job can make room"""
+        self._evict()
+        if len(self._jobs) >= self.max_entries:
+            self.rejected += 1
+            raise JobStoreFull(f"{len(self._jobs)} jobs are still queued or running")
+        job = Job(id=f"job_{uuid.uuid4().hex}", kind=kind, metadata=metadata)
+        self._jobs[job.id] = job
+        self.created += 1
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def update(self, job_id: str, status: Optional[str] = None, **metadata: Any) -> None:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+        if status:
+            job.status = status
+        job.metadata.update(metadata)
+        job.updated_at = time.time()
+
+    def complete(self, job_id: str, result: Dict[str, Any], **metadata: Any) -> None:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+        self.update(job_id, COMPLETED, **metadata)
+        job.result = result
+        job.done.set()
+        self.completed += 1
+
+    def fail(self, job_id: str, error: str, **metadata: Any) -> None:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+        self.update(job_id, FAILED, **metadata)
+        job.error = error
+        job.done.set()
+        self.failed += 1
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        """The job once finished, or as it is after timeout seconds"""
+        job = self._jobs.get(job_id)
+        if job is not None and not job.done.is_set() and timeout > 0:
+            try:
+                await asyncio.wait_for(job.done.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return job
+
+    def _evict(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done.is_set() and job.updated_at < cutoff]:
+            del self._jobs[job_id]
+        if len(self._jobs) < self.max_entries:
+            return
+        # Oldest finished jobs first; live jobs are never dropped
+        finished = [job_id for job_id, job in self._jobs.items() if job.done.is_set()]
+        for job_id in finished[:len(self._jobs) - self.max_entries + 1]:
+            del self._jobs[job_id]
+
+    def stats(self) -> Dict[str, Any]:
+        by_status: Dict[str, int] = {}
+        for job in self._jobs.values():
+            by_status[job.status] = by_status.get(job.status, 0) + 1
+        return {
+            "jobs": len(self._jobs),
+            "by_status": by_status,
+            "created": self.created,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected
+        }
+
+job_store = JobStore.from_env()
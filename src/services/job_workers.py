@@ -0,0 +1,94 @@
+import os
+import time
+import asyncio
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Tuple
+from src.services.job_store import job_store, RUNNING
+
+JobWork = Callable[[], Awaitable[Dict[str, Any]]]
+
+class JobWorkerPool:
+    """Bounded pool of workers answering queued jobs.
+
+    Submitting only enqueues the work, so the caller gets its job id back
+    immediately; at most `workers` jobs run at once and at most `max_queue`
+    wait. Bursts beyond that are rejected with asyncio.QueueFull instead of
+    piling up open connections.
+    """
+
+    def __init__(self, workers: int = 8, max_queue: int = 1000):
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self._queue: Optional["asyncio.Queue[Tuple[str, JobWork, float]]"] = None
+        self._tasks: List[asyncio.Task] = []
+        self.busy = 0
+        self.started = 0
+        self.processed = 0
+        self.rejected = 0
+        self.total_queue_wait = 0.0
+        self.total_run_time = 0.0
+
+    @classmethod
+    def from_env(cls) -> "JobWorkerPool":
+        return cls(
+            workers=int(os.getenv("JOB_WORKERS", "8")),
+            max_queue=int(os.getenv("JOB_QUEUE_MAX", "1000"))
+        )
+
+    @property
+    def queue(self) -> "asyncio.Queue[Tuple[str, JobWork, float]]":
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+        return self._queue
+
+    def submit(self, job_id: str, work: JobWork) -> None:
+        """Queue work for a job; raises asyncio.QueueFull when the queue is full"""
+        try:
+            self.queue.put_nowait((job_id, work, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self) -> None:
+        while True:
+            job_id, work, queued_at = await self.queue.get()
+            started = time.perf_counter()
+            self.total_queue_wait += started - queued_at
+            self.started += 1
+            self.busy += 1
+            job_store.update(job_id, RUNNING)
+            try:
+                job_store.complete(job_id, await work())
+            except asyncio.CancelledError:
+                job_store.fail(job_id, "Service shutting down")
+                raise
+            except Exception as e:
+                job_store.fail(job_id, str(getattr(e, "detail", e)), statusCode=getattr(e, "status_code", 500))
+            finally:
+                self.busy -= 1
+                self.processed += 1
+                self.total_run_time += time.perf_counter() - started
+                self.queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "busy": self.busy,
+            "queued": self.queue.qsize(),
+            "max_queue": self.max_queue,
+            "processed": self.processed,
+            "rejected": self.rejected,
+            "avg_queue_wait_seconds": round(self.total_queue_wait / self.started, 3) if self.started else 0.0,
+            "avg_run_seconds": round(self.total_run_time / self.processed, 3) if self.processed else 0.0
+        }
+
+job_workers = JobWorkerPool.from_env()
@@ -0,0 +1,163 @@
+import json
+from typing import Any, List, Optional, Set, Tuple
+
+# Event kinds emitted by IncrementalJSONFieldParser.feed
+FIELD = "field"      # (FIELD, name, value): a top-level field was closed
+PARTIAL = "partial"  # (PARTIAL, name, text): more characters of a streamed string field
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_WHITESPACE = " \t\r\n"
+
+class IncrementalJSONFieldParser:
+    """Incremental parser for the model's final JSON answer.
+
+    Feed it text chunks as they stream in; it emits each top-level field of the
+    object as soon as its value is closed, and for the string fields listed in
+    `partial_fields` (by default "body") also emits the decoded text as it grows.
+    Anything before the opening brace (e.g. a ```json fence) is ignored.
+
+        parser = IncrementalJSONFieldParser()
+        for kind, name, value in parser.feed('{"language": "pt-PT", "body": "Ol'):
+            ...  # (FIELD, "language", "pt-PT"), (PARTIAL, "body", "Ol")
+    """
+
+    def __init__(self, partial_fields: Optional[Set[str]] = None):
+        self.partial_fields = {"body"} if partial_fields is None else set(partial_fields)
+        self.fields: dict = {}
+        self.done = False
+        self._state = "start"
+        self._key: List[str] = []
+        self._current_key: Optional[str] = None
+        self._string: List[str] = []
+        self._escape: Optional[str] = None  # pending escape sequence, without the backslash
+        self._high_surrogate: Optional[int] = None
+        self._raw: List[str] = []
+        self._depth = 0
+        self._raw_in_string = False
+        self._raw_escaped = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, str, Any]]:
+        """Consume a chunk of text, returning the events it completed"""
+        events: List[Tuple[str, str, Any]] = []
+        partial: List[str] = []
+        for char in chunk:
+            if self.done:
+                break
+            state = self._state
+            if state == "start":
+                if char == "{":
+                    self._state = "key_or_end"
+            elif state in ("key_or_end", "key"):
+                if char == '"':
+                    self._key = []
+                    self._state = "in_key"
+                elif char == "}" and state == "key_or_end":
+                    self.done = True
+            elif state == "in_key":
+                if self._escape is not None or char == "\\":
+                    decoded = self._decode_escape(char)
+                    if decoded:
+                        self._key.append(decoded)
+                elif char == '"':
+                    self._current_key = "".join(self._key)
+                    self._state = "colon"
+                else:
+                    self._key.append(char)
+            elif state == "colon":
+                if char == ":":
+                    self._state = "value"
+            elif state == "value":
+                if char in _WHITESPACE:
+                    continue
+                if char == '"':
+                    self._string = []
+                    self._state = "in_string"
+                else:
+                    self._raw = [char]
+                    self._depth = 1 if char in "[{" else 0
+                    self._raw_in_string = False
+                    self._raw_escaped = False
+                    self._state = "in_raw"
+            elif state == "in_string":
+                if self._escape is not None or char == "\\":
+                    decoded = self._decode_escape(char)
+                    if decoded:
+                        self._string.append(decoded)
+                        partial.append(decoded)
+                elif char == '"':
+                    self._flush_partial(partial, events)
+                    self._close_field("".join(self._string), events)
+                else:
+                    self._string.append(char)
+                    partial.append(char)
+            elif state == "in_raw":
+                if self._depth == 0 and not self._raw_in_string and char in ",}":
+                    try:
+                        value = json.loads("".join(self._raw).strip())
+                    except json.JSONDecodeError:
+                        value = "".join(self._raw).strip()
+                    self._close_field(value, events)
+                    if char == "}":
+                        self.done = True
+                    else:
+                        self._state = "key"
+                    continue
+                self._raw.append(char)
+                if self._raw_in_string:
+                    if self._raw_escaped:
+                        self._raw_escaped = False
+                    elif char == "\\":
+                        self._raw_escaped = True
+                    elif char == '"':
+                        self._raw_in_string = False
+                elif char == '"':
+                    self._raw_in_string = True
+                elif char in "[{":
+                    self._depth += 1
+                elif char in "]}":
+                    self._depth -= 1
+            elif state == "after_value":
+                if char == ",":
+                    self._state = "key"
+                elif char == "}":
+                    self.done = True
+        self._flush_partial(partial, events)
+        return events
+
+    def _close_field(self, value: Any, events: List[Tuple[str, str, Any]]) -> None:
+        self.fields[self._current_key] = value
+        events.append((FIELD, self._current_key, value))
+        self._state = "after_value"
+
+    def _flush_partial(self, partial: List[str], events: List[Tuple[str, str, Any]]) -> None:
+        if partial and self._current_key in self.partial_fields:
+            events.append((PARTIAL, self._current_key, "".join(partial)))
+        partial.clear()
+
+    def _decode_escape(self, char: str) -> str:
+        """Advance a backslash escape by one character, returning decoded text once complete"""
+        if self._escape is None:
+            self._escape = ""
+            return ""
+        self._escape += char
+        if self._escape[0] != "u":
+            self._escape = None
+            return _ESCAPES.get(char, char)
+        if len(self._escape) < 5:
+            return ""
+        try:
+            code = int(self._escape[1:], 16)
+        except ValueError:
+            code = None
+        if code is None:
+            text, self._escape = "\\" + self._escape, None
+            return text
+        self._escape = None
+        # Surrogate pairs arrive as two \u escapes; hold the first half back
+        if 0xD800 <= code <= 0xDBFF:
+            self._high_surrogate = code
+            return ""
+        if 0xDC00 <= code <= 0xDFFF and self._high_surrogate is not None:
+            code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self._high_surrogate = None
+        return chr(code)
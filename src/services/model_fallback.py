@@ -0,0 +1,156 @@
+import os
+import json
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Any, Awaitable, Callable, Iterator, List, Optional, TypeVar
+
+from src.services.circuit_breaker import CircuitOpenError, is_upstream_failure
+from src.services.hedging import LatencyWindow
+from src.services.retry_policy import RetryBudget, error_reason
+
+T = TypeVar("T")
+
+def is_fallback_trigger(error: BaseException) -> bool:
+    """Errors another model may not have: open circuit, timeouts, connection errors, 429/5xx"""
+    if isinstance(error, CircuitOpenError):
+        return True
+    if "insufficient_quota" in str(error):
+        # The account is out of credit for every model
+        return False
+    return is_upstream_failure(error)
+
+def fallback_reason(error: BaseException) -> str:
+    return "circuit_open" if isinstance(error, CircuitOpenError) else error_reason(error)
+
+def format_hops(hops: List[Dict[str, Any]]) -> str:
+    """Hops of a ModelTrail report as an X-Model-Fallbacks header: from>to:reason:seconds, ..."""
+    return ",".join(f"{hop['from']}>{hop['to']}:{hop['reason']}:{hop['seconds']:.3f}s" for hop in hops)
+
+@dataclass
+class FallbackHop:
+    """One move down the chain: the model given up on, why, and the seconds spent on it"""
+    from_model: str
+    to_model: str
+    reason: str
+    seconds: float
+
+@dataclass
+class ModelTrail:
+    """Models of one request: the one serving it now, the ones left to try, and the hops made"""
+    model: str
+    remaining: List[str]
+    hops: List[FallbackHop] = field(default_factory=list)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "served_by": self.model,
+            "hops": [
+                {"from": hop.from_model, "to": hop.to_model, "reason": hop.reason, "seconds": round(hop.seconds, 3)}
+                for hop in self.hops
+            ],
+            "fallback_seconds": round(sum(hop.seconds for hop in self.hops), 3)
+        }
+
+class ModelFallbacks:
+    """Ordered per-domain model fallback chains.
+
+    A chain such as ["o4-mini", "gpt-4.1-mini", "gpt-4o-mini"] lists models
+    from preferred to last resort. A request routed to a model in the chain
+    may fall back to the models after it; one routed to a model outside it
+    may fall back to the whole chain. A model is given up on when its calls
+    fail with a fallback trigger (see is_fallback_trigger) after their
+    retries, and each model but the last gets an equal share of the time
+    left before the retry deadline, so that a timeout still leaves time
+    for the next one.
+    """
+
+    def __init__(self, enabled: bool = True, chains: Optional[Dict[str, List[str]]] = None):
+        self.enabled = enabled
+        self.chains = {domain.lower(): list(chain) for domain, chain in (chains or {}).items()}
+        self.served_by: Dict[str, int] = {}
+        self.hops: Dict[str, Dict[str, Any]] = {}
+        self.exhausted = 0
+
+    @classmethod
+    def from_env(cls) -> "ModelFallbacks":
+        return cls(
+            enabled=os.getenv("MODEL_FALLBACK_ENABLED", "true").lower() == "true",
+            chains=json.loads(os.getenv("MODEL_FALLBACK_CHAINS", "{}"))
+        )
+
+    def chain_for(self, domain: Optional[str]) -> List[str]:
+        return self.chains.get((domain or "").lower(), self.chains.get("*", []))
+
+    def trail(self, domain: Optional[str], model: str) -> ModelTrail:
+        """The fallback trail of a request for `domain` routed to `model`"""
+        chain = self.chain_for(domain) if self.enabled else []
+        remaining = chain[chain.index(model) + 1:] if model in chain else [m for m in chain if m != model]
+        return ModelTrail(model, remaining)
+
+    @contextmanager
+    def hop_deadline(self, trail: ModelTrail, retry_budget: RetryBudget) -> Iterator[None]:
+        """Cut the retry window to the current model's share while fallbacks are left"""
+        share = retry_budget.share
+        if trail.remaining:
+            retry_budget.share = share / (len(trail.remaining) + 1)
+        try:
+            yield
+        finally:
+            retry_budget.share = share
+
+    def fall_back(self, trail: ModelTrail, error: BaseException, seconds: float) -> Optional[str]:
+        """Move the trail to its next model after `error`; None when it should be raised instead"""
+        if not is_fallback_trigger(error):
+            return None
+        if not trail.remaining:
+            if trail.hops:
+                self.exhausted += 1
+            return None
+        hop = FallbackHop(trail.model, trail.remaining.pop(0), fallback_reason(error), seconds)
+        trail.hops.append(hop)
+        trail.model = hop.to_model
+        entry = self.hops.setdefault(
+            f"{hop.from_model}->{hop.to_model}", {"count": 0, "reasons": {}, "added": LatencyWindow()}
+        )
+        entry["count"] += 1
+        entry["reasons"][hop.reason] = entry["reasons"].get(hop.reason, 0) + 1
+        entry["added"].record(seconds)
+        print(f"Model {hop.from_model} failed ({hop.reason}) after {seconds:.2f}s, falling back to {hop.to_model}")
+        return hop.to_model
+
+    def record(self, trail: ModelTrail) -> None:
+        """Count the model that finally served a request"""
+        self.served_by[trail.model] = self.served_by.get(trail.model, 0) + 1
+
+    async def run(
+        self, trail: ModelTrail, retry_budget: RetryBudget, call: Callable[[str], Awaitable[T]]
+    ) -> T:
+        """Await call(model) for the trail's model, falling back down the chain"""
+        while True:
+            started = time.perf_counter()
+            try:
+                with self.hop_deadline(trail, retry_budget):
+                    return await call(trail.model)
+            except Exception as e:
+                if self.fall_back(trail, e, time.perf_counter() - started) is None:
+                    raise
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "chains": self.chains,
+            "served_by": dict(self.served_by),
+            "chains_exhausted": self.exhausted,
+            "hops": {
+                name: {
+                    "count": entry["count"],
+                    "reasons": dict(entry["reasons"]),
+                    "added_p50": round(entry["added"].percentile(0.5), 3),
+                    "added_p95": round(entry["added"].percentile(0.95), 3)
+                }
+                for name, entry in self.hops.items()
+            }
+        }
+
+model_fallbacks = ModelFallbacks.from_env()
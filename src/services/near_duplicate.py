@@ -0,0 +1,222 @@
+import os
+import re
+import time
+import random
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(\.[\w-]+)+")
+_URL_RE = re.compile(r"https?://\S+")
+_NUMBER_RE = re.compile(r"\+?\d[\d\s./-]{2,}\d|\d+")
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+# Phone, customer, contract and invoice numbers (five digits or more)
+_ID_NUMBER_RE = re.compile(r"\+?\d(?:[\d\s./-]{3,}\d)")
+# Name after the salutation of a reply ("Caro Sr. João Silva,")
+_SALUTATION_NAME_RE = re.compile(
+    r"^(\s*(?:car[oa]s?|exm[oa]s?\.?|prezad[oa]s?|dear|ol[aá])\s+(?:(?:sr|sra|dr|dra)\.?\s+|senhor(?:a)?\s+)?)"
+    r"[^\n,]{1,60},",
+    re.I | re.M
+)
+
+def normalize_for_similarity(text: str) -> List[str]:
+    """Tokens of an email body with markup, addresses and numbers masked.
+
+    Form submissions differ mostly in names, e-mail addresses, phone and
+    customer numbers; masking the latter keeps those emails close together.
+    """
+    text = _TAG_RE.sub(" ", text or "")
+    text = _EMAIL_RE.sub(" EMAIL ", text)
+    text = _URL_RE.sub(" URL ", text)
+    text = _NUMBER_RE.sub(" NUM ", text)
+    return _TOKEN_RE.findall(text.lower())
+
+def shingles(tokens: List[str], size: int = 3) -> set:
+    """Word n-grams of the token stream"""
+    if len(tokens) <= size:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+def redact_customer_details(text: str) -> str:
+    """A reply with the customer's name, addresses and numbers masked, so it can
+    serve as a skeleton for another customer's email"""
+    text = _EMAIL_RE.sub("[email]", text or "")
+    text = _URL_RE.sub("[link]", text)
+    text = _ID_NUMBER_RE.sub(lambda match: "[número]" if sum(c.isdigit() for c in match.group()) >= 5 else match.group(), text)
+    return _SALUTATION_NAME_RE.sub(r"\1[nome],", text)
+
+class MinHasher:
+    """MinHash signatures with universal hashing (a * x + b mod p)"""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.permutations = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, shingle_set: set) -> Tuple[int, ...]:
+        if not shingle_set:
+            return tuple([_MAX_HASH] * self.num_perm)
+        hashes = [
+            int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little")
+            for shingle in shingle_set
+        ]
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self.permutations
+        )
+
+def estimated_similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures"""
+    return sum(1 for a, b in zip(first, second) if a == b) / len(first)
+
+@dataclass
+class NearDuplicateEntry:
+    """A previously answered email and what was learned while answering it"""
+    key: str
+    scope: str
+    signature: Tuple[int, ...]
+    tool_results: Dict[str, str] = field(default_factory=dict)
+    final_response: Optional[Dict[str, Any]] = None
+    created_at: float = field(default_factory=time.time)
+
+@dataclass
+class NearDuplicateMatch:
+    entry: NearDuplicateEntry
+    similarity: float
+
+class NearDuplicateIndex:
+    """MinHash LSH index of answered emails, partitioned by scope (domain and mailbox).
+
+    Signatures are split into `bands` bands of `rows` rows; emails sharing any
+    band bucket are candidates, and candidates whose estimated similarity is at
+    least `threshold` are returned as near duplicates.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        num_perm: int = 64,
+        bands: int = 16,
+        max_entries_per_scope: int = 5000,
+        enabled: bool = True
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries_per_scope = max_entries_per_scope
+        self.enabled = enabled
+        self.hasher = MinHasher(num_perm)
+        self._entries: Dict[str, "OrderedDict[str, NearDuplicateEntry]"] = {}
+        self._buckets: Dict[str, Dict[Tuple[int, Tuple[int, ...]], set]] = {}
+        self.lookups = 0
+        self.matches = 0
+        self.tool_results_reused = 0
+        self.total_lookup_seconds = 0.0
+
+    @classmethod
+    def from_env(cls) -> "NearDuplicateIndex":
+        return cls(
+            threshold=float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.8")),
+            max_entries_per_scope=int(os.getenv("NEAR_DUPLICATE_MAX_ENTRIES", "5000")),
+            enabled=os.getenv("NEAR_DUPLICATE_ENABLED", "true").lower() == "true"
+        )
+
+    def signature(self, text: str) -> Tuple[int, ...]:
+        return self.hasher.signature(shingles(normalize_for_similarity(text)))
+
+    def _band_keys(self, signature: Tuple[int, ...]) -> List[Tuple[int, Tuple[int, ...]]]:
+        return [
+            (band, signature[band * self.rows:(band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+
+    def find(self, scope: str, text: str) -> Optional[NearDuplicateMatch]:
+        """Most similar previously answered email of the scope above the threshold"""
+        if not self.enabled:
+            return None
+        start = time.perf_counter()
+        self.lookups += 1
+        signature = self.signature(text)
+        entries = self._entries.get(scope, {})
+        buckets = self._buckets.get(scope, {})
+        candidates = set()
+        for band_key in self._band_keys(signature):
+            candidates.update(buckets.get(band_key, ()))
+        best: Optional[NearDuplicateMatch] = None
+        for key in candidates:
+            entry = entries[key]
+            similarity = estimated_similarity(signature, entry.signature)
+            if similarity >= self.threshold and (best is None or similarity > best.similarity):
+                best = NearDuplicateMatch(entry, similarity)
+        self.total_lookup_seconds += time.perf_counter() - start
+        if best:
+            self.matches += 1
+            entries.move_to_end(best.entry.key)
+        return best
+
+    def add(
+        self,
+        scope: str,
+        key: str,
+        text: str,
+        tool_results: Optional[Dict[str, str]] = None,
+        final_response: Optional[Dict[str, Any]] = None
+    ) -> NearDuplicateEntry:
+        """Index an answered email together with its cacheable tool results and final answer"""
+        entries = self._entries.setdefault(scope, OrderedDict())
+        buckets = self._buckets.setdefault(scope, {})
+        if key in entries:
+            self._remove(scope, key)
+        entry = NearDuplicateEntry(
+            key=key,
+            scope=scope,
+            signature=self.signature(text),
+            tool_results=dict(tool_results or {}),
+            final_response=final_response
+        )
+        entries[key] = entry
+        for band_key in self._band_keys(entry.signature):
+            buckets.setdefault(band_key, set()).add(key)
+        while len(entries) > self.max_entries_per_scope:
+            self._remove(scope, next(iter(entries)))
+        return entry
+
+    def _remove(self, scope: str, key: str) -> None:
+        entry = self._entries[scope].pop(key)
+        buckets = self._buckets[scope]
+        for band_key in self._band_keys(entry.signature):
+            bucket = buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del buckets[band_key]
+
+    def record_reuse(self) -> None:
+        self.tool_results_reused += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "entries": {scope: len(entries) for scope, entries in self._entries.items()},
+            "lookups": self.lookups,
+            "matches": self.matches,
+            "tool_results_reused": self.tool_results_reused,
+            "avg_lookup_ms": round(self.total_lookup_seconds / self.lookups * 1000, 3) if self.lookups else 0.0
+        }
+
+def tool_call_signature(name: str, arguments: Optional[str]) -> str:
+    """Key identifying a tool call by name and (whitespace-normalized) arguments"""
+    return f"{name}:{' '.join((arguments or '').split()).lower()}"
+
+near_duplicate_index = NearDuplicateIndex.from_env()
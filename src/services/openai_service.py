@@ -1,52 +1,90 @@
 import os
 import json
-from typing import List, Dict, Any, Optional
-from tenacity import retry, stop_after_attempt, wait_exponential
-from openai import OpenAI
+import time
+from typing import List, Dict, Any, Optional, AsyncIterator, Awaitable, Callable
+from openai import AsyncOpenAI
 from src.models.request_models import OpenAIRequest, OpenAIResponse
-from src.config import tools, default_persona
-from datetime import datetime
+from src.config import tools
+from src.settings import settings
+from src.services.http_clients import http_clients
+from src.services.prompt_assembly import prompt_assembler, prompt_cache_stats
+from src.services.email_classifier import ModelRoute, is_reasoning_model
+from src.services.token_budget import estimate_request_tokens
+from src.services.rate_governor import rate_governor
+from src.services.retry_policy import openai_retry_policy, RetryBudget
+from src.services.hedging import request_hedger
+from src.services.service_tiers import service_tiers, ServiceLevel, supports_flex
+from src.services.circuit_breaker import circuit_breakers
+
+# Process-wide async client shared by every service instance. It is created
+# lazily on first use and closed by the FastAPI lifespan on shutdown, so all
+# concurrent requests on a worker share one connection pool.
+_shared_client: Optional[AsyncOpenAI] = None
+
+def get_openai_client() -> AsyncOpenAI:
+    """Return the shared AsyncOpenAI client, creating it on first use"""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            base_url=os.getenv("OPENAI_BASE_URL") or None,
+            timeout=http_clients.config("openai").timeout,
+            # Retries are done by openai_retry_policy, within each request's deadline
+            max_retries=0,
+            http_client=http_clients.get("openai")
+        )
+    return _shared_client
+
+async def close_openai_client() -> None:
+    """Close the shared AsyncOpenAI client (called on application shutdown)"""
+    global _shared_client
+    if _shared_client is not None:
+        await _shared_client.close()
+        _shared_client = None
 
 class OpenAIService:
     def __init__(self):
-        self.api_key = os.getenv("OPENAI_API_KEY")
+        self.api_key = os.getenv("OPENAI_API_KEY", settings.openai_api_key)
+        self.base_url = (os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1").rstrip("/")
         self.default_model = os.getenv("DEFAULT_AI_MODEL", "gpt-4o-mini")
         self.reasoning_level = os.getenv("REASONING_LEVEL", "medium")
         self.output_format = os.getenv("OUTPUT_FORMAT", "json")
+    
+    @property
+    def client(self) -> AsyncOpenAI:
+        """Shared non-blocking OpenAI client"""
+        return get_openai_client()
         
-        # Initialize OpenAI client
-        self.client = OpenAI(api_key=self.api_key)
-        
-    @retry(
-        stop=stop_after_attempt(5),
-        wait=wait_exponential(multiplier=1, min=5, max=60)
-    )
-    async def call_openai_responses(
-        self, 
-        messages: List[Dict[str, Any]], 
+    def build_request_body(
+        self,
+        messages: List[Dict[str, Any]],
         tools: List[Dict[str, Any]],
         previous_response_id: Optional[str] = None,
-        instructions: Optional[str] = None
+        instructions: Optional[str] = None,
+        stream: bool = False,
+        prompt_cache_key: Optional[str] = None,
+        route: Optional[ModelRoute] = None
     ) -> Dict[str, Any]:
-        """Call OpenAI's new /v1/responses endpoint"""
+        """Build the /v1/responses request body"""
         
-        # Prepare system message with instructions
-        system_instructions = instructions or default_persona.format(
-            current_date=datetime.now().strftime("%Y-%m-%d")
-        )
+        # Prepare system message with instructions (static, so it stays cacheable)
+        system_instructions = instructions or prompt_assembler.prefix().instructions
+        
+        # Per-email model settings chosen by the pre-classifier
+        model = route.model if route else self.default_model
         
         # Prepare request body matching Power Automate flow
         request_body = {
-            "model": self.default_model,
-            "max_output_tokens": 4096,
-            "temperature": None if self.default_model.startswith("o") else 0,
+            "model": model,
+            "max_output_tokens": route.max_output_tokens if route else 4096,
+            **self.model_settings(model),
             "tool_choice": "auto",
-            "service_tier": "flex" if self.default_model.startswith("o") else "auto",
-            "stream": False,
+            "stream": stream,
             "reasoning": {
-                "effort": self.reasoning_level
+                "effort": route.reasoning_effort if route else self.reasoning_level
             },
             "previous_response_id": previous_response_id,
+            "prompt_cache_key": prompt_cache_key,
             "parallel_tool_calls": True,
             "instructions": system_instructions,
             "input": messages,
@@ -57,48 +95,198 @@ class OpenAIService:
         }
         
         # Remove None values to match Power Automate flow behavior
-        request_body = {k: v for k, v in request_body.items() if v is not None}
+        return {k: v for k, v in request_body.items() if v is not None}
+    
+    @staticmethod
+    def model_settings(model: str) -> Dict[str, Any]:
+        """Request fields that depend on the model (None = omitted)"""
+        return {
+            "temperature": None if is_reasoning_model(model) else 0,
+            "service_tier": "flex" if supports_flex(model) else "auto"
+        }
+    
+    def hedge_request_body(self, request_body: Dict[str, Any]) -> Dict[str, Any]:
+        """The duplicate of a call sent when it runs past its hedge delay"""
+        body = dict(request_body)
+        if request_hedger.model:
+            body["model"] = request_hedger.model
+            body.update(self.model_settings(request_hedger.model))
+        if request_hedger.service_tier:
+            body["service_tier"] = request_hedger.service_tier
+        return {k: v for k, v in body.items() if v is not None}
+
+    async def call_openai_responses(
+        self, 
+        messages: List[Dict[str, Any]], 
+        tools: List[Dict[str, Any]],
+        previous_response_id: Optional[str] = None,
+        instructions: Optional[str] = None,
+        prompt_cache_key: Optional[str] = None,
+        route: Optional[ModelRoute] = None,
+        retry_budget: Optional[RetryBudget] = None,
+        service_level: Optional[ServiceLevel] = None
+    ) -> Dict[str, Any]:
+        """Call OpenAI's new /v1/responses endpoint.
+
+        Transient failures are retried by openai_retry_policy within
+        retry_budget, which also collects the attempts made for the request.
+        The service tier is chosen from service_level (see service_tiers),
+        and a call running past the tail latency of its model, effort and
+        tier may be hedged with a duplicate (see request_hedger).
+        """
+        request_body = self.build_request_body(
+            messages, tools, previous_response_id, instructions,
+            prompt_cache_key=prompt_cache_key, route=route
+        )
+        retry_budget = retry_budget or openai_retry_policy.budget()
+        
+        def send(body: Dict[str, Any]) -> Callable[[], Awaitable[Dict[str, Any]]]:
+            return lambda: self._send(body, retry_budget)
         
+        def send_at(tier: Optional[str]) -> Awaitable[Dict[str, Any]]:
+            body = dict(request_body, service_tier=tier) if tier else request_body
+            return request_hedger.run(
+                f"{body['model']}/{body.get('reasoning', {}).get('effort')}/{body.get('service_tier')}",
+                send(body),
+                send(self.hedge_request_body(body))
+            )
+        
+        start = time.perf_counter()
+        result = await service_tiers.run(request_body["model"], service_level, send_at)
+        self.record_usage(result, time.perf_counter() - start)
+        return result
+    
+    @staticmethod
+    def estimate_call_tokens(request_body: Dict[str, Any]) -> int:
+        """Tokens a call counts against TPM before it runs: input estimate plus max output"""
+        input_items = request_body.get("input") or []
+        if not isinstance(input_items, list):
+            input_items = [{"content": input_items}]
+        return estimate_request_tokens(
+            request_body.get("instructions"), request_body.get("tools"), input_items
+        ) + request_body.get("max_output_tokens", 4096)
+    
+    def record_usage(self, response: Dict[str, Any], latency: float) -> None:
+        """Track prompt-cache effectiveness from the response usage block"""
+        usage = response.get("usage") or {}
+        cached = prompt_cache_stats.record(usage, latency)
+        print(f"Prompt cache: {cached}/{usage.get('input_tokens', 0)} input tokens cached ({latency:.2f}s)")
+    
+    def attempt_timeout(self, retry_budget: RetryBudget) -> float:
+        return openai_retry_policy.attempt_timeout(retry_budget, http_clients.config("openai").read_timeout)
+    
+    async def _send(self, request_body: Dict[str, Any], retry_budget: RetryBudget) -> Dict[str, Any]:
+        """One call, retried by openai_retry_policy within retry_budget.
+
+        The model's circuit records the outcome once retries are over, so
+        transient errors a retry recovers from do not count against it; a
+        half-open trial call is made once, without retries.
+        """
+        attempt = lambda: self._create_response(request_body, retry_budget)
+        async with circuit_breakers.get(f"openai/{request_body['model']}").guard() as trial:
+            return await (attempt() if trial else openai_retry_policy.run(attempt, retry_budget))
+    
+    async def _create_response(self, request_body: Dict[str, Any], retry_budget: RetryBudget) -> Dict[str, Any]:
+        """One attempt; TPM/RPM capacity is held for it and settled from its headers.
+        Fails fast with CircuitOpenError while the model's circuit is open."""
+        circuit_breakers.get(f"openai/{request_body['model']}").raise_if_open()
+        async with rate_governor.reserve(
+            self.client.api_key, request_body["model"], self.estimate_call_tokens(request_body)
+        ) as reservation:
+            raw = await self.client.responses.with_raw_response.create(
+                **request_body, timeout=self.attempt_timeout(retry_budget)
+            )
+            reservation.headers = raw.headers
+            result = raw.parse().model_dump()
+            reservation.used_tokens = (result.get("usage") or {}).get("total_tokens")
+            return result
+    
+    async def stream_openai_responses(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: List[Dict[str, Any]],
+        previous_response_id: Optional[str] = None,
+        instructions: Optional[str] = None,
+        prompt_cache_key: Optional[str] = None,
+        route: Optional[ModelRoute] = None,
+        retry_budget: Optional[RetryBudget] = None,
+        service_level: Optional[ServiceLevel] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Call /v1/responses with stream=True, yielding each server event as a dict.
+
+        The last event of a successful stream is "response.completed", whose
+        "response" field has the same shape as call_openai_responses' result.
+        Only opening the stream is retried; events already yielded cannot be
+        taken back, so a stream failing midway raises. The service tier is
+        chosen from service_level, without the flex fallback.
+        """
+        request_body = self.build_request_body(
+            messages, tools, previous_response_id, instructions, stream=True,
+            prompt_cache_key=prompt_cache_key, route=route
+        )
+        if service_tiers.enabled and service_level is not None:
+            request_body["service_tier"] = service_tiers.choose(request_body["model"], service_level)
+        retry_budget = retry_budget or openai_retry_policy.budget()
+        start = time.perf_counter()
+        
+        breaker = circuit_breakers.get(f"openai/{request_body['model']}")
+        
+        async def open_stream() -> Any:
+            breaker.raise_if_open()
+            reservation = await rate_governor.acquire(
+                self.client.api_key, request_body["model"], self.estimate_call_tokens(request_body)
+            )
+            try:
+                raw = await self.client.responses.with_raw_response.create(
+                    **request_body, timeout=self.attempt_timeout(retry_budget)
+                )
+            except Exception as e:
+                rate_governor.release(reservation, e)
+                raise
+            reservation.headers = raw.headers
+            return reservation, raw.parse()
+        
+        # The circuit records whether the stream could be opened, after retries
+        async with breaker.guard() as trial:
+            reservation, stream = await (open_stream() if trial else openai_retry_policy.run(open_stream, retry_budget))
+        error = None
         try:
-            # Use the OpenAI client's responses API if available
-            if hasattr(self.client, 'responses'):
-                response = self.client.responses.create(**request_body)
-                return response.model_dump()
-            else:
-                raise AttributeError("Responses API not available in OpenAI client")
+            async for event in stream:
+                event = event.model_dump()
+                if event.get("type") == "response.completed":
+                    usage = (event.get("response") or {}).get("usage") or {}
+                    reservation.used_tokens = usage.get("total_tokens")
+                    self.record_usage(event.get("response") or {}, time.perf_counter() - start)
+                yield event
         except Exception as e:
-            # Fallback to direct HTTP call for compatibility
-            import httpx
-            
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-                "Accept-Encoding": "gzip"
-            }
-            
-            async with httpx.AsyncClient(timeout=300.0) as client:
-                response = await client.post(
-                    "https://api.openai.com/v1/responses",
-                    headers=headers,
-                    json=request_body
-                )
-                response.raise_for_status()
-                return response.json()
+            error = e
+            raise
+        finally:
+            rate_governor.release(reservation, error)
+            # Stopped early (the client went away): drop the HTTP response too
+            await stream.close()
     
     async def upload_file(self, file_content: bytes, filename: str) -> str:
-        """Upload a file to OpenAI for analysis"""
-        try:
-            # Use the OpenAI client to upload file
-            if hasattr(self.client.files, 'create'):
-                response = self.client.files.create(
-                    file=(filename, file_content),
-                    purpose="assistants"
-                )
-                return response.id
-            else:
-                raise AttributeError("Files API not available")
-        except Exception as e:
-            raise Exception(f"Failed to upload file: {str(e)}")
+        """Upload a file to OpenAI for analysis.
+
+        Retried by openai_retry_policy; the "openai/files" circuit records the
+        outcome and fails fast with CircuitOpenError while open. Uploads do
+        not count against a model's TPM/RPM, so they are not governed.
+        """
+        breaker = circuit_breakers.get("openai/files")
+        retry_budget = openai_retry_policy.budget()
+        
+        async def attempt() -> str:
+            breaker.raise_if_open()
+            response = await self.client.files.create(
+                file=(filename, file_content),
+                purpose="assistants",
+                timeout=self.attempt_timeout(retry_budget)
+            )
+            return response.id
+        
+        async with breaker.guard() as trial:
+            return await (attempt() if trial else openai_retry_policy.run(attempt, retry_budget))
     
     async def analyze_document(
         self, 
@@ -106,7 +294,8 @@ class OpenAIService:
         prompt: str, 
         system_prompt: Optional[str] = None
     ) -> Dict[str, Any]:
-        """Analyze a document using OpenAI Responses API"""
+        """Analyze a document using OpenAI Responses API, through the model's
+        circuit breaker, the TPM/RPM governor and openai_retry_policy"""
         
         # Prepare input with file reference
         input_messages = [
@@ -133,27 +322,4 @@ class OpenAIService:
             "instructions": system_prompt or "You are a helpful assistant that analyzes documents.",
             "input": input_messages
         }
-        
-        try:
-            if hasattr(self.client, 'responses'):
-                response = self.client.responses.create(**request_body)
-                return response.model_dump()
-            else:
-                raise AttributeError("Responses API not available")
-        except Exception as e:
-            # Fallback to HTTP call if needed
-            import httpx
-            
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            async with httpx.AsyncClient(timeout=300.0) as client:
-                response = await client.post(
-                    "https://api.openai.com/v1/responses",
-                    headers=headers,
-                    json=request_body
-                )
-                response.raise_for_status()
-                return response.json()
+        return await self._send(request_body, openai_retry_policy.budget())
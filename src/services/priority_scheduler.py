@@ -0,0 +1,382 @@
+import os
+import json
+import time
+import heapq
+import asyncio
+import itertools
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from typing import Dict, Any, AsyncIterator, List, Optional
+
+HIGH = "high"
+NORMAL = "normal"
+LOW = "low"
+PRIORITY_RANKS = {HIGH: 0, NORMAL: 1, LOW: 2}
+
+# Seconds after receipt by which an answer should be started, per class
+DEFAULT_DEADLINES = {HIGH: 60.0, NORMAL: 300.0, LOW: 3600.0}
+
+# Key of the quota applied to domains without one of their own
+DEFAULT_DOMAIN = "*"
+
+def priority_class(importance: Optional[str]) -> str:
+    """Priority class of an email from its Outlook importance (low/normal/high)"""
+    importance = (importance or "").strip().lower()
+    return importance if importance in PRIORITY_RANKS else NORMAL
+
+def parse_received(received_date_time: Optional[str]) -> Optional[float]:
+    """Epoch seconds of a Graph receivedDateTime ("2025-07-02T10:15:00Z"), if parseable"""
+    if not received_date_time:
+        return None
+    try:
+        return datetime.fromisoformat(received_date_time.strip().replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+def percentile(values: deque, fraction: float) -> float:
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))], 3) if ordered else 0.0
+
+@dataclass(frozen=True)
+class Ticket:
+    """Where an email's OpenAI calls stand in the queue"""
+    priority: str
+    deadline: float
+    domain: str = ""
+    tokens: int = 0
+
+@dataclass
+class DomainQuota:
+    """Fair share and limits of one tenant domain (None = unlimited)"""
+    weight: float = 1.0
+    max_concurrency: Optional[int] = None
+    tokens_per_minute: Optional[int] = None
+
+@dataclass
+class Lease:
+    """A granted call slot; set used_tokens once the call reports its usage"""
+    ticket: Ticket
+    used_tokens: Optional[int] = None
+
+@dataclass(order=True)
+class _Waiter:
+    deadline: float
+    seq: int
+    ticket: Ticket = field(compare=False)
+    enqueued: float = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    throttled: bool = field(default=False, compare=False)
+
+class ClassStats:
+    """Queue depth and wait times of one priority class"""
+
+    def __init__(self, window: int = 1000):
+        self.dispatched = 0
+        self.max_depth = 0
+        self.promoted = 0
+        self.deadline_misses = 0
+        self.total_wait = 0.0
+        self.waits: deque = deque(maxlen=window)
+
+    def record(self, wait: float, missed_deadline: bool, promoted: bool) -> None:
+        self.dispatched += 1
+        self.total_wait += wait
+        self.waits.append(wait)
+        self.deadline_misses += missed_deadline
+        self.promoted += promoted
+
+    def stats(self, depth: int) -> Dict[str, Any]:
+        return {
+            "depth": depth,
+            "max_depth": self.max_depth,
+            "dispatched": self.dispatched,
+            "avg_wait_seconds": round(self.total_wait / self.dispatched, 3) if self.dispatched else 0.0,
+            "p95_wait_seconds": percentile(self.waits, 0.95),
+            "promoted_by_aging": self.promoted,
+            "deadline_misses": self.deadline_misses
+        }
+
+class DomainState:
+    """Quota, token bucket, fair-queuing tag and metrics of one domain"""
+
+    def __init__(self, quota: DomainQuota, window: int = 1000):
+        self.quota = quota
+        self.active = 0
+        self.virtual_finish = 0.0
+        self.tokens = float(quota.tokens_per_minute or 0)
+        self.refilled = time.monotonic()
+        self.dispatched = 0
+        self.throttled = 0
+        self.tokens_used = 0
+        self.waits: deque = deque(maxlen=window)
+        self.latencies: deque = deque(maxlen=window)
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        if self.quota.tokens_per_minute:
+            self.tokens = min(
+                float(self.quota.tokens_per_minute),
+                self.tokens + (now - self.refilled) * self.quota.tokens_per_minute / 60.0
+            )
+        self.refilled = now
+
+    def token_wait(self, tokens: int) -> float:
+        """Seconds until the bucket can cover a call of `tokens` (0 if it can now)"""
+        if not self.quota.tokens_per_minute:
+            return 0.0
+        self.refill()
+        needed = min(tokens, self.quota.tokens_per_minute) - self.tokens
+        return max(0.0, needed * 60.0 / self.quota.tokens_per_minute)
+
+    def has_capacity(self) -> bool:
+        return self.quota.max_concurrency is None or self.active < self.quota.max_concurrency
+
+    def stats(self, depth: int) -> Dict[str, Any]:
+        return {
+            **asdict(self.quota),
+            "active": self.active,
+            "depth": depth,
+            "dispatched": self.dispatched,
+            "throttled": self.throttled,
+            "tokens_used": self.tokens_used,
+            "tokens_available": round(self.tokens) if self.quota.tokens_per_minute else None,
+            "p50_wait_seconds": percentile(self.waits, 0.5),
+            "p95_wait_seconds": percentile(self.waits, 0.95),
+            "p50_latency_seconds": percentile(self.latencies, 0.5),
+            "p95_latency_seconds": percentile(self.latencies, 0.95)
+        }
+
+class PriorityScheduler:
+    """Admits OpenAI calls by email priority and tenant share.
+
+    Up to max_concurrency calls run at once. Waiting calls are served by
+    priority class (high, normal, low); a class head that has waited
+    aging_seconds is treated as one class higher (and so on), so
+    low-importance mail is delayed but never starved. Within a class,
+    domains share capacity by weighted fair queuing on estimated tokens,
+    and each domain's calls go earliest-deadline-first (receivedDateTime
+    plus the class deadline). A domain at its max_concurrency or out of
+    tokens_per_minute waits without holding back other domains.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 32,
+        aging_seconds: float = 30.0,
+        deadlines: Optional[Dict[str, float]] = None,
+        quotas: Optional[Dict[str, DomainQuota]] = None,
+        enabled: bool = True
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.aging_seconds = aging_seconds
+        self.deadlines = {**DEFAULT_DEADLINES, **(deadlines or {})}
+        self.quotas: Dict[str, DomainQuota] = {DEFAULT_DOMAIN: DomainQuota(), **(quotas or {})}
+        self.enabled = enabled
+        self.active = 0
+        self.virtual_time = 0.0
+        self._queues: Dict[str, Dict[str, List[_Waiter]]] = {priority: {} for priority in PRIORITY_RANKS}
+        self._domains: Dict[str, DomainState] = {}
+        self._seq = itertools.count()
+        self._stats = {priority: ClassStats() for priority in PRIORITY_RANKS}
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+
+    @classmethod
+    def from_env(cls) -> "PriorityScheduler":
+        return cls(
+            max_concurrency=int(os.getenv("SCHEDULER_MAX_CONCURRENCY", "32")),
+            aging_seconds=float(os.getenv("SCHEDULER_AGING_SECONDS", "30")),
+            deadlines=json.loads(os.getenv("SCHEDULER_DEADLINES", "{}")),
+            quotas={
+                domain.lower(): DomainQuota(**quota)
+                for domain, quota in json.loads(os.getenv("DOMAIN_QUOTAS", "{}")).items()
+            },
+            enabled=os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+        )
+
+    def ticket(
+        self,
+        importance: Optional[str] = None,
+        received_date_time: Optional[str] = None,
+        domain: Optional[str] = None,
+        tokens: int = 0
+    ) -> Ticket:
+        priority = priority_class(importance)
+        received = parse_received(received_date_time) or time.time()
+        return Ticket(priority, received + self.deadlines[priority], (domain or "").lower(), tokens)
+
+    def quota_for(self, domain: str) -> DomainQuota:
+        return self.quotas.get(domain, self.quotas[DEFAULT_DOMAIN])
+
+    def set_quota(self, domain: str, quota: DomainQuota) -> None:
+        """Change a domain's share and limits at runtime ("*" for the default)"""
+        domain = domain.lower()
+        self.quotas[domain] = quota
+        for name, state in self._domains.items():
+            if name == domain or (domain == DEFAULT_DOMAIN and name not in self.quotas):
+                state.refill()
+                state.quota = quota
+                if quota.tokens_per_minute:
+                    state.tokens = min(state.tokens, float(quota.tokens_per_minute))
+        if self._running_loop():
+            self._dispatch()
+
+    def _domain(self, domain: str) -> DomainState:
+        state = self._domains.get(domain)
+        if state is None:
+            state = self._domains[domain] = DomainState(self.quota_for(domain))
+        return state
+
+    @asynccontextmanager
+    async def slot(self, ticket: Optional[Ticket] = None) -> AsyncIterator[Lease]:
+        """Hold one OpenAI call slot for the duration of the block"""
+        lease = Lease(ticket or self.ticket())
+        if not self.enabled:
+            yield lease
+            return
+        await self.acquire(lease.ticket)
+        started = time.perf_counter()
+        try:
+            yield lease
+        finally:
+            self.release(lease, time.perf_counter() - started)
+
+    async def acquire(self, ticket: Ticket) -> None:
+        state = self._domain(ticket.domain)
+        if self.active < self.max_concurrency and not self._queued() \
+                and state.has_capacity() and not state.token_wait(ticket.tokens):
+            self._admit(state, ticket, 0.0, False)
+            return
+        waiter = _Waiter(ticket.deadline, next(self._seq), ticket, time.perf_counter(),
+                         asyncio.get_running_loop().create_future())
+        queue = self._queues[ticket.priority].setdefault(ticket.domain, [])
+        heapq.heappush(queue, waiter)
+        stats = self._stats[ticket.priority]
+        stats.max_depth = max(stats.max_depth, sum(len(queue) for queue in self._queues[ticket.priority].values()))
+        # Queued entries may all be abandoned ones: admit now if a slot is free
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just as the caller gave up: hand the slot on
+                self.release(Lease(ticket), 0.0)
+            else:
+                waiter.future.cancel()
+            raise
+
+    def release(self, lease: Lease, latency: float) -> None:
+        state = self._domain(lease.ticket.domain)
+        self.active -= 1
+        state.active -= 1
+        state.latencies.append(latency)
+        if lease.used_tokens is not None:
+            state.tokens_used += lease.used_tokens
+            if state.quota.tokens_per_minute:
+                # Settle the reservation against what the call actually used
+                state.refill()
+                state.tokens = min(
+                    float(state.quota.tokens_per_minute),
+                    state.tokens + lease.ticket.tokens - lease.used_tokens
+                )
+        self._dispatch()
+
+    def _admit(self, state: DomainState, ticket: Ticket, wait: float, promoted: bool) -> None:
+        self.active += 1
+        state.active += 1
+        state.dispatched += 1
+        state.waits.append(wait)
+        if state.quota.tokens_per_minute:
+            state.tokens -= ticket.tokens
+        start = max(self.virtual_time, state.virtual_finish)
+        state.virtual_finish = start + max(ticket.tokens, 1) / max(state.quota.weight, 0.001)
+        self.virtual_time = start
+        self._stats[ticket.priority].record(wait, time.time() > ticket.deadline, promoted)
+
+    def _dispatch(self) -> None:
+        next_refill = None
+        while self.active < self.max_concurrency:
+            now = time.perf_counter()
+            best, best_key = None, None
+            for priority, queues in self._queues.items():
+                for domain, queue in list(queues.items()):
+                    while queue and queue[0].future.done():
+                        heapq.heappop(queue)
+                    if not queue:
+                        del queues[domain]
+                        continue
+                    head, state = queue[0], self._domain(domain)
+                    if not state.has_capacity():
+                        continue
+                    token_wait = state.token_wait(head.ticket.tokens)
+                    if token_wait:
+                        if not head.throttled:
+                            head.throttled = True
+                            state.throttled += 1
+                        next_refill = token_wait if next_refill is None else min(next_refill, token_wait)
+                        continue
+                    steps = int((now - head.enqueued) / self.aging_seconds) if self.aging_seconds > 0 else 0
+                    finish = max(self.virtual_time, state.virtual_finish) \
+                        + max(head.ticket.tokens, 1) / max(state.quota.weight, 0.001)
+                    key = (max(0, PRIORITY_RANKS[priority] - steps), finish, head.deadline, head.seq)
+                    if best_key is None or key < best_key:
+                        best, best_key = (priority, domain), key
+            if best is None:
+                break
+            priority, domain = best
+            waiter = heapq.heappop(self._queues[priority][domain])
+            self._admit(self._domain(domain), waiter.ticket, now - waiter.enqueued,
+                        best_key[0] < PRIORITY_RANKS[priority])
+            waiter.future.set_result(None)
+        if next_refill is not None and self._wakeup is None:
+            # Only token buckets hold calls back: look again once they refill
+            self._wakeup = asyncio.get_running_loop().call_later(next_refill, self._wake)
+
+    def _wake(self) -> None:
+        self._wakeup = None
+        self._dispatch()
+
+    @staticmethod
+    def _running_loop() -> bool:
+        try:
+            asyncio.get_running_loop()
+            return True
+        except RuntimeError:
+            return False
+
+    def _queued(self) -> bool:
+        return any(queue for queues in self._queues.values() for queue in queues.values())
+
+    def _class_depth(self, priority: str) -> int:
+        return sum(
+            1 for queue in self._queues[priority].values() for waiter in queue if not waiter.future.done()
+        )
+
+    def depth(self) -> int:
+        return sum(self._class_depth(priority) for priority in PRIORITY_RANKS)
+
+    def domain_stats(self) -> Dict[str, Any]:
+        depths: Dict[str, int] = {}
+        for queues in self._queues.values():
+            for domain, queue in queues.items():
+                depths[domain] = depths.get(domain, 0) + sum(1 for waiter in queue if not waiter.future.done())
+        return {
+            domain or "(none)": state.stats(depths.get(domain, 0))
+            for domain, state in sorted(self._domains.items())
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "max_concurrency": self.max_concurrency,
+            "active": self.active,
+            "aging_seconds": self.aging_seconds,
+            "classes": {
+                priority: self._stats[priority].stats(self._class_depth(priority))
+                for priority in PRIORITY_RANKS
+            },
+            "domains": self.domain_stats()
+        }
+
+openai_scheduler = PriorityScheduler.from_env()
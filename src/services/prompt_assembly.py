@@ -0,0 +1,136 @@
+import os
+import json
+from datetime import datetime
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Tuple
+from src.config import default_persona, context_template, domain_instructions
+from src.services.response_cache import content_version
+from src.services.tool_registry import tool_registry
+
+def load_domain_instructions() -> Dict[str, str]:
+    """Per-domain instructions from config plus the optional DOMAIN_INSTRUCTIONS_FILE"""
+    instructions = dict(domain_instructions)
+    path = os.getenv("DOMAIN_INSTRUCTIONS_FILE")
+    if path:
+        try:
+            with open(path, encoding="utf-8") as f:
+                instructions.update(json.load(f))
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Failed to load domain instructions from {path}: {str(e)}")
+    return instructions
+
+def to_responses_tool(tool: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten a Chat Completions tool definition into the Responses API shape"""
+    if "function" not in tool:
+        return tool
+    function = tool["function"]
+    return {
+        "type": "function",
+        "name": function["name"],
+        "description": function.get("description", ""),
+        "parameters": function.get("parameters", {})
+    }
+
+@dataclass(frozen=True)
+class PromptPrefix:
+    """The static, cacheable part of a request: instructions and tool schemas"""
+    domain: Optional[str]
+    instructions: str
+    tools: List[Dict[str, Any]]
+    persona_version: str
+    toolset_version: str
+    cache_key: str
+
+class PromptAssembler:
+    """Builds byte-stable request prefixes so OpenAI prompt caching can apply.
+
+    OpenAI caches the longest previously seen prefix of tools + instructions +
+    input. Anything that changes per call (today's date, the email itself) is
+    therefore kept out of the instructions and sent at the tail of the input,
+    and each (domain, persona version, tool-set version) prefix is built once
+    and reused verbatim.
+    """
+
+    def __init__(
+        self,
+        persona: str = default_persona,
+        tool_set: Optional[List[Dict[str, Any]]] = None,
+        instructions_by_domain: Optional[Dict[str, str]] = None
+    ):
+        self.persona = persona
+        self.tools = [to_responses_tool(tool) for tool in (tool_registry.schemas() if tool_set is None else tool_set)]
+        self.toolset_version = content_version(self.tools)
+        self.instructions_by_domain = (
+            load_domain_instructions() if instructions_by_domain is None else instructions_by_domain
+        )
+        self._prefixes: Dict[Tuple[Optional[str], str, str], PromptPrefix] = {}
+
+    def prefix(self, domain: Optional[str] = None) -> PromptPrefix:
+        """Static prefix for a domain, built once and then reused as-is"""
+        instructions = self.persona
+        extra = self.instructions_by_domain.get(domain) if domain else None
+        if extra:
+            instructions = f"{instructions}\n# DOMAIN INSTRUCTIONS\n{extra.strip()}\n"
+        persona_version = content_version(instructions)
+        key = (domain, persona_version, self.toolset_version)
+        prefix = self._prefixes.get(key)
+        if prefix is None:
+            prefix = PromptPrefix(
+                domain=domain,
+                instructions=instructions,
+                tools=self.tools,
+                persona_version=persona_version,
+                toolset_version=self.toolset_version,
+                cache_key=f"smartemails-{content_version(domain or '')}-{persona_version}-{self.toolset_version}"
+            )
+            self._prefixes[key] = prefix
+        return prefix
+
+    def context_message(self, role: str = "developer") -> Dict[str, Any]:
+        """Volatile context (today's date) sent after the email"""
+        return {
+            "role": role,
+            "content": context_template.format(current_date=datetime.now().strftime("%Y-%m-%d"))
+        }
+
+class PromptCacheStats:
+    """Cached-token ratio and latency of OpenAI calls, from response usage"""
+
+    def __init__(self):
+        self.calls = 0
+        self.input_tokens = 0
+        self.cached_tokens = 0
+        self.calls_with_cache_hit = 0
+        self.latency_cached = 0.0
+        self.latency_uncached = 0.0
+
+    def record(self, usage: Optional[Dict[str, Any]], latency: float) -> int:
+        """Record one call's usage; returns its cached token count"""
+        usage = usage or {}
+        cached = (usage.get("input_tokens_details") or {}).get("cached_tokens") or 0
+        self.calls += 1
+        self.input_tokens += usage.get("input_tokens") or 0
+        self.cached_tokens += cached
+        if cached:
+            self.calls_with_cache_hit += 1
+            self.latency_cached += latency
+        else:
+            self.latency_uncached += latency
+        return cached
+
+    def stats(self) -> Dict[str, Any]:
+        uncached_calls = self.calls - self.calls_with_cache_hit
+        return {
+            "calls": self.calls,
+            "input_tokens": self.input_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cached_token_ratio": round(self.cached_tokens / self.input_tokens, 4) if self.input_tokens else 0.0,
+            "calls_with_cache_hit": self.calls_with_cache_hit,
+            "avg_latency_cached": round(self.latency_cached / self.calls_with_cache_hit, 3)
+            if self.calls_with_cache_hit else None,
+            "avg_latency_uncached": round(self.latency_uncached / uncached_calls, 3)
+            if uncached_calls else None
+        }
+
+prompt_assembler = PromptAssembler()
+prompt_cache_stats = PromptCacheStats()
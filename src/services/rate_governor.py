@@ -0,0 +1,265 @@
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Any, AsyncIterator, Mapping, Optional, Tuple
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds in an x-ratelimit-reset-* / Retry-After value ("20ms", "6m0s", "1.5")"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts) if parts else None
+
+def error_status(error: BaseException) -> Tuple[Optional[int], Mapping[str, str]]:
+    """Status code and response headers of an SDK or httpx HTTP error"""
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    return status, getattr(response, "headers", None) or {}
+
+class Bucket:
+    """Token bucket refilled continuously to `limit` per minute (None = unlimited)"""
+
+    def __init__(self, limit: Optional[float]):
+        self.limit = limit
+        self.available = float(limit or 0)
+        self.updated = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        if self.limit:
+            self.available = min(self.limit, self.available + (now - self.updated) * self.limit / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        if not self.limit:
+            return 0.0
+        self.refill()
+        needed = min(amount, self.limit) - self.available
+        return max(0.0, needed * 60.0 / self.limit)
+
+    def take(self, amount: float) -> None:
+        if self.limit:
+            self.available -= amount
+
+    def give(self, amount: float) -> None:
+        if self.limit:
+            self.refill()
+            self.available = min(self.limit, self.available + amount)
+
+    def sync(self, limit: Optional[str], remaining: Optional[str], pending: float) -> None:
+        """Adopt the server's view, less `pending` capacity it may not have counted yet"""
+        try:
+            if limit is not None:
+                self.limit = float(limit)
+            if remaining is not None and self.limit:
+                self.refill()
+                self.available = min(self.limit, float(remaining) - pending)
+        except ValueError:
+            pass
+
+@dataclass
+class Reservation:
+    """Capacity held for one call; the caller fills in usage and headers"""
+    tokens: int
+    seq: int = 0
+    used_tokens: Optional[int] = None
+    headers: Optional[Mapping[str, str]] = None
+    started: float = field(default_factory=time.perf_counter)
+    governor: Optional["ModelGovernor"] = None
+
+class ModelGovernor:
+    """Requests-per-minute and tokens-per-minute buckets of one (API key, model)"""
+
+    def __init__(self, model: str, rpm: Optional[int] = None, tpm: Optional[int] = None):
+        self.model = model
+        self.requests = Bucket(rpm)
+        self.tokens = Bucket(tpm)
+        self.paused_until = 0.0
+        self.synced_seq = 0
+        # Reservation seq -> tokens, in the order the calls were admitted
+        self.in_flight: Dict[int, int] = {}
+        self._lock = asyncio.Lock()
+        self.calls = 0
+        self.throttled = 0
+        self.time_throttled = 0.0
+        self.rate_limited = 0
+        self.synced = 0
+        self.refunded_tokens = 0
+
+    async def acquire(self, tokens: int) -> Reservation:
+        """Wait (in arrival order) until the buckets cover one request of `tokens`"""
+        async with self._lock:
+            started = time.perf_counter()
+            while True:
+                wait = max(
+                    self.requests.wait_time(1),
+                    self.tokens.wait_time(tokens),
+                    self.paused_until - time.monotonic()
+                )
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            waited = time.perf_counter() - started
+            if waited > 0.001:
+                self.throttled += 1
+                self.time_throttled += waited
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.calls += 1
+            reservation = Reservation(tokens, seq=self.calls)
+            self.in_flight[reservation.seq] = tokens
+            return reservation
+
+    def settle(self, reservation: Reservation) -> None:
+        """Resynchronize from the call's headers, else refund what it did not use"""
+        self.in_flight.pop(reservation.seq, None)
+        if reservation.headers and self.sync(reservation.headers, after=reservation.seq):
+            return
+        if reservation.used_tokens is not None:
+            refund = max(0, reservation.tokens - reservation.used_tokens)
+            self.tokens.give(refund)
+            self.refunded_tokens += refund
+
+    def sync(self, headers: Mapping[str, str], after: int = 0) -> bool:
+        """Adopt x-ratelimit-* headers stamped when call `after` was admitted.
+
+        Calls admitted after it may not be counted in them yet, so they stay
+        reserved on top of the server's remaining capacity. Headers older
+        than ones already applied are ignored.
+        """
+        if "x-ratelimit-remaining-tokens" not in headers and "x-ratelimit-remaining-requests" not in headers:
+            return False
+        if after and after < self.synced_seq:
+            return True
+        self.synced_seq = max(self.synced_seq, after)
+        self.synced += 1
+        later = [tokens for seq, tokens in self.in_flight.items() if seq > after]
+        self.requests.sync(
+            headers.get("x-ratelimit-limit-requests"),
+            headers.get("x-ratelimit-remaining-requests"),
+            len(later)
+        )
+        self.tokens.sync(
+            headers.get("x-ratelimit-limit-tokens"),
+            headers.get("x-ratelimit-remaining-tokens"),
+            sum(later)
+        )
+        return True
+
+    def penalize(self, headers: Mapping[str, str]) -> None:
+        """A 429 got through: hold every call to this model until the limit resets"""
+        self.rate_limited += 1
+        pause = parse_duration(headers.get("retry-after-ms"))
+        pause = pause / 1000 if pause is not None else parse_duration(headers.get("retry-after"))
+        if pause is None:
+            pause = max(
+                parse_duration(headers.get("x-ratelimit-reset-requests")) or 0.0,
+                parse_duration(headers.get("x-ratelimit-reset-tokens")) or 0.0
+            ) or 1.0
+        self.paused_until = max(self.paused_until, time.monotonic() + pause)
+
+    def stats(self) -> Dict[str, Any]:
+        self.requests.refill()
+        self.tokens.refill()
+        return {
+            "rpm_limit": self.requests.limit,
+            "tpm_limit": self.tokens.limit,
+            "requests_available": round(self.requests.available) if self.requests.limit else None,
+            "tokens_available": round(self.tokens.available) if self.tokens.limit else None,
+            "in_flight": len(self.in_flight),
+            "calls": self.calls,
+            "throttled": self.throttled,
+            "seconds_throttled": round(self.time_throttled, 2),
+            "rate_limited_429": self.rate_limited,
+            "header_syncs": self.synced,
+            "refunded_tokens": self.refunded_tokens
+        }
+
+class RateGovernor:
+    """Client-side TPM/RPM governor per (API key, model).
+
+    Each call reserves one request and its estimated tokens (input estimate
+    plus max output tokens, as OpenAI counts them) before it is sent, waiting
+    if the buckets are empty. The buckets are resynchronized from every
+    response's x-ratelimit-* headers; without headers the unused part is
+    refunded from the reported usage. Limits unknown up front are learned
+    from the first response; OPENAI_RATE_LIMITS seeds them per model.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Dict[str, int]]] = None, enabled: bool = True):
+        self.limits = limits or {}
+        self.enabled = enabled
+        self._governors: Dict[Tuple[str, str], ModelGovernor] = {}
+
+    @classmethod
+    def from_env(cls) -> "RateGovernor":
+        return cls(
+            limits=json.loads(os.getenv("OPENAI_RATE_LIMITS", "{}")),
+            enabled=os.getenv("RATE_GOVERNOR_ENABLED", "true").lower() == "true"
+        )
+
+    def governor(self, api_key: Optional[str], model: str) -> ModelGovernor:
+        key = (hashlib.sha256((api_key or "").encode()).hexdigest()[:8], model)
+        governor = self._governors.get(key)
+        if governor is None:
+            limits = self.limits.get(model, {})
+            governor = self._governors[key] = ModelGovernor(model, limits.get("rpm"), limits.get("tpm"))
+        return governor
+
+    async def acquire(self, api_key: Optional[str], model: str, tokens: int) -> Reservation:
+        """Hold rate-limit capacity for one call; hand it back with release()"""
+        if not self.enabled:
+            return Reservation(tokens)
+        governor = self.governor(api_key, model)
+        reservation = await governor.acquire(tokens)
+        reservation.governor = governor
+        return reservation
+
+    def release(self, reservation: Reservation, error: Optional[BaseException] = None) -> None:
+        """Settle a reservation once its call finished or failed with `error`"""
+        governor = reservation.governor
+        if governor is None:
+            return
+        if error is not None:
+            status, headers = error_status(error)
+            if status == 429:
+                governor.penalize(headers)
+            if headers:
+                reservation.headers = headers
+        governor.settle(reservation)
+
+    @asynccontextmanager
+    async def reserve(self, api_key: Optional[str], model: str, tokens: int) -> AsyncIterator[Reservation]:
+        """Hold rate-limit capacity for one call made inside the block"""
+        reservation = await self.acquire(api_key, model, tokens)
+        try:
+            yield reservation
+        except Exception as e:
+            self.release(reservation, e)
+            raise
+        except BaseException:
+            self.release(reservation)
+            raise
+        else:
+            self.release(reservation)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "models": {f"{key}/{model}": governor.stats() for (key, model), governor in self._governors.items()}
+        }
+
+rate_governor = RateGovernor.from_env()
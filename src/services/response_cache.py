@@ -0,0 +1,138 @@
+import os
+import re
+import json
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from src.models.request_models import EmailRequest
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def content_version(content: Any) -> str:
+    """Short stable hash identifying a prompt or tool-set revision"""
+    if not isinstance(content, str):
+        content = json.dumps(content, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:12]
+
+def normalize_text(text: Optional[str]) -> str:
+    """Collapse whitespace runs so formatting-only differences hash the same"""
+    return _WHITESPACE_RE.sub(" ", text or "").strip()
+
+def normalize_email(email_request: EmailRequest) -> Dict[str, Any]:
+    """Canonical form of an email for hashing (ids and timestamps excluded)"""
+    return {
+        "domain": email_request.domain.lower(),
+        "from": email_request.from_email.lower(),
+        "to": sorted(address.lower() for address in email_request.to or []),
+        "cc": sorted(address.lower() for address in email_request.cc or []),
+        "originalMailbox": (email_request.originalMailbox or "").lower(),
+        "subject": normalize_text(email_request.subject),
+        "body": normalize_text(email_request.body),
+        "bodyFormat": email_request.bodyFormat,
+        "attachments": [
+            {
+                "name": attachment.name,
+                "contentType": attachment.contentType,
+                "size": attachment.size,
+                "content": hashlib.sha256(attachment.contentBytes.encode("ascii")).hexdigest()
+                if attachment.contentBytes else None
+            }
+            for attachment in email_request.attachments or []
+        ]
+    }
+
+class ResponseCache:
+    """In-memory LRU + TTL cache of final compose responses.
+
+    Keys are canonical hashes of the normalized email plus everything else that
+    shapes the answer (model, reasoning level, persona and tool-set versions),
+    so a prompt or model change never serves stale answers.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600.0, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        return cls(
+            max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000")),
+            ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600")),
+            enabled=os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+        )
+
+    def make_key(
+        self,
+        email_request: EmailRequest,
+        model: str,
+        reasoning_level: str,
+        persona_version: str,
+        toolset_version: str
+    ) -> str:
+        """Canonical cache key for an email and the configuration answering it"""
+        canonical = json.dumps({
+            "email": normalize_email(email_request),
+            "model": model,
+            "reasoning": reasoning_level,
+            "persona": persona_version,
+            "tools": toolset_version
+        }, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached response, or None on a miss"""
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        stored_at, value = entry
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return dict(value)
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        self._entries[key] = (time.monotonic(), dict(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def record_bypass(self) -> None:
+        self.bypasses += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "bypasses": self.bypasses,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+response_cache = ResponseCache.from_env()
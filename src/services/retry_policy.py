@@ -0,0 +1,197 @@
+import os
+import time
+import random
+import asyncio
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Any, Awaitable, Callable, Optional, TypeVar
+
+import httpx
+import openai
+
+from src.services.conversation_state import is_expired_response_error
+from src.services.rate_governor import error_status, parse_duration
+
+T = TypeVar("T")
+
+# Number of the attempt running in this task (1 for a first attempt)
+_attempt: ContextVar[int] = ContextVar("openai_attempt", default=1)
+
+# Statuses worth another attempt: timeouts, conflicts, rate limits, server errors
+RETRYABLE_STATUS = {408, 409, 429}
+
+def is_retryable(error: BaseException) -> bool:
+    """True for transient failures; bad requests, auth errors and bugs are fatal"""
+    if is_expired_response_error(error):
+        # Not coming back; the email loop replays the conversation instead
+        return False
+    if isinstance(error, (openai.APIConnectionError, httpx.TransportError, asyncio.TimeoutError)):
+        return True
+    status, headers = error_status(error)
+    if status is None:
+        return False
+    should_retry = (headers.get("x-should-retry") or "").lower()
+    if should_retry in ("true", "false"):
+        return should_retry == "true"
+    if status == 429 and "insufficient_quota" in str(error):
+        # Out of credit, not rate limited: waiting will not help
+        return False
+    return status in RETRYABLE_STATUS or status >= 500
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the server asked us to wait (Retry-After-Ms / Retry-After), if any"""
+    _, headers = error_status(error)
+    delay = parse_duration(headers.get("retry-after-ms"))
+    if delay is not None:
+        return delay / 1000
+    return parse_duration(headers.get("retry-after"))
+
+def error_reason(error: BaseException) -> str:
+    status, _ = error_status(error)
+    return str(status) if status is not None else type(error).__name__
+
+@dataclass
+class RetryBudget:
+    """Retry window and attempt report shared by every OpenAI call of one request.
+
+    The window of `seconds` restarts with each model call once it holds its
+    scheduler slot, so queue waits, tool runs and earlier iterations do not
+    use it up; `share` cuts it while fallback models are left to try.
+    """
+    seconds: float
+    deadline: float = 0.0
+    share: float = 1.0
+    attempts: int = 0
+    retries: int = 0
+    retry_seconds: float = 0.0
+    errors: Dict[str, int] = field(default_factory=dict)
+
+    def start(self) -> None:
+        """Start the window of the next model call"""
+        self.deadline = time.monotonic() + self.seconds * self.share
+
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "retry_seconds": round(self.retry_seconds, 3),
+            "errors": dict(self.errors)
+        }
+
+class RetryPolicy:
+    """Deadline-aware retries for OpenAI calls.
+
+    Only retryable errors (connection failures, timeouts, 408/409/429/5xx,
+    or whatever the server's x-should-retry says) are retried, at most
+    `max_attempts` times per call. The wait is the server's Retry-After when
+    given, otherwise full-jitter exponential backoff. The deadline only
+    stops retries: none is started that could not finish its wait before
+    it, and a retry's timeout is cut to the time left, while a first
+    attempt always gets the full configured timeout.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 20.0,
+        deadline: float = 300.0
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.calls = 0
+        self.attempts = 0
+        self.retried_calls = 0
+        self.retry_seconds = 0.0
+        self.retries_by_reason: Dict[str, int] = {}
+        self.fatal = 0
+        self.exhausted = 0
+        self.deadline_exceeded = 0
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        return cls(
+            max_attempts=int(os.getenv("OPENAI_RETRY_MAX_ATTEMPTS", "4")),
+            base_delay=float(os.getenv("OPENAI_RETRY_BASE_DELAY", "0.5")),
+            max_delay=float(os.getenv("OPENAI_RETRY_MAX_DELAY", "20")),
+            deadline=float(os.getenv("OPENAI_RETRY_DEADLINE", "300"))
+        )
+
+    def budget(self, deadline: Optional[float] = None) -> RetryBudget:
+        """A fresh budget for one request, its first window starting now"""
+        budget = RetryBudget(self.deadline if deadline is None else deadline)
+        budget.start()
+        return budget
+
+    def attempt_timeout(self, budget: RetryBudget, timeout: float) -> float:
+        """Per-attempt timeout: the configured one, cut for a retry to what is left of the deadline"""
+        if _attempt.get() == 1:
+            return timeout
+        return max(0.001, min(timeout, budget.remaining()))
+
+    def is_retryable(self, error: BaseException) -> bool:
+        return is_retryable(error)
+
+    def backoff(self, attempt: int, error: BaseException) -> float:
+        delay = retry_after(error)
+        if delay is not None:
+            # Small jitter so calls told the same Retry-After do not return in lockstep
+            return delay + random.uniform(0, min(1.0, delay * 0.1))
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    async def run(self, operation: Callable[[], Awaitable[T]], budget: Optional[RetryBudget] = None) -> T:
+        """Await operation() until it succeeds, fails fatally or the budget runs out"""
+        budget = budget or self.budget()
+        self.calls += 1
+        retried = False
+        for attempt in range(1, self.max_attempts + 1):
+            budget.attempts += 1
+            self.attempts += 1
+            token = _attempt.set(attempt)
+            try:
+                return await operation()
+            except Exception as e:
+                if not self.is_retryable(e):
+                    self.fatal += 1
+                    raise
+                if attempt == self.max_attempts:
+                    self.exhausted += 1
+                    raise
+                delay = self.backoff(attempt, e)
+                if delay >= budget.remaining():
+                    self.deadline_exceeded += 1
+                    raise
+                reason = error_reason(e)
+                print(f"OpenAI call failed ({reason}), retry {attempt} in {delay:.2f}s")
+                budget.retries += 1
+                budget.retry_seconds += delay
+                budget.errors[reason] = budget.errors.get(reason, 0) + 1
+                self.retries_by_reason[reason] = self.retries_by_reason.get(reason, 0) + 1
+                self.retry_seconds += delay
+                if not retried:
+                    self.retried_calls += 1
+                    retried = True
+                await asyncio.sleep(delay)
+            finally:
+                _attempt.reset(token)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_attempts": self.max_attempts,
+            "deadline_seconds": self.deadline,
+            "calls": self.calls,
+            "attempts": self.attempts,
+            "retried_calls": self.retried_calls,
+            "retries_by_reason": dict(self.retries_by_reason),
+            "retry_seconds": round(self.retry_seconds, 2),
+            "fatal": self.fatal,
+            "attempts_exhausted": self.exhausted,
+            "deadline_exceeded": self.deadline_exceeded
+        }
+
+openai_retry_policy = RetryPolicy.from_env()
@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import asyncio
+from dataclasses import dataclass
+from typing import Dict, Any, Awaitable, Callable, Iterable, List, Optional, Tuple, TypeVar
+
+from src.services.email_classifier import is_reasoning_model
+from src.services.hedging import LatencyWindow
+from src.services.priority_scheduler import priority_class, HIGH, NORMAL, LOW
+
+T = TypeVar("T")
+
+FLEX = "flex"
+AUTO = "auto"
+PRIORITY = "priority"
+
+# Cheapest and slowest first
+TIERS = (FLEX, AUTO, PRIORITY)
+
+# Seconds one OpenAI call may take, per importance
+DEFAULT_SLOS = {HIGH: 20.0, NORMAL: 60.0, LOW: 600.0}
+
+# Assumed p95 latency of a tier until enough calls have been observed
+DEFAULT_PRIORS = {FLEX: 45.0, AUTO: 20.0, PRIORITY: 10.0}
+
+# Request modes: a caller waiting on the HTTP response, or a queued job
+REALTIME = "realtime"
+JOB = "job"
+
+def supports_flex(model: str) -> bool:
+    """Flex processing is offered for reasoning models only"""
+    return is_reasoning_model(model)
+
+@dataclass(frozen=True)
+class ServiceLevel:
+    """Latency objective of one email's OpenAI calls"""
+    slo: float
+    reason: str
+
+class ServiceTierSelector:
+    """Chooses the service tier of each Responses API call from its latency SLO.
+
+    The SLO comes from the email's importance, tightened by per-mailbox
+    SLOs and relaxed by `job_factor` for queued jobs. The cheapest tier
+    whose observed p95 latency for the model fits its budget is chosen
+    (flex, then auto, then priority if enabled); with no tier fitting, the
+    fastest one is used. The budget is the SLO, less for flex the expected
+    latency of the next faster tier: a flex call running past it is
+    cancelled and sent again at that tier, still in time for the SLO. Flex
+    measured too slow is still probed once every `probe_interval` seconds,
+    so that its observed latency recovers once flex capacity does.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        slos: Optional[Dict[str, float]] = None,
+        mailbox_slos: Optional[Dict[str, float]] = None,
+        job_factor: float = 4.0,
+        priors: Optional[Dict[str, float]] = None,
+        priority_enabled: bool = False,
+        percentile: float = 0.95,
+        min_samples: int = 10,
+        probe_interval: float = 60.0
+    ):
+        self.enabled = enabled
+        self.slos = {**DEFAULT_SLOS, **(slos or {})}
+        self.mailbox_slos = {mailbox.lower(): slo for mailbox, slo in (mailbox_slos or {}).items()}
+        self.job_factor = job_factor
+        self.priors = {**DEFAULT_PRIORS, **(priors or {})}
+        self.priority_enabled = priority_enabled
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.probe_interval = probe_interval
+        self.last_probe: Dict[str, float] = {}
+        self.probes = 0
+        self.latencies: Dict[Tuple[str, str], LatencyWindow] = {}
+        self.choices: Dict[str, int] = {}
+        self.fallbacks = 0
+        self.missed_slo = 0
+
+    @classmethod
+    def from_env(cls) -> "ServiceTierSelector":
+        return cls(
+            enabled=os.getenv("SERVICE_TIER_SELECTION", "true").lower() == "true",
+            slos=json.loads(os.getenv("SERVICE_TIER_SLOS", "{}")),
+            mailbox_slos=json.loads(os.getenv("SERVICE_TIER_MAILBOX_SLOS", "{}")),
+            job_factor=float(os.getenv("SERVICE_TIER_JOB_FACTOR", "4")),
+            priors=json.loads(os.getenv("SERVICE_TIER_PRIORS", "{}")),
+            priority_enabled=os.getenv("SERVICE_TIER_PRIORITY_ENABLED", "false").lower() == "true",
+            probe_interval=float(os.getenv("SERVICE_TIER_PROBE_INTERVAL", "60"))
+        )
+
+    def service_level(self, importance: Optional[str], mailboxes: Iterable[str] = (), mode: str = REALTIME) -> ServiceLevel:
+        """SLO of an email: importance, tightened by mailbox SLOs, relaxed for queued jobs"""
+        priority = priority_class(importance)
+        slo, reason = self.slos[priority], priority
+        for mailbox in mailboxes or ():
+            mailbox_slo = self.mailbox_slos.get((mailbox or "").lower())
+            if mailbox_slo is not None and mailbox_slo < slo:
+                slo, reason = mailbox_slo, mailbox.lower()
+        if mode == JOB:
+            slo, reason = slo * self.job_factor, f"{reason}/{JOB}"
+        return ServiceLevel(slo, reason)
+
+    def tiers_for(self, model: str) -> List[str]:
+        return [
+            tier for tier in TIERS
+            if (tier != FLEX or supports_flex(model)) and (tier != PRIORITY or self.priority_enabled)
+        ]
+
+    def window_for(self, model: str, tier: str) -> LatencyWindow:
+        window = self.latencies.get((model, tier))
+        if window is None:
+            window = self.latencies[(model, tier)] = LatencyWindow()
+        return window
+
+    def expected_latency(self, model: str, tier: str) -> float:
+        """Observed p95 of (model, tier), or the tier's prior until enough calls were seen"""
+        window = self.window_for(model, tier)
+        if len(window) < self.min_samples:
+            return self.priors[tier]
+        return window.percentile(self.percentile)
+
+    def budget(self, model: str, tier: str, level: ServiceLevel) -> float:
+        """Seconds a call at `tier` may take: for flex, leave time to fall back"""
+        faster = self.faster_tier(model, tier) if tier == FLEX else None
+        return max(0.0, level.slo - self.expected_latency(model, faster)) if faster else level.slo
+
+    def choose(self, model: str, level: ServiceLevel) -> str:
+        tiers = self.tiers_for(model)
+        fitting = [tier for tier in tiers if self.expected_latency(model, tier) <= self.budget(model, tier, level)]
+        if tiers[0] == FLEX and FLEX not in fitting and self.priors[FLEX] <= level.slo:
+            # Flex was measured too slow for this SLO; look again now and then
+            now = time.monotonic()
+            if now - self.last_probe.get(model, 0.0) >= self.probe_interval:
+                self.last_probe[model] = now
+                self.probes += 1
+                return FLEX
+        return fitting[0] if fitting else tiers[-1]
+
+    def faster_tier(self, model: str, tier: str) -> Optional[str]:
+        tiers = self.tiers_for(model)
+        index = tiers.index(tier) if tier in tiers else len(tiers)
+        return tiers[index + 1] if index + 1 < len(tiers) else None
+
+    def record(self, model: str, tier: str, latency: float) -> None:
+        self.window_for(model, tier).record(latency)
+
+    async def run(self, model: str, level: Optional[ServiceLevel], send: Callable[[Optional[str]], Awaitable[T]]) -> T:
+        """Await send(tier) at the chosen tier, falling back from flex past the SLO.
+
+        With selection disabled or no service level, send(None) keeps the
+        request body's own tier.
+        """
+        if not self.enabled or level is None:
+            return await send(None)
+        tier = self.choose(model, level)
+        self.choices[tier] = self.choices.get(tier, 0) + 1
+        faster = self.faster_tier(model, tier) if tier == FLEX else None
+        first_started = started = time.perf_counter()
+        if faster:
+            budget = self.budget(model, tier, level)
+            try:
+                result = await asyncio.wait_for(send(tier), budget)
+                self.record(model, tier, time.perf_counter() - started)
+                return result
+            except asyncio.TimeoutError:
+                # Counted at the SLO so that the p95 of flex reflects its slow calls
+                self.record(model, tier, level.slo)
+                self.fallbacks += 1
+                print(f"{tier} call to {model} exceeded its {budget:.1f}s budget, retrying at {faster}")
+                tier, started = faster, time.perf_counter()
+        result = await send(tier)
+        self.record(model, tier, time.perf_counter() - started)
+        if time.perf_counter() - first_started > level.slo:
+            self.missed_slo += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "slos": self.slos,
+            "choices": dict(self.choices),
+            "flex_fallbacks": self.fallbacks,
+            "flex_probes": self.probes,
+            "missed_slo": self.missed_slo,
+            "latency": {
+                f"{model}/{tier}": {
+                    "calls": len(window),
+                    "p50": round(window.percentile(0.5), 3),
+                    "p95": round(window.percentile(self.percentile), 3)
+                }
+                for (model, tier), window in self.latencies.items() if len(window)
+            }
+        }
+
+service_tiers = ServiceTierSelector.from_env()
@@ -0,0 +1,50 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same work into one execution.
+
+    The first caller for a key starts the computation as an independent task;
+    callers arriving while it runs (under any of its keys) await the same task
+    and receive its result or exception. Because the task is shielded, a caller
+    that disconnects does not cancel the work for the others.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, keys: List[str], fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn() once per in-flight key set and share the outcome"""
+        keys = [key for key in keys if key]
+        for key in keys:
+            task = self._in_flight.get(key)
+            if task is not None:
+                self.coalesced += 1
+                print(f"Coalescing duplicate request onto in-flight computation ({key})")
+                # Make sure every alias of this request joins the same flight
+                for alias in keys:
+                    self._in_flight.setdefault(alias, task)
+                return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(fn())
+        self.executions += 1
+        for key in keys:
+            self._in_flight[key] = task
+        task.add_done_callback(lambda done: self._forget(done))
+        return await asyncio.shield(task)
+
+    def _forget(self, task: asyncio.Task) -> None:
+        for key in [key for key, running in self._in_flight.items() if running is task]:
+            del self._in_flight[key]
+        # Mark the exception retrieved even if every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(set(self._in_flight.values())),
+            "executions": self.executions,
+            "coalesced": self.coalesced
+        }
@@ -1,8 +1,40 @@
 import os
 from typing import Optional
-from msgraph import GraphServiceClient
+from msgraph import GraphServiceClient, GraphRequestAdapter
+from msgraph_core import GraphClientFactory
+from kiota_authentication_azure.azure_identity_authentication_provider import AzureIdentityAuthenticationProvider
 from azure.identity import ClientSecretCredential
 import asyncio
+import httpx
+from src.services.http_clients import http_clients
+from src.services.circuit_breaker import circuit_breakers, CircuitOpenError
+
+# Graph client shared by every TeamsService. The Graph middleware (retry,
+# redirect, telemetry) wraps the pooled "graph" httpx client in place, so
+# it is added once per pooled client rather than once per service.
+_graph_client: Optional[GraphServiceClient] = None
+_graph_http_client: Optional[httpx.AsyncClient] = None
+
+def get_graph_client(tenant_id: str, client_id: str, client_secret: str) -> GraphServiceClient:
+    """Return the shared Graph client, building it when the pooled client is (re)created"""
+    global _graph_client, _graph_http_client
+    http_client = http_clients.get("graph")
+    if _graph_client is None or _graph_http_client is not http_client:
+        credential = ClientSecretCredential(
+            tenant_id=tenant_id,
+            client_id=client_id,
+            client_secret=client_secret
+        )
+        request_adapter = GraphRequestAdapter(
+            AzureIdentityAuthenticationProvider(
+                credential,
+                scopes=['https://graph.microsoft.com/.default']
+            ),
+            client=GraphClientFactory.create_with_default_middleware(client=http_client)
+        )
+        _graph_client = GraphServiceClient(request_adapter=request_adapter)
+        _graph_http_client = http_client
+    return _graph_client
 
 class TeamsService:
     def __init__(self):
@@ -11,23 +43,20 @@ class TeamsService:
         self.client_secret = os.getenv("AZURE_CLIENT_SECRET")
         self.teams_channel_id = os.getenv("TEAMS_CHANNEL_ID")
         self.teams_team_id = os.getenv("TEAMS_TEAM_ID")
+        self.configured = all([self.tenant_id, self.client_id, self.client_secret])
         
-        if all([self.tenant_id, self.client_id, self.client_secret]):
-            credential = ClientSecretCredential(
-                tenant_id=self.tenant_id,
-                client_id=self.client_id,
-                client_secret=self.client_secret
-            )
-            self.client = GraphServiceClient(
-                credentials=credential,
-                scopes=['https://graph.microsoft.com/.default']
-            )
-        else:
-            self.client = None
+        if not self.configured:
             print("Teams integration not configured - missing Azure credentials")
     
+    @property
+    def client(self) -> Optional[GraphServiceClient]:
+        """Shared Graph client routed through the pooled "graph" client, if configured"""
+        if not self.configured:
+            return None
+        return get_graph_client(self.tenant_id, self.client_id, self.client_secret)
+    
     async def send_alert(self, message: str, subject: str = "SmartEmails Alert"):
-        """Send an alert message to Teams channel"""
+        """Send an alert message to Teams channel; while Graph's circuit is open it is only logged"""
         if not self.client:
             print(f"Teams integration not configured. Alert: {subject} - {message}")
             return
@@ -43,11 +72,14 @@ class TeamsService:
             chat_message.body.content_type = BodyType.Html
             chat_message.body.content = f"<h3>{subject}</h3><p>{message}</p>"
             
-            await self.client.teams.by_team_id(self.teams_team_id).channels.by_channel_id(
-                self.teams_channel_id
-            ).messages.post(chat_message)
+            async with circuit_breakers.get("graph").guard():
+                await self.client.teams.by_team_id(self.teams_team_id).channels.by_channel_id(
+                    self.teams_channel_id
+                ).messages.post(chat_message)
             
             print(f"Teams alert sent successfully: {subject}")
+        except CircuitOpenError as e:
+            print(f"{e}. Alert: {subject} - {message}")
         except Exception as e:
             print(f"Failed to send Teams alert: {str(e)}")
     
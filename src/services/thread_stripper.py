@@ -0,0 +1,273 @@
+import os
+import re
+import html
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional
+
+# Markers that open a quoted message in HTML bodies: Outlook web/mobile reply
+# dividers, Outlook desktop's top-bordered header block, Gmail, Thunderbird
+# and Apple Mail citations
+_HTML_DIVIDER_RE = re.compile(
+    r"<div[^>]*\bid=[\"']?(?:divRplyFwdMsg|appendonsend|mail-editor-reference-message-container)"
+    r"|<div[^>]*\bclass=[\"']?[^\"'>]*\b(?:gmail_quote|gmail_attr|moz-cite-prefix|yahoo_quoted|OutlookMessageHeader)"
+    r"|<div[^>]*border-top:\s*solid\s*#[0-9A-F]{6}\s*1\.0pt"
+    r"|<blockquote[^>]*type=[\"']?cite",
+    re.I
+)
+# Header line of a quoted message, in HTML possibly wrapped in <b>/<span>
+_HTML_FROM_RE = re.compile(r"(?:<(?:b|strong|span|font)\b[^>]*>\s*)*\b(?:From|De)\s*:", re.I)
+_BLOCK_START_RE = re.compile(r"<(?:div|p|hr|table)\b", re.I)
+
+_FROM_LINE_RE = re.compile(r"^\s*\**\s*(?:From|De)\s*:\**\s*\S", re.I)
+_SENT_LINE_RE = re.compile(r"^\s*\**\s*(?:Sent|Date|Enviado|Enviada|Data)\s*:", re.I)
+_SENT_RE = re.compile(r"\b(?:Sent|Date|Enviado|Enviada|Data)\s*:", re.I)
+_SEPARATOR_RE = re.compile(
+    r"^\s*-{2,}\s*(?:Original Message|Forwarded message|Mensagem original|Mensagem encaminhada|"
+    r"Mensagem reencaminhada)\s*-{2,}\s*$",
+    re.I
+)
+_WROTE_RE = re.compile(r"^\s*(?:On|Em|A|No dia)\s.{4,200}\b(?:wrote|escreveu)\s*:\s*$", re.I | re.S)
+_QUOTE_PREFIX_RE = re.compile(r"^\s*(?:>\s?)+")
+_HEADER_FIELD_RE = re.compile(
+    r"^\s*\**\s*(From|De|Sent|Date|Enviado|Enviada|Data|To|Para|Cc|Subject|Assunto)\s*:\**\s*(.*)$", re.I
+)
+# Sign-off that starts the signature / disclaimer of a quoted message
+_SIGNOFF_RE = re.compile(
+    r"^\s*(?:com os )?(?:melhores |muitos )?(?:cumprimentos|atenciosamente|best regards|kind regards|"
+    r"regards|obrigad[oa] e cumprimentos)\s*,?\s*$",
+    re.I
+)
+# Opening lines that carry no request of their own
+_GREETING_RE = re.compile(
+    r"^\s*(?:bom dia|boa tarde|boa noite|ol[aá]|car[oa]s?(?: senhor(?:es|a)?)?|exm[oa]s?\.?(?: senhor(?:es|a)?)?|"
+    r"hello|hi|dear .{0,40})\s*[,.!]?\s*$",
+    re.I
+)
+_FORWARD_SUBJECT_RE = re.compile(r"^\s*(?:FWD?|ENC|RV|TR)\s*:", re.I)
+# Below this many letters and digits a message holds no request of its own
+MIN_SUBSTANTIVE_CHARS = 20
+
+_BREAK_TAG_RE = re.compile(r"<\s*(?:br|/p|/div|/tr|/li|/h[1-6]|hr)\b[^>]*>", re.I)
+_DROP_BLOCK_RE = re.compile(r"<(style|script|head)\b[^>]*>.*?</\1\s*>|<!--.*?-->", re.I | re.S)
+_TAG_RE = re.compile(r"<[^>]+>")
+_TRAILING_RULE_RE = re.compile(r"(?:<hr\b[^>]*>\s*)+$", re.I)
+_TAG_TOKEN_RE = re.compile(r"<(/?)([a-z][\w:-]*)\b[^>]*?(/?)>", re.I)
+_VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+def html_to_plain_text(fragment: str) -> str:
+    """Plain text of an HTML fragment, one line per block element"""
+    text = _DROP_BLOCK_RE.sub(" ", fragment)
+    text = _BREAK_TAG_RE.sub("\n", text)
+    text = html.unescape(_TAG_RE.sub(" ", text)).replace("\xa0", " ")
+    return "\n".join(" ".join(line.split()) for line in text.splitlines())
+
+def close_html_fragment(fragment: str) -> str:
+    """Close the elements left open where an HTML body was cut"""
+    # A tag cut in half at the end is dropped
+    fragment = re.sub(r"<[^>]*$", "", fragment)
+    open_tags: List[str] = []
+    for match in _TAG_TOKEN_RE.finditer(_DROP_BLOCK_RE.sub(" ", fragment)):
+        closing, name, self_closing = match.group(1), match.group(2).lower(), match.group(3)
+        if name in _VOID_TAGS or self_closing:
+            continue
+        if not closing:
+            open_tags.append(name)
+        elif name in open_tags:
+            # Also closes anything left open inside it (an unclosed <p>)
+            del open_tags[len(open_tags) - 1 - open_tags[::-1].index(name):]
+    return fragment + "".join(f"</{name}>" for name in reversed(open_tags))
+
+def find_html_quote_start(body: str, pos: int = 0) -> Optional[int]:
+    """Offset where the quoted history of an HTML body starts, if any, looking from `pos`"""
+    candidates = []
+    divider = _HTML_DIVIDER_RE.search(body, pos)
+    if divider:
+        candidates.append(divider.start())
+    for match in _HTML_FROM_RE.finditer(body, pos):
+        # A "From:" that opens a block and is followed by a Sent:/Date: line
+        if not body[pos:match.start()].rstrip().endswith(">") and match.start() != pos:
+            continue
+        if not _SENT_RE.search(html_to_plain_text(body[match.end():match.end() + 2000])[:600]):
+            continue
+        block = None
+        for block in _BLOCK_START_RE.finditer(body, max(pos, match.start() - 600), match.start()):
+            pass
+        candidates.append(block.start() if block else match.start())
+        break
+    return min(candidates) if candidates else None
+
+def _is_header_start(lines: List[str], index: int) -> bool:
+    line = lines[index]
+    if _SEPARATOR_RE.match(line):
+        return True
+    # "On Mon, 3 Jun 2024 Maria <...> wrote:" may be wrapped over two lines
+    if _WROTE_RE.match(line) or (index + 1 < len(lines) and _WROTE_RE.match(f"{line} {lines[index + 1]}")):
+        return True
+    if _FROM_LINE_RE.match(line):
+        return any(_SENT_LINE_RE.match(following) for following in lines[index + 1:index + 6])
+    return False
+
+def _has_content(message: List[str]) -> bool:
+    """True once a message holds more than its quote header lines"""
+    return any(
+        line.strip() and not (_HEADER_FIELD_RE.match(line) or _SEPARATOR_RE.match(line) or _WROTE_RE.match(line))
+        for line in message
+    )
+
+def split_text_thread(text: str) -> List[str]:
+    """Split a plain-text body into [newest message, older quoted messages...]"""
+    lines = text.splitlines()
+    messages: List[List[str]] = [[]]
+    quoted_block = False
+    for index, line in enumerate(lines):
+        is_quoted = bool(_QUOTE_PREFIX_RE.match(line))
+        if _is_header_start(lines, index) and _has_content(messages[-1]):
+            messages.append([])
+        elif is_quoted and not quoted_block and _has_content(messages[-1]):
+            # A run of "> " lines starts a new (older) message
+            messages.append([])
+        quoted_block = is_quoted
+        messages[-1].append(_QUOTE_PREFIX_RE.sub("", line) if is_quoted else line)
+    return ["\n".join(message).strip() for message in messages]
+
+def compress_message(message: str, max_chars: int) -> str:
+    """One quoted message as a short header summary plus its leading text"""
+    header = {}
+    content = []
+    for line in message.splitlines():
+        field = _HEADER_FIELD_RE.match(line)
+        if field and not content:
+            header.setdefault(field.group(1).lower(), field.group(2).strip())
+        elif _SEPARATOR_RE.match(line):
+            continue
+        elif not content and _WROTE_RE.match(line):
+            header.setdefault("from", line.strip(" :"))
+        elif _SIGNOFF_RE.match(line):
+            # Signatures and disclaimers add nothing to the history
+            break
+        elif line.strip():
+            content.append(line.strip())
+    sender = header.get("from") or header.get("de") or ""
+    sent = header.get("sent") or header.get("date") or header.get("enviado") or header.get("enviada") or header.get("data") or ""
+    text = " ".join(content)
+    if len(text) > max_chars:
+        text = text[:max_chars].rsplit(" ", 1)[0] + " […]"
+    summary = " | ".join(part for part in (sender, sent) if part)
+    return f"[{summary}] {text}" if summary else text
+
+def strip_signature(text: str, keep_lines: int = 2) -> str:
+    """Cut a message after its sign-off, keeping the sign-off and the sender's name"""
+    lines = text.splitlines()
+    for index, line in enumerate(lines):
+        if index and _SIGNOFF_RE.match(line):
+            kept = []
+            for following in (line for line in lines[index + 1:] if line.strip()):
+                # Name and role lines are short; disclaimers are not
+                if len(kept) == keep_lines or len(following) > 60:
+                    break
+                kept.append(following)
+            return "\n".join(lines[:index + 1] + kept)
+    return text
+
+def has_request(text: str) -> bool:
+    """True when a message says more than a greeting, a sign-off and a signature"""
+    lines = [
+        line for line in strip_signature(text, keep_lines=0).splitlines()
+        if not (_GREETING_RE.match(line) or _SIGNOFF_RE.match(line))
+    ]
+    return len(re.sub(r"\W", "", " ".join(lines))) >= MIN_SUBSTANTIVE_CHARS
+
+@dataclass
+class StrippedEmail:
+    """Newest message of a thread plus a bounded summary of the quoted history"""
+    body: str
+    history: str
+    quoted_messages: int
+    original_chars: int
+
+    @property
+    def kept_chars(self) -> int:
+        return len(self.body) + len(self.history)
+
+class ThreadStripper:
+    """Keeps the newest message of RE:/FW: chains and compresses the quoted tail.
+
+    The body up to the first quoted block is kept verbatim (HTML stays HTML,
+    with the elements the cut left open closed); the quoted messages become
+    one line each (sender, date, leading text), newest first, bounded by
+    max_messages and max_chars_per_message. In a forward (FW:/ENC: subject,
+    or a top part with no request of its own, e.g. "Bom dia,") the
+    forwarded message is the request, so it is kept in full in the body and
+    only the messages below it are summarised.
+    """
+
+    def __init__(self, max_messages: int = 3, max_chars_per_message: int = 500, enabled: bool = True):
+        self.max_messages = max_messages
+        self.max_chars_per_message = max_chars_per_message
+        self.enabled = enabled
+        self.emails = 0
+        self.threads_stripped = 0
+        self.chars_in = 0
+        self.chars_out = 0
+        self.total_seconds = 0.0
+
+    @classmethod
+    def from_env(cls) -> "ThreadStripper":
+        return cls(
+            max_messages=int(os.getenv("THREAD_HISTORY_MAX_MESSAGES", "3")),
+            max_chars_per_message=int(os.getenv("THREAD_HISTORY_MAX_CHARS", "500")),
+            enabled=os.getenv("THREAD_STRIPPING_ENABLED", "true").lower() == "true"
+        )
+
+    def keeps_first_quote(self, newest: str, subject: Optional[str]) -> bool:
+        """True when the first quoted message, not the top part, holds the request"""
+        return bool(_FORWARD_SUBJECT_RE.match(subject or "")) or not has_request(newest)
+
+    def strip(self, body: str, is_html: bool = False, subject: Optional[str] = None) -> StrippedEmail:
+        body = body or ""
+        if not self.enabled:
+            return StrippedEmail(body, "", 0, len(body))
+        start = time.perf_counter()
+        if is_html:
+            cut = find_html_quote_start(body)
+            if cut is not None and self.keeps_first_quote(html_to_plain_text(body[:cut]), subject):
+                # History starts at the next quote marker past the forwarded message's text
+                first = cut
+                while cut is not None and not _has_content(html_to_plain_text(body[first:cut]).splitlines()):
+                    cut = find_html_quote_start(body, cut + 1)
+            newest = body if cut is None else close_html_fragment(_TRAILING_RULE_RE.sub("", body[:cut].rstrip()))
+            older = split_text_thread(html_to_plain_text(body[cut:])) if cut is not None else []
+        else:
+            newest, *older = split_text_thread(body)
+            older = [message for message in older if message]
+            if older and self.keeps_first_quote(newest, subject):
+                newest = f"{newest}\n\n{older.pop(0)}"
+        older = [message for message in older if message]
+        history = "\n".join(
+            compress_message(message, self.max_chars_per_message)
+            for message in older[:self.max_messages]
+        )
+        if len(older) > self.max_messages:
+            history += f"\n[{len(older) - self.max_messages} older message(s) omitted]"
+        result = StrippedEmail(newest.strip() if older else body, history, len(older), len(body))
+
+        self.emails += 1
+        self.threads_stripped += 1 if older else 0
+        self.chars_in += result.original_chars
+        self.chars_out += result.kept_chars
+        self.total_seconds += time.perf_counter() - start
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "emails": self.emails,
+            "threads_stripped": self.threads_stripped,
+            "chars_in": self.chars_in,
+            "chars_out": self.chars_out,
+            "reduction": round(1 - self.chars_out / self.chars_in, 4) if self.chars_in else 0.0,
+            "avg_parse_ms": round(self.total_seconds / self.emails * 1000, 3) if self.emails else 0.0
+        }
+
+thread_stripper = ThreadStripper.from_env()
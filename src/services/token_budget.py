@@ -0,0 +1,211 @@
+import os
+import re
+import json
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional
+from src.services.thread_stripper import strip_signature
+
+# Context windows (input + output tokens) by model family; longest prefix wins
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-4.1": 1047576,
+    "gpt-5": 400000,
+    "o1": 200000,
+    "o3": 200000,
+    "o4-mini": 200000,
+}
+DEFAULT_CONTEXT_WINDOW = 128000
+
+# Per-message framing the API adds around every input item
+MESSAGE_OVERHEAD_TOKENS = 4
+
+DEGRADE = "degrade"
+REFUSE = "refuse"
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_TRUNCATION_NOTE = "\n[…conteúdo truncado por exceder o limite de tokens]"
+
+def estimate_tokens(content: Any) -> int:
+    """Local token estimate of text (or JSON-serializable content), no network.
+
+    Words are about one token per four characters, punctuation one token
+    each; long unbroken runs (ids, base64) tokenize worse, at about three.
+    """
+    if content is None:
+        return 0
+    if not isinstance(content, str):
+        content = json.dumps(content, ensure_ascii=False)
+    tokens = 0
+    for piece in _PIECE_RE.findall(content):
+        length = len(piece)
+        tokens += 1 if length <= 4 else (length + 3) // 4 if length <= 20 else (length + 2) // 3
+    return tokens
+
+def estimate_request_tokens(
+    instructions: Optional[str],
+    tools: Optional[List[Dict[str, Any]]],
+    input_items: List[Dict[str, Any]]
+) -> int:
+    """Estimated input tokens of an assembled request"""
+    return (
+        estimate_tokens(instructions or "")
+        + estimate_tokens(tools or [])
+        + sum(estimate_tokens(item.get("content", item)) + MESSAGE_OVERHEAD_TOKENS for item in input_items)
+    )
+
+def context_window(model: str) -> int:
+    matches = [prefix for prefix in MODEL_CONTEXT_WINDOWS if model.startswith(prefix)]
+    return MODEL_CONTEXT_WINDOWS[max(matches, key=len)] if matches else DEFAULT_CONTEXT_WINDOW
+
+class TokenBudgetExceeded(Exception):
+    """The request cannot be made to fit the model's input budget"""
+
+    def __init__(self, estimated_tokens: int, budget: int):
+        super().__init__(f"Estimated {estimated_tokens} input tokens exceed the budget of {budget}")
+        self.estimated_tokens = estimated_tokens
+        self.budget = budget
+
+@dataclass
+class BudgetResult:
+    """The (possibly trimmed) email and what it is estimated to cost"""
+    email: Dict[str, Any]
+    estimated_tokens: int
+    budget: int
+    trimmed: List[str] = field(default_factory=list)
+
+class TokenBudget:
+    """Per-model input token budgets, trimming lowest-priority content first.
+
+    Trimming order: quoted history, attachment metadata (inline content and
+    inline images first), signatures, then, in "degrade" mode, the body is
+    truncated; in "refuse" mode the request is rejected instead.
+    """
+
+    def __init__(
+        self,
+        max_input_tokens: int = 32000,
+        budgets: Optional[Dict[str, int]] = None,
+        mode: str = DEGRADE,
+        enabled: bool = True
+    ):
+        self.max_input_tokens = max_input_tokens
+        self.budgets = budgets or {}
+        self.mode = mode if mode in (DEGRADE, REFUSE) else DEGRADE
+        self.enabled = enabled
+        self.requests = 0
+        self.trimmed_requests = 0
+        self.truncated_requests = 0
+        self.refused_requests = 0
+        self.estimated_tokens = 0
+
+    @classmethod
+    def from_env(cls) -> "TokenBudget":
+        return cls(
+            max_input_tokens=int(os.getenv("TOKEN_BUDGET_MAX_INPUT", "32000")),
+            budgets=json.loads(os.getenv("TOKEN_BUDGETS", "{}")),
+            mode=os.getenv("TOKEN_BUDGET_MODE", DEGRADE).lower(),
+            enabled=os.getenv("TOKEN_BUDGET_ENABLED", "true").lower() == "true"
+        )
+
+    def budget_for(self, model: str, max_output_tokens: int) -> int:
+        """Input tokens allowed for a model, never more than its context leaves"""
+        budget = self.budgets.get(model, self.max_input_tokens)
+        return min(budget, context_window(model) - max_output_tokens)
+
+    def fit(self, email: Dict[str, Any], fixed_tokens: int, budget: int) -> BudgetResult:
+        """Trim the email dict until fixed_tokens + email fit in the budget.
+
+        fixed_tokens covers everything that is not trimmed (instructions, tool
+        schemas, other input items). Raises TokenBudgetExceeded when it cannot fit.
+        """
+        email = dict(email)
+        result = BudgetResult(email, 0, budget)
+
+        def total() -> int:
+            result.estimated_tokens = fixed_tokens + estimate_tokens(email) + MESSAGE_OVERHEAD_TOKENS
+            return result.estimated_tokens
+
+        self.requests += 1
+        if not self.enabled or total() <= budget:
+            self.estimated_tokens += total()
+            return result
+
+        for step in (self._trim_history, self._trim_attachments, self._trim_signature):
+            if step(email, result) and total() <= budget:
+                break
+        else:
+            if self.mode == REFUSE or fixed_tokens + MESSAGE_OVERHEAD_TOKENS >= budget:
+                self.refused_requests += 1
+                raise TokenBudgetExceeded(total(), budget)
+            self._truncate_body(email, budget - (total() - estimate_tokens(email.get("body") or "")))
+            result.trimmed.append("body_truncated")
+            self.truncated_requests += 1
+            if total() > budget:
+                self.refused_requests += 1
+                raise TokenBudgetExceeded(total(), budget)
+
+        self.trimmed_requests += 1
+        self.estimated_tokens += result.estimated_tokens
+        print(f"Token budget: trimmed {result.trimmed} to {result.estimated_tokens}/{budget} tokens")
+        return result
+
+    def _trim_history(self, email: Dict[str, Any], result: BudgetResult) -> bool:
+        if not email.get("quotedHistory"):
+            return False
+        del email["quotedHistory"]
+        result.trimmed.append("quoted_history")
+        return True
+
+    def _trim_attachments(self, email: Dict[str, Any], result: BudgetResult) -> bool:
+        attachments = email.get("attachments") or []
+        if not attachments:
+            return False
+        kept = []
+        for attachment in attachments:
+            attachment = dict(attachment) if isinstance(attachment, dict) else attachment
+            if not isinstance(attachment, dict):
+                kept.append(attachment)
+                continue
+            if attachment.get("isInline") or str(attachment.get("contentType", "")).startswith("image/"):
+                continue
+            attachment.pop("contentBytes", None)
+            kept.append({key: value for key, value in attachment.items() if value is not None})
+        email["attachments"] = kept
+        result.trimmed.append("attachment_metadata")
+        return True
+
+    def _trim_signature(self, email: Dict[str, Any], result: BudgetResult) -> bool:
+        body = email.get("body") or ""
+        stripped = strip_signature(body)
+        if stripped == body:
+            return False
+        email["body"] = stripped
+        result.trimmed.append("signature")
+        return True
+
+    def _truncate_body(self, email: Dict[str, Any], body_budget: int) -> None:
+        body = email.get("body") or ""
+        if body_budget <= 0:
+            email["body"] = _TRUNCATION_NOTE.strip()
+            return
+        # Cut proportionally, then back off until the estimate fits
+        keep = int(len(body) * body_budget / max(estimate_tokens(body), 1))
+        while keep > 0 and estimate_tokens(body[:keep] + _TRUNCATION_NOTE) > body_budget:
+            keep = int(keep * 0.9)
+        email["body"] = body[:keep] + _TRUNCATION_NOTE
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "mode": self.mode,
+            "max_input_tokens": self.max_input_tokens,
+            "requests": self.requests,
+            "trimmed": self.trimmed_requests,
+            "truncated": self.truncated_requests,
+            "refused": self.refused_requests,
+            "avg_estimated_tokens": round(self.estimated_tokens / (self.requests - self.refused_requests), 1)
+            if self.requests > self.refused_requests else 0.0
+        }
+
+token_budget = TokenBudget.from_env()
@@ -0,0 +1,104 @@
+import os
+import json
+import time
+import asyncio
+from dataclasses import dataclass
+from typing import Dict, Any, Awaitable, Callable, List, Optional
+
+from src.services.hedging import LatencyWindow
+from src.services.tool_registry import ToolRegistry, tool_registry
+
+OK = "ok"
+TIMEOUT = "timeout"
+ERROR = "error"
+
+@dataclass
+class ToolRun:
+    """One tool call of a model turn: its output, outcome and duration"""
+    call: Dict[str, Any]
+    output: str
+    status: str
+    seconds: float
+
+class ToolExecutor:
+    """Runs the tool calls of one model turn concurrently.
+
+    At most `max_parallel` calls of a turn run at once, each within its
+    tool's timeout once one of the tool's process-wide slots is free (see
+    ToolRegistry); the wait for a slot does not count against the timeout.
+    A call that times out or raises gets an error output instead, so the
+    model can still answer; the runs are returned in the order the model
+    asked for them.
+    """
+
+    def __init__(self, max_parallel: int = 4, registry: Optional[ToolRegistry] = None):
+        self.max_parallel = max(1, max_parallel)
+        self.registry = registry or tool_registry
+        self.tools: Dict[str, Dict[str, Any]] = {}
+        self.turns = 0
+        self.serial_seconds = 0.0
+        self.wall_seconds = 0.0
+
+    @classmethod
+    def from_env(cls) -> "ToolExecutor":
+        return cls(
+            max_parallel=int(os.getenv("TOOL_MAX_PARALLEL", "4"))
+        )
+
+    def record(self, name: str, status: str, seconds: float) -> None:
+        entry = self.tools.setdefault(name, {"calls": 0, TIMEOUT: 0, ERROR: 0, "latency": LatencyWindow()})
+        entry["calls"] += 1
+        if status != OK:
+            entry[status] += 1
+        entry["latency"].record(seconds)
+
+    async def run(self, calls: List[Dict[str, Any]], invoke: Callable[[Dict[str, Any]], Awaitable[str]]) -> List[ToolRun]:
+        """Await invoke(call) for every call ({"name", "arguments", "call_id"}), in call order"""
+        semaphore = asyncio.Semaphore(self.max_parallel)
+
+        async def one(call: Dict[str, Any]) -> ToolRun:
+            name = call.get("name")
+            async with semaphore, self.registry.slot(name):
+                started = time.perf_counter()
+                timeout = self.registry.timeout_for(name)
+                try:
+                    output, status = await asyncio.wait_for(invoke(call), timeout), OK
+                except asyncio.TimeoutError:
+                    output, status = json.dumps({"error": f"Tool {name} timed out after {timeout:.0f}s"}), TIMEOUT
+                except Exception as e:
+                    output, status = json.dumps({"error": f"Tool {name} failed: {str(e)}"}), ERROR
+                seconds = time.perf_counter() - started
+            print(f"Tool {name} ({call.get('call_id')}): {status} in {seconds:.2f}s")
+            self.record(name, status, seconds)
+            return ToolRun(call, output, status, seconds)
+
+        started = time.perf_counter()
+        runs = await asyncio.gather(*(one(call) for call in calls))
+        wall, serial = time.perf_counter() - started, sum(run.seconds for run in runs)
+        self.turns += 1
+        self.wall_seconds += wall
+        self.serial_seconds += serial
+        if len(runs) > 1:
+            print(f"{len(runs)} tool calls took {wall:.2f}s ({serial:.2f}s one after another)")
+        return list(runs)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_parallel": self.max_parallel,
+            "turns": self.turns,
+            "seconds": round(self.wall_seconds, 2),
+            "seconds_saved": round(max(0.0, self.serial_seconds - self.wall_seconds), 2),
+            "tools": {
+                name: {
+                    "calls": entry["calls"],
+                    "timeouts": entry[TIMEOUT],
+                    "errors": entry[ERROR],
+                    "timeout_seconds": self.registry.timeout_for(name),
+                    "p50": round(entry["latency"].percentile(0.5), 3),
+                    "p95": round(entry["latency"].percentile(0.95), 3)
+                }
+                for name, entry in self.tools.items()
+            }
+        }
+
+tool_executor = ToolExecutor.from_env()
@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, replace
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, List, Optional
+
+from src.config import tools
+from src.services.circuit_breaker import CircuitOpenError
+from src.services.hedging import LatencyWindow
+
+# Cost classes: light tools answer from memory or a quick API call, heavy
+# ones move documents around and call OpenAI themselves
+LIGHT = "light"
+HEAVY = "heavy"
+
+@dataclass
+class ToolContext:
+    """The email a tool call is made for and the services its handler acts through"""
+    email: Any
+    teams_service: Any
+    attachment_service: Any
+    openai_service: Any
+
+ToolHandler = Callable[[Dict[str, Any], ToolContext], Awaitable[str]]
+
+def schema_for(name: str) -> Dict[str, Any]:
+    """The function schema of `name` in src.config.tools"""
+    for tool in tools:
+        if tool["function"]["name"] == name:
+            return tool
+    raise KeyError(f"No schema for tool {name} in src.config.tools")
+
+@dataclass
+class ToolSpec:
+    """A tool the model may call and how it is run.
+
+    `timeout` bounds each call, `max_concurrency` the calls running at once
+    across the process (0 = no limit). A cacheable tool's output depends
+    only on its arguments, so results recorded for a near-duplicate email
+    can be reused verbatim.
+    """
+    name: str
+    schema: Dict[str, Any]
+    handler: ToolHandler
+    timeout: float = 60.0
+    max_concurrency: int = 0
+    cacheable: bool = False
+    cost_class: str = LIGHT
+
+async def content_not_available(arguments: Dict[str, Any], context: ToolContext) -> str:
+    """Alert the team about a question the knowledge base does not cover (Power Automate flow)"""
+    email = context.email
+    await context.teams_service.send_content_not_available_alert(
+        domain=email.domain,
+        from_email=email.from_email,
+        subject_text=email.subject,
+        missing_subject=arguments.get("Subject", "Unknown")
+    )
+    return json.dumps({
+        "success": True,
+        "description": "A equipa do NewEnergy foi avisada desta questão, sobre a qual eu (o assistente) não consegui responder."
+    })
+
+async def analyze_email_attachment(arguments: Dict[str, Any], context: ToolContext) -> str:
+    """Fetch an attachment, upload it to OpenAI and have it answer the model's prompt about it"""
+    try:
+        email_id = arguments.get("emailId")
+        attachment_id = arguments.get("attachmentId")
+        attachment_filename = arguments.get("attachmentFileName", "document")
+        prompt = arguments.get("prompt")
+        system_prompt = arguments.get("systemPrompt")
+
+        if not all([email_id, attachment_id, prompt]):
+            return json.dumps({
+                "error": "Missing required parameters for analyze_email_attachment"
+            })
+
+        print(f"Getting attachment content for email {email_id}, attachment {attachment_id}")
+
+        # Get attachment content (matching Power Automate HTTP call)
+        attachment_content = await context.attachment_service.get_attachment_content(
+            email_id=email_id,
+            attachment_id=attachment_id,
+            mailbox=getattr(context.email, "originalMailbox", None)
+        )
+
+        print(f"Got attachment content, size: {len(attachment_content)} bytes")
+
+        # Upload file to OpenAI (matching Power Automate Upload File)
+        file_id = await context.openai_service.upload_file(
+            file_content=attachment_content,
+            filename=attachment_filename
+        )
+
+        print(f"Uploaded file to OpenAI, file_id: {file_id}")
+
+        # Analyze document (matching Power Automate Analyze Document)
+        analysis_result = await context.openai_service.analyze_document(
+            file_id=file_id,
+            prompt=prompt,
+            system_prompt=system_prompt
+        )
+
+        print(f"Analysis complete, processing results...")
+
+        # Extract completed messages from analysis (matching Power Automate Query)
+        output = analysis_result.get("output", [])
+        completed_messages = [
+            item for item in output
+            if item.get("type") == "message" and item.get("status") == "completed"
+        ]
+
+        if completed_messages:
+            content = completed_messages[-1].get("content", [])
+            if content and isinstance(content, list):
+                analysis_text = content[0].get("text", "Analysis completed")
+
+                # Return success response matching Power Automate
+                return json.dumps({
+                    "success": True,
+                    "description": analysis_text
+                })
+
+        return json.dumps({
+            "success": True,
+            "description": "Document analyzed successfully"
+        })
+
+    except CircuitOpenError as e:
+        print(f"Error analyzing attachment: {e}")
+        return json.dumps({
+            "error": "The attachment service is temporarily unavailable; answer without the attachment"
+        })
+    except Exception as e:
+        error_msg = f"Failed to analyze attachment: {str(e)}"
+        print(f"Error analyzing attachment: {error_msg}")
+        return json.dumps({
+            "error": error_msg
+        })
+
+async def function_not_implemented(name: str, context: ToolContext) -> str:
+    """Default case: alert the team and answer with an empty string (Power Automate default)"""
+    print(f"Function {name} not implemented")
+    email = context.email
+    await context.teams_service.send_function_not_implemented_alert(
+        domain=email.domain,
+        from_email=email.from_email,
+        subject=email.subject,
+        function_name=name
+    )
+    return ""
+
+# The tools offered to the model, in the order their schemas are sent
+BUILTIN_TOOLS = [
+    ToolSpec(
+        name="content_not_available",
+        schema=schema_for("content_not_available"),
+        handler=content_not_available,
+        timeout=30.0
+    ),
+    ToolSpec(
+        name="analyze_email_attachment",
+        schema=schema_for("analyze_email_attachment"),
+        handler=analyze_email_attachment,
+        timeout=180.0,
+        max_concurrency=4,
+        cost_class=HEAVY
+    )
+]
+
+class ToolRegistry:
+    """The tools the model may call, each with its handler and run limits.
+
+    Adding a tool means adding its schema to src.config.tools and
+    registering a ToolSpec; the email loops dispatch every call through
+    invoke(). Per-tool settings from TOOL_SETTINGS (timeout,
+    max_concurrency, cacheable, cost_class) override the declared ones.
+    """
+
+    def __init__(
+        self,
+        specs: Optional[List[ToolSpec]] = None,
+        timeout: float = 60.0,
+        settings: Optional[Dict[str, Dict[str, Any]]] = None
+    ):
+        self.timeout = timeout
+        self.settings = settings or {}
+        self.specs: Dict[str, ToolSpec] = {}
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        self._usage: Dict[str, Dict[str, Any]] = {}
+        for spec in BUILTIN_TOOLS if specs is None else specs:
+            self.register(spec)
+
+    @classmethod
+    def from_env(cls) -> "ToolRegistry":
+        return cls(
+            timeout=float(os.getenv("TOOL_TIMEOUT", "60")),
+            settings=json.loads(os.getenv("TOOL_SETTINGS", "{}"))
+        )
+
+    def register(self, spec: ToolSpec) -> ToolSpec:
+        """Add (or replace) a tool, applying its TOOL_SETTINGS overrides"""
+        spec = replace(spec, **self.settings.get(spec.name, {}))
+        self.specs[spec.name] = spec
+        if spec.max_concurrency > 0:
+            self._slots[spec.name] = asyncio.Semaphore(spec.max_concurrency)
+        else:
+            self._slots.pop(spec.name, None)
+        return spec
+
+    def get(self, name: Optional[str]) -> Optional[ToolSpec]:
+        return self.specs.get(name)
+
+    def schemas(self) -> List[Dict[str, Any]]:
+        """Function schemas of the registered tools, to offer to the model"""
+        return [spec.schema for spec in self.specs.values()]
+
+    def timeout_for(self, name: Optional[str]) -> float:
+        spec = self.get(name)
+        return spec.timeout if spec else self.timeout
+
+    def is_cacheable(self, name: Optional[str]) -> bool:
+        spec = self.get(name)
+        return bool(spec and spec.cacheable)
+
+    @asynccontextmanager
+    async def slot(self, name: Optional[str]) -> AsyncIterator[None]:
+        """Wait for one of the tool's process-wide slots (immediate when it has no limit)"""
+        usage = self._usage.setdefault(name, {"in_flight": 0, "waiting": 0, "wait": LatencyWindow()})
+        semaphore = self._slots.get(name)
+        started = time.perf_counter()
+        if semaphore:
+            usage["waiting"] += 1
+            try:
+                await semaphore.acquire()
+            finally:
+                usage["waiting"] -= 1
+        usage["wait"].record(time.perf_counter() - started)
+        usage["in_flight"] += 1
+        try:
+            yield
+        finally:
+            usage["in_flight"] -= 1
+            if semaphore:
+                semaphore.release()
+
+    async def invoke(self, call: Dict[str, Any], context: ToolContext) -> str:
+        """Run a function call ({"name", "arguments", ...}) with its tool's handler"""
+        name = call.get("name")
+        try:
+            arguments = json.loads(call.get("arguments") or "{}")
+        except json.JSONDecodeError:
+            arguments = {}
+        print(f"Processing function: {name} with args: {arguments}")
+        spec = self.get(name)
+        if spec is None:
+            return await function_not_implemented(name, context)
+        return await spec.handler(arguments, context)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "cost_class": spec.cost_class,
+                "timeout_seconds": spec.timeout,
+                "max_concurrency": spec.max_concurrency,
+                "cacheable": spec.cacheable,
+                "in_flight": self._usage.get(name, {}).get("in_flight", 0),
+                "waiting": self._usage.get(name, {}).get("waiting", 0),
+                "wait_p95": round(self._usage[name]["wait"].percentile(0.95), 3) if name in self._usage else 0.0
+            }
+            for name, spec in self.specs.items()
+        }
+
+tool_registry = ToolRegistry.from_env()
@@ -1,16 +0,0 @@
-import json
-from typing import Optional
-
-def content_not_available(Subject: str):
-    """This function is called when information is not available in the context."""
-    # In a real application, you would log this information or send it to a ticketing system.
-    print(f"Content not available for subject: {Subject}")
-    return json.dumps({"success": True, "description": f"The team has been notified about the missing content on the subject: {Subject}"})
-
-
-def analyze_email_attachment(emailId: str, attachmentFileName: str, attachmentId: str, prompt: str, systemPrompt: Optional[str] = None):
-    """This function is called to analyze an email attachment."""
-    # This is a placeholder for the actual implementation.
-    # In a real application, you would download the attachment and use a document analysis service.
-    print(f"Analyzing attachment {attachmentFileName} ({attachmentId}) from email {emailId} with prompt: {prompt}")
-    return json.dumps({"success": True, "description": "The attachment has been analyzed successfully."})
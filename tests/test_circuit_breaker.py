@@ -0,0 +1,166 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from src.services.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitBreakers,
+    CircuitOpenError,
+    is_upstream_failure
+)
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/responses")
+
+def status_error(status: int) -> openai.APIStatusError:
+    return openai.APIStatusError("erro", response=httpx.Response(status, request=REQUEST), body=None)
+
+def make_breaker(**settings) -> CircuitBreaker:
+    return CircuitBreaker("openai", **{"min_calls": 4, "window": 10, "half_open_calls": 2, **settings})
+
+def trip(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.min_calls):
+        breaker.record(0.1, True, breaker.allow())
+    assert breaker.current_state() == OPEN
+
+def elapse_open_period(breaker: CircuitBreaker) -> None:
+    breaker.opened_at -= breaker.open_seconds
+
+def test_opens_once_failure_rate_is_reached_after_min_calls():
+    breaker = make_breaker(failure_rate=0.5)
+    for failed in (True, False, True):
+        breaker.record(0.1, failed, breaker.allow())
+    assert breaker.current_state() == CLOSED
+    breaker.record(0.1, False, breaker.allow())
+    assert breaker.current_state() == OPEN
+    assert breaker.trip_reason == "2/4 calls failed"
+    assert breaker.stats()["opened"] == 1
+
+def test_opens_on_slow_calls():
+    breaker = make_breaker(slow_rate=0.75, slow_call_seconds=5.0)
+    for latency in (6.0, 7.0, 1.0, 5.0):
+        breaker.record(latency, False, breaker.allow())
+    assert breaker.current_state() == OPEN
+    assert breaker.trip_reason == "3/4 calls slower than 5.0s"
+
+def test_outcomes_older_than_the_window_are_forgotten():
+    breaker = make_breaker(window_seconds=60.0)
+    for _ in range(3):
+        breaker.record(0.1, True, breaker.allow())
+    breaker.outcomes = type(breaker.outcomes)(
+        ((finished - 61.0, failed, slow) for finished, failed, slow in breaker.outcomes), maxlen=10
+    )
+    breaker.record(0.1, False, breaker.allow())
+    assert breaker.current_state() == CLOSED
+    assert breaker.stats()["window_calls"] == 1
+
+def test_open_circuit_rejects_calls():
+    breaker = make_breaker(open_seconds=30.0)
+    trip(breaker)
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.allow()
+    assert error.value.name == "openai" and 0 < error.value.retry_after <= 30.0
+    with pytest.raises(CircuitOpenError):
+        breaker.raise_if_open()
+    assert breaker.stats()["rejected"] == 2
+
+def test_half_open_after_open_seconds_and_closes_when_trials_succeed():
+    breaker = make_breaker()
+    trip(breaker)
+    elapse_open_period(breaker)
+    assert breaker.current_state() == HALF_OPEN
+    assert breaker.allow() is True and breaker.allow() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    breaker.record(0.1, False, True)
+    assert breaker.current_state() == HALF_OPEN
+    breaker.record(0.1, False, True)
+    assert breaker.current_state() == CLOSED
+    assert breaker.stats()["window_calls"] == 0
+
+def test_failed_or_slow_trial_reopens():
+    breaker = make_breaker(slow_call_seconds=5.0)
+    trip(breaker)
+    elapse_open_period(breaker)
+    breaker.record(0.1, True, breaker.allow())
+    assert breaker.current_state() == OPEN
+    assert breaker.trip_reason == "trial call failed"
+    elapse_open_period(breaker)
+    breaker.record(9.0, False, breaker.allow())
+    assert breaker.trip_reason == "trial call took 9.0s"
+    assert breaker.stats()["opened"] == 3
+
+def test_calls_admitted_before_opening_do_not_decide_half_open():
+    breaker = make_breaker()
+    trip(breaker)
+    elapse_open_period(breaker)
+    breaker.current_state()
+    breaker.record(0.1, True, False)
+    assert breaker.current_state() == HALF_OPEN
+
+def test_guard_records_outcomes_and_yields_trial():
+    breaker = make_breaker(min_calls=1, failure_rate=0.3)
+
+    async def scenario():
+        async with breaker.guard() as trial:
+            assert trial is False
+        with pytest.raises(openai.APIStatusError):
+            async with breaker.guard():
+                raise status_error(400)
+        assert breaker.current_state() == CLOSED
+        with pytest.raises(openai.APIStatusError):
+            async with breaker.guard():
+                raise status_error(503)
+        assert breaker.current_state() == OPEN
+        elapse_open_period(breaker)
+        async with breaker.guard() as trial:
+            assert trial is True
+
+    asyncio.run(scenario())
+    assert breaker.stats()["calls"] == 4 and breaker.stats()["failures"] == 1
+
+def test_cancelled_trial_gives_back_its_slot():
+    breaker = make_breaker(half_open_calls=1)
+    trip(breaker)
+    elapse_open_period(breaker)
+
+    async def scenario():
+        with pytest.raises(asyncio.CancelledError):
+            async with breaker.guard():
+                raise asyncio.CancelledError()
+
+    asyncio.run(scenario())
+    assert breaker.current_state() == HALF_OPEN
+    assert breaker.trial_calls == 0
+    assert breaker.allow() is True
+
+def test_is_upstream_failure():
+    assert is_upstream_failure(status_error(429))
+    assert is_upstream_failure(status_error(408))
+    assert is_upstream_failure(status_error(502))
+    assert not is_upstream_failure(status_error(400))
+    assert is_upstream_failure(openai.APITimeoutError(REQUEST))
+    assert is_upstream_failure(httpx.ConnectError("recusada"))
+    assert is_upstream_failure(asyncio.TimeoutError())
+    assert not is_upstream_failure(CircuitOpenError("graph", 1.0))
+    assert not is_upstream_failure(ValueError("json inválido"))
+
+def test_disabled_breaker_never_opens():
+    breaker = make_breaker(enabled=False)
+    for _ in range(10):
+        breaker.record(0.1, True, breaker.allow())
+    assert breaker.current_state() == CLOSED
+    breaker.raise_if_open()
+
+def test_registry_merges_settings_by_name():
+    breakers = CircuitBreakers(settings={"openai": {"open_seconds": 10.0}, "openai/o4-mini": {"min_calls": 3}})
+    breaker = breakers.get("openai/o4-mini")
+    assert breakers.get("openai/o4-mini") is breaker
+    assert (breaker.open_seconds, breaker.min_calls, breaker.slow_call_seconds) == (10.0, 3, 120.0)
+    assert breakers.get("openai/gpt-4o").min_calls == 10
+    assert breakers.get("graph").slow_call_seconds == 10.0
+    assert breakers.states() == {"openai/o4-mini": CLOSED, "openai/gpt-4o": CLOSED, "graph": CLOSED}
@@ -0,0 +1,57 @@
+import json
+
+from src.services.json_stream import IncrementalJSONFieldParser, FIELD, PARTIAL
+
+ANSWER = {
+    "subjectPrefix": "RE:",
+    "body": "Olá Maria,\n\nA sua fatura de \"março\" foi corrigida ✅.",
+    "confidence": 92,
+    "attachments": [{"name": "fatura.pdf"}],
+    "language": "pt-PT"
+}
+
+def feed_in_chunks(text: str, size: int):
+    parser = IncrementalJSONFieldParser()
+    events = []
+    for start in range(0, len(text), size):
+        events.extend(parser.feed(text[start:start + size]))
+    return parser, events
+
+def test_fields_match_json_loads_for_any_chunk_size():
+    text = json.dumps(ANSWER)
+    for size in (1, 2, 3, 7, 64, len(text)):
+        parser, events = feed_in_chunks(text, size)
+        assert parser.done
+        assert parser.fields == ANSWER
+        assert [name for kind, name, _ in events if kind == FIELD] == list(ANSWER)
+
+def test_body_is_streamed_as_decoded_partial_text():
+    _, events = feed_in_chunks(json.dumps(ANSWER), 5)
+    partial = "".join(value for kind, name, value in events if kind == PARTIAL)
+    assert partial == ANSWER["body"]
+    assert all(name == "body" for kind, name, _ in events if kind == PARTIAL)
+
+def test_unicode_escapes_split_across_chunks():
+    text = json.dumps({"body": "energia 😀 verde"}, ensure_ascii=True)
+    parser, events = feed_in_chunks(text, 1)
+    assert parser.fields["body"] == "energia 😀 verde"
+    assert "".join(value for kind, _, value in events if kind == PARTIAL) == "energia 😀 verde"
+
+def test_text_before_the_object_is_ignored():
+    parser = IncrementalJSONFieldParser()
+    parser.feed('```json\n{"language": "pt-PT", "confidence": 80}\n```')
+    assert parser.done
+    assert parser.fields == {"language": "pt-PT", "confidence": 80}
+
+def test_field_is_emitted_as_soon_as_it_closes():
+    parser = IncrementalJSONFieldParser()
+    assert parser.feed('{"language": "pt-') == []
+    assert parser.feed('PT", "bo') == [(FIELD, "language", "pt-PT")]
+    assert parser.feed('dy": "Ol') == [(PARTIAL, "body", "Ol")]
+    assert not parser.done
+
+def test_partial_fields_can_be_chosen():
+    parser = IncrementalJSONFieldParser(partial_fields={"subjectPrefix"})
+    events = parser.feed('{"subjectPrefix": "RE:", "body": "texto"}')
+    assert (PARTIAL, "subjectPrefix", "RE:") in events
+    assert not any(kind == PARTIAL and name == "body" for kind, name, _ in events)
@@ -0,0 +1,146 @@
+import asyncio
+
+from src.services.priority_scheduler import (
+    HIGH,
+    LOW,
+    NORMAL,
+    DomainQuota,
+    PriorityScheduler,
+    priority_class
+)
+
+OLD = "2024-06-03T09:00:00Z"
+NEWER = "2024-06-03T10:00:00Z"
+
+async def admission_order(scheduler: PriorityScheduler, tickets: dict, pause: float = 0.0) -> list:
+    """Names of `tickets` in the order they get the slot while one call holds it"""
+    order = []
+
+    async def call(name, ticket):
+        async with scheduler.slot(ticket):
+            order.append(name)
+
+    async with scheduler.slot(scheduler.ticket(NORMAL)):
+        tasks = [asyncio.create_task(call(name, ticket)) for name, ticket in tickets.items()]
+        await asyncio.sleep(pause)
+    await asyncio.gather(*tasks)
+    return order
+
+def test_priority_class_defaults_to_normal():
+    assert priority_class("High ") == HIGH
+    assert priority_class(None) == NORMAL
+    assert priority_class("urgente") == NORMAL
+
+def test_higher_class_goes_first():
+    scheduler = PriorityScheduler(max_concurrency=1, aging_seconds=0)
+    tickets = {
+        "low": scheduler.ticket(LOW, OLD),
+        "normal": scheduler.ticket(NORMAL, OLD),
+        "high": scheduler.ticket(HIGH, NEWER)
+    }
+    assert asyncio.run(admission_order(scheduler, tickets)) == ["high", "normal", "low"]
+
+def test_earliest_deadline_first_within_a_class():
+    scheduler = PriorityScheduler(max_concurrency=1, aging_seconds=0)
+    tickets = {
+        "newer": scheduler.ticket(NORMAL, NEWER),
+        "older": scheduler.ticket(NORMAL, OLD),
+        "no_date": scheduler.ticket(NORMAL)
+    }
+    assert asyncio.run(admission_order(scheduler, tickets)) == ["older", "newer", "no_date"]
+
+def test_aging_promotes_a_waiting_low_priority_call():
+    scheduler = PriorityScheduler(max_concurrency=1, aging_seconds=0.05)
+
+    async def scenario():
+        order = []
+
+        async def call(name, ticket):
+            async with scheduler.slot(ticket):
+                order.append(name)
+
+        async with scheduler.slot(scheduler.ticket(NORMAL)):
+            low = asyncio.create_task(call("low", scheduler.ticket(LOW, OLD)))
+            await asyncio.sleep(0.12)
+            high = asyncio.create_task(call("high", scheduler.ticket(HIGH, NEWER)))
+            await asyncio.sleep(0)
+        await asyncio.gather(low, high)
+        return order
+
+    assert asyncio.run(scenario()) == ["low", "high"]
+    assert scheduler.stats()["classes"][LOW]["promoted_by_aging"] == 1
+
+def test_without_aging_low_priority_waits_behind_later_high():
+    scheduler = PriorityScheduler(max_concurrency=1, aging_seconds=0)
+    tickets = {"low": scheduler.ticket(LOW, OLD), "high": scheduler.ticket(HIGH, NEWER)}
+    assert asyncio.run(admission_order(scheduler, tickets, pause=0.05)) == ["high", "low"]
+    assert scheduler.stats()["classes"][LOW]["promoted_by_aging"] == 0
+
+def test_domain_at_max_concurrency_does_not_hold_back_others():
+    scheduler = PriorityScheduler(max_concurrency=4, quotas={"a.pt": DomainQuota(max_concurrency=1)})
+
+    async def scenario():
+        release = asyncio.Event()
+        admitted = []
+
+        async def call(name, domain):
+            async with scheduler.slot(scheduler.ticket(NORMAL, OLD, domain)):
+                admitted.append(name)
+                await release.wait()
+
+        tasks = [asyncio.create_task(call(name, domain))
+                 for name, domain in (("a1", "a.pt"), ("a2", "A.pt"), ("b1", "b.pt"))]
+        await asyncio.sleep(0.01)
+        during = list(admitted)
+        stats = scheduler.stats()
+        release.set()
+        await asyncio.gather(*tasks)
+        return during, stats, admitted
+
+    during, stats, admitted = asyncio.run(scenario())
+    assert during == ["a1", "b1"]
+    assert stats["active"] == 2
+    assert stats["domains"]["a.pt"]["active"] == 1 and stats["domains"]["a.pt"]["depth"] == 1
+    assert admitted == ["a1", "b1", "a2"]
+    assert scheduler.stats()["active"] == 0
+
+def test_set_quota_applies_to_existing_domains():
+    scheduler = PriorityScheduler()
+    scheduler.quota_for("c.pt")
+    scheduler.set_quota("C.pt", DomainQuota(weight=2.0, max_concurrency=3))
+    assert scheduler.quota_for("c.pt").max_concurrency == 3
+    assert scheduler.quota_for("d.pt").max_concurrency is None
+
+def test_cancelled_waiter_gives_up_its_place():
+    scheduler = PriorityScheduler(max_concurrency=1)
+
+    async def scenario():
+        order = []
+
+        async def call(name):
+            async with scheduler.slot(scheduler.ticket(HIGH, OLD)):
+                order.append(name)
+
+        async with scheduler.slot(scheduler.ticket(NORMAL)):
+            first = asyncio.create_task(call("first"))
+            second = asyncio.create_task(call("second"))
+            await asyncio.sleep(0)
+            first.cancel()
+            await asyncio.sleep(0)
+            assert scheduler.depth() == 1
+        await second
+        return order, first.cancelled()
+
+    order, cancelled = asyncio.run(scenario())
+    assert order == ["second"] and cancelled
+    assert scheduler.stats()["active"] == 0
+
+def test_disabled_scheduler_admits_everything():
+    scheduler = PriorityScheduler(max_concurrency=1, enabled=False)
+
+    async def scenario():
+        async with scheduler.slot():
+            async with scheduler.slot():
+                return scheduler.stats()["active"]
+
+    assert asyncio.run(scenario()) == 0
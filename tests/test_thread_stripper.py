@@ -0,0 +1,90 @@
+from src.services.thread_stripper import (
+    ThreadStripper,
+    close_html_fragment,
+    find_html_quote_start,
+    split_text_thread,
+    strip_signature
+)
+
+FORM = "\n".join(f"Campo {i}: valor {i} preenchido pelo cliente no formulário" for i in range(12))
+
+REPLY = (
+    "Bom dia,\nA minha fatura de março veio com um valor muito superior ao habitual.\n\n"
+    "From: Apoio <apoio@goldenergy.pt>\nSent: Monday, 3 June 2024 10:12\nTo: maria@example.com\n"
+    "Subject: RE: Fatura\n\nObrigado pelo contacto, vamos analisar.\n\n"
+    "From: Maria <maria@example.com>\nSent: Sunday, 2 June 2024 09:00\nTo: apoio@goldenergy.pt\n"
+    "Subject: Fatura\n\nA fatura está errada."
+)
+
+FORWARD = (
+    "Bom dia,\n\n---------- Forwarded message ----------\nFrom: Site <noreply@goldenergy.pt>\n"
+    f"Date: Mon, 3 Jun 2024\nSubject: Pedido de contacto\nTo: apoio@goldenergy.pt\n\n{FORM}\n\n"
+    "From: Maria <maria@example.com>\nSent: Sunday\nTo: apoio@goldenergy.pt\nSubject: Antigo\n\n"
+    "Mensagem antiga sobre outro assunto."
+)
+
+def test_reply_keeps_newest_message_and_summarises_history():
+    result = ThreadStripper().strip(REPLY)
+    assert result.body == "Bom dia,\nA minha fatura de março veio com um valor muito superior ao habitual."
+    assert result.quoted_messages == 2
+    lines = result.history.splitlines()
+    assert lines[0].startswith("[Apoio <apoio@goldenergy.pt> | Monday, 3 June 2024 10:12]")
+    assert lines[1].endswith("A fatura está errada.")
+
+def test_history_is_bounded():
+    result = ThreadStripper(max_messages=1, max_chars_per_message=10).strip(REPLY)
+    first, omitted = result.history.splitlines()
+    assert first.endswith("[…]")
+    assert omitted == "[1 older message(s) omitted]"
+
+def test_forward_with_empty_top_part_keeps_forwarded_message_whole():
+    result = ThreadStripper().strip(FORWARD, subject="Pedido")
+    assert FORM in result.body
+    assert result.quoted_messages == 1
+    assert "Mensagem antiga" in result.history and "Campo" not in result.history
+
+def test_fw_subject_keeps_first_quoted_message_even_with_a_request_above_it():
+    body = REPLY.replace("Bom dia,\n", "Bom dia,\nPor favor vejam o pedido abaixo da cliente.\n")
+    result = ThreadStripper().strip(body, subject="ENC: Fatura")
+    assert "Obrigado pelo contacto" in result.body
+    assert result.quoted_messages == 1
+
+def test_html_forward_keeps_form_and_closes_the_cut_fragment():
+    form_html = "".join(f"<p>Campo {i}: valor {i}</p>" for i in range(12))
+    body = (
+        "<html><body><div><p>&nbsp;</p></div>"
+        "<div id=\"divRplyFwdMsg\" dir=\"ltr\"><font><b>From:</b> Site<br><b>Sent:</b> Monday<br>"
+        f"<b>Subject:</b> Pedido</font><div>&nbsp;</div></div><div>{form_html}</div>"
+        "<div style=\"border:none;border-top:solid #E1E1E1 1.0pt;padding:3.0pt 0cm 0cm 0cm\">"
+        "<p><b>From:</b> Maria<br><b>Sent:</b> Sunday</p></div><p>Mensagem antiga.</p></body></html>"
+    )
+    result = ThreadStripper().strip(body, is_html=True, subject="FW: Pedido")
+    assert "Campo 11: valor 11" in result.body
+    assert result.body.endswith("</body></html>")
+    assert result.history == "[Maria | Sunday] Mensagem antiga."
+
+def test_html_reply_is_cut_before_the_outlook_divider():
+    body = "<div><p>Preciso de ajuda com a minha fatura de março, por favor.</p></div><hr>" \
+           "<div id=\"divRplyFwdMsg\"><b>From:</b> Apoio<br><b>Sent:</b> Monday</div><p>Resposta antiga.</p>"
+    assert find_html_quote_start(body) == body.index("<div id=")
+    result = ThreadStripper().strip(body, is_html=True, subject="RE: Fatura")
+    assert result.body == "<div><p>Preciso de ajuda com a minha fatura de março, por favor.</p></div>"
+    assert result.history == "[Apoio | Monday] Resposta antiga."
+
+def test_close_html_fragment():
+    assert close_html_fragment("<html><body><div><p>&nbsp;</p></div>") == "<html><body><div><p>&nbsp;</p></div></body></html>"
+    assert close_html_fragment("<div><p>a<br><p>b</div><span>x") == "<div><p>a<br><p>b</div><span>x</span>"
+    assert close_html_fragment("<div>texto<img src=\"a.png\"/><sp") == "<div>texto<img src=\"a.png\"/></div>"
+
+def test_angle_quoted_text_is_split():
+    newest, older = split_text_thread("Obrigado pela resposta rápida!\n\nOn Mon, Maria wrote:\n> Olá\n> Tudo bem?")
+    assert newest == "Obrigado pela resposta rápida!"
+    assert older.splitlines()[-2:] == ["Olá", "Tudo bem?"]
+
+def test_strip_signature_keeps_sign_off_and_name():
+    text = "Olá,\nTexto.\nCumprimentos,\nMaria Silva\nGestora de Cliente\n" + "Aviso legal " * 10
+    assert strip_signature(text) == "Olá,\nTexto.\nCumprimentos,\nMaria Silva\nGestora de Cliente"
+
+def test_disabled_stripper_returns_body_untouched():
+    result = ThreadStripper(enabled=False).strip(REPLY)
+    assert result.body == REPLY and result.history == "" and result.quoted_messages == 0
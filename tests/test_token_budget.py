@@ -0,0 +1,94 @@
+import pytest
+
+from src.services.token_budget import (
+    DEGRADE,
+    REFUSE,
+    TokenBudget,
+    TokenBudgetExceeded,
+    context_window,
+    estimate_request_tokens,
+    estimate_tokens
+)
+
+SIGNATURE = "\nCumprimentos,\nMaria Silva\n" + "Esta mensagem é confidencial e destinada apenas ao destinatário. " * 20
+
+def make_email(body_words: int = 50, history_words: int = 0, attachments=None) -> dict:
+    email = {"subject": "Fatura", "body": "palavra " * body_words + SIGNATURE}
+    if history_words:
+        email["quotedHistory"] = "histórico " * history_words
+    if attachments is not None:
+        email["attachments"] = attachments
+    return email
+
+def test_estimate_tokens():
+    assert estimate_tokens(None) == 0
+    assert estimate_tokens("olá mar") == 2
+    assert estimate_tokens("fatura") == 2
+    assert estimate_tokens("a, b.") == 4
+    # Long unbroken runs (ids, base64) count about one token per three characters
+    assert estimate_tokens("x" * 30) == 10
+    assert estimate_tokens({"a": 1}) == estimate_tokens('{"a": 1}')
+
+def test_estimate_request_tokens_adds_message_overhead():
+    items = [{"role": "user", "content": "olá"}]
+    assert estimate_request_tokens("instruções", None, items) == (
+        estimate_tokens("instruções") + estimate_tokens([]) + estimate_tokens("olá") + 4
+    )
+
+def test_context_window_longest_prefix_wins():
+    assert context_window("gpt-4o-mini-2024-07-18") == 128000
+    assert context_window("gpt-4.1-mini") == 1047576
+    assert context_window("modelo-desconhecido") == 128000
+
+def test_budget_for_is_capped_by_the_context_window():
+    budget = TokenBudget(max_input_tokens=32000, budgets={"gpt-4o": 500000})
+    assert budget.budget_for("gpt-4o", 4096) == 128000 - 4096
+    assert budget.budget_for("o4-mini", 4096) == 32000
+
+def test_email_within_budget_is_untouched():
+    email = make_email(history_words=100)
+    result = TokenBudget().fit(email, 100, 10000)
+    assert result.email == email and result.trimmed == []
+
+def test_quoted_history_is_trimmed_first():
+    email = make_email(body_words=50, history_words=2000)
+    budget = estimate_tokens(make_email(body_words=50)) + 200
+    result = TokenBudget().fit(email, 100, budget)
+    assert result.trimmed == ["quoted_history"]
+    assert "quotedHistory" not in result.email and result.email["body"] == email["body"]
+    assert result.estimated_tokens <= budget
+
+def test_inline_attachments_then_signature_are_trimmed_next():
+    attachments = [
+        {"name": "logo.png", "contentType": "image/png", "isInline": True},
+        {"name": "fatura.pdf", "contentType": "application/pdf", "contentBytes": "A" * 3000, "size": None}
+    ]
+    email = make_email(body_words=50, history_words=500, attachments=attachments)
+    result = TokenBudget().fit(email, 100, 300)
+    assert result.trimmed == ["quoted_history", "attachment_metadata", "signature"]
+    assert result.email["attachments"] == [{"name": "fatura.pdf", "contentType": "application/pdf"}]
+    assert result.email["body"].endswith("Cumprimentos,\nMaria Silva")
+
+def test_degrade_mode_truncates_the_body():
+    budget = TokenBudget(mode=DEGRADE)
+    result = budget.fit({"body": "palavra " * 5000}, 100, 1000)
+    assert result.trimmed[-1] == "body_truncated"
+    assert result.estimated_tokens <= 1000
+    assert result.email["body"].endswith("[…conteúdo truncado por exceder o limite de tokens]")
+    assert budget.stats()["truncated"] == 1
+
+def test_refuse_mode_raises():
+    budget = TokenBudget(mode=REFUSE)
+    with pytest.raises(TokenBudgetExceeded) as error:
+        budget.fit({"body": "palavra " * 5000}, 100, 1000)
+    assert error.value.budget == 1000 and error.value.estimated_tokens > 1000
+    assert budget.stats()["refused"] == 1
+
+def test_fixed_tokens_alone_over_budget_is_refused_even_when_degrading():
+    with pytest.raises(TokenBudgetExceeded):
+        TokenBudget(mode=DEGRADE).fit({"body": "palavra " * 100}, 2000, 1000)
+
+def test_fit_does_not_modify_the_callers_email():
+    email = make_email(history_words=2000)
+    TokenBudget().fit(email, 100, 300)
+    assert "quotedHistory" in email